@@ -0,0 +1,335 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+import numpy as np
+from benchmarks.CorpusGenerator import CorpusGenerator
+from classification.Classifier import Classifier
+from classification.Model import Model
+from utils.TextPreprocessor import TextPreprocessor
+
+
+PUNCTUATION = "\\r\\n\\$/#^@'=+_:;*-~`)({}[]|<>.,&%!?\'\""
+STAGES = ("preprocess", "train", "classify_text", "batch_scores")
+
+
+def _peak_rss_mb():
+    """Peak resident set size of the process in megabytes (ru_maxrss is in kilobytes on Linux)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+class Benchmark:
+    """
+    Eng:
+    ==========================================================================================================
+    Benchmarks of preprocessing (TextPreprocessor), training (Model) and scoring (Classifier.classify_text
+    and Classifier.batch_scores) on synthetic corpora from CorpusGenerator.
+
+    Every stage is run for every language, corpus size and n-parameter. Result of a run is a list of
+    dictionaries with throughput (messages per second), latency percentiles of per-message stages and peak
+    RSS. Every stage runs in a fresh process, so it's peak RSS is not hidden by the peaks of earlier stages.
+    Results can be saved as json and compared with a stored baseline.
+    ==========================================================================================================
+
+    Ru:
+    ==========================================================================================================
+    Замеры производительности предобработки (TextPreprocessor), обучения (Model) и классификации
+    (Classifier.classify_text и Classifier.batch_scores) на синтетических корпусах из CorpusGenerator.
+
+    Каждый этап выполняется для каждого языка, размера корпуса и параметра n. Результат - список словарей с
+    пропускной способностью (сообщений в секунду), процентилями задержки для этапов, обрабатывающих по
+    одному сообщению, и пиковым RSS. Каждый этап выполняется в новом процессе, поэтому его пиковый RSS не
+    скрывается пиками предыдущих этапов. Результаты можно сохранить в json и сравнить с сохраненными
+    базовыми результатами.
+    ==========================================================================================================
+    """
+    def __init__(self, sizes=(1000, 10000), ngrams=(1, 2, 3), langs=("eng", "ru"), stages=STAGES, repeat=3,
+                 methods=None, seed=1):
+        """
+        Eng:
+        ===============================================================================================
+        :param sizes: Corpus sizes (amounts of messages);
+
+        :param ngrams: n-parameters of models;
+
+        :param langs: Languages of corpora ("eng", "ru");
+
+        :param stages: Names of stages to run (see STAGES);
+
+        :param repeat: Every whole-corpus stage is run repeat times, the median time is reported;
+
+        :param methods: Methods for partial preprocessing in "preprocess" stage (full if None);
+
+        :param seed: Seed of corpus generator.
+        ===============================================================================================
+
+        Ru:
+        ===============================================================================================
+        :param sizes: Размеры корпусов (количества сообщений);
+
+        :param ngrams: Параметры n моделей;
+
+        :param langs: Языки корпусов ("eng", "ru");
+
+        :param stages: Имена выполняемых этапов (см. STAGES);
+
+        :param repeat: Каждый этап для всего корпуса выполняется repeat раз, выводится медианное время;
+
+        :param methods: Методы для частичной предобработки на этапе "preprocess" (полная, если None);
+
+        :param seed: Начальное значение генератора корпусов.
+        ===============================================================================================
+        """
+        self.sizes = sizes
+        self.ngrams = ngrams
+        self.langs = langs
+        self.stages = stages
+        self.repeat = repeat
+        self.methods = methods
+        self.seed = seed
+
+    @staticmethod
+    def _result(stage, lang, docs, n, seconds, peak_rss_mb, latencies=None):
+        result = {
+            "stage": stage,
+            "lang": lang,
+            "docs": docs,
+            "n": n,
+            "seconds": seconds,
+            "throughput": docs / seconds if seconds else float("inf"),
+            "peak_rss_mb": peak_rss_mb
+        }
+        if latencies is not None:
+            latencies = np.asarray(latencies) * 1000
+            for q in (50, 90, 99):
+                result["p{q}_ms".format(q=q)] = float(np.percentile(latencies, q))
+        return result
+
+    def _timed(self, function):
+        """Median time of repeat calls of function and it's last result."""
+        times = []
+        result = None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+        return float(np.median(times)), result
+
+    @staticmethod
+    def _latencies(function, items):
+        """Time of every call of function (one item per call) and total time."""
+        latencies = []
+        start = time.perf_counter()
+        for item in items:
+            t = time.perf_counter()
+            function(item)
+            latencies.append(time.perf_counter() - t)
+        return time.perf_counter() - start, latencies
+
+    def _stage(self, stage, lang, size, n, model=None):
+        """
+        One stage on a corpus of CorpusGenerator (see _isolated()): time, latencies (None for whole-corpus
+        stages), peak RSS of the process and trained model (None except "train" stage).
+        """
+        generator = CorpusGenerator(lang, seed=self.seed)
+        latencies = None
+        if stage == "preprocess":
+            texts = generator.generate(size)["text"]
+            tp = TextPreprocessor(lang, punc=PUNCTUATION)
+            preprocess = tp.full_preprocess if self.methods is None else tp.compile(self.methods)
+            seconds, latencies = self._latencies(preprocess, texts)
+        elif stage == "train":
+            train = generator.generate(size)
+            seconds, model = self._timed(lambda: Model("label", "text", train, n=n, laplace_factor=1))
+        else:
+            texts = generator.generate(size, seed=self.seed + 1)["text"]
+            classifier = Classifier(model, lang)
+            if stage == "classify_text":
+                seconds, latencies = self._latencies(classifier.classify_text, texts)
+            else:
+                seconds, _ = self._timed(lambda: classifier.batch_scores(texts))
+            model = None
+        # Measured before the model is pickled for the parent process.
+        return seconds, latencies, _peak_rss_mb(), model
+
+    def _isolated(self, stage, lang, size, n, model=None):
+        """_stage() in a fresh process: ru_maxrss of this process keeps the peak of all earlier stages."""
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            return pool.apply(self._stage, (stage, lang, size, n, model))
+
+    def run(self):
+        """
+        Eng:
+        ==================================================
+        :return: List of results (dictionaries).
+        ==================================================
+
+        Ru:
+        ==================================================
+        :return: Список результатов (словарей).
+        ==================================================
+        """
+        results = []
+        for lang in self.langs:
+            for size in self.sizes:
+                if "preprocess" in self.stages:
+                    seconds, latencies, rss, _ = self._isolated("preprocess", lang, size, None)
+                    results.append(self._result("preprocess", lang, size, None, seconds, rss, latencies))
+
+                for n in self.ngrams:
+                    model = None
+                    if "train" in self.stages:
+                        seconds, _, rss, model = self._isolated("train", lang, size, n)
+                        results.append(self._result("train", lang, size, n, seconds, rss))
+
+                    for stage in ("classify_text", "batch_scores"):
+                        if stage not in self.stages:
+                            continue
+                        if model is None:
+                            # Training is not measured, so the model is trained once.
+                            train = CorpusGenerator(lang, seed=self.seed).generate(size)
+                            model = Model("label", "text", train, n=n, laplace_factor=1)
+                        seconds, latencies, rss, _ = self._isolated(stage, lang, size, n, model)
+                        results.append(self._result(stage, lang, size, n, seconds, rss, latencies))
+        return results
+
+    @staticmethod
+    def metadata():
+        """Environment of the run (saved with results)."""
+        return {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+
+    @staticmethod
+    def save(results, path):
+        """
+        Eng:
+        ============================================
+        :param results: Results of run();
+
+        :param path: Path to json file.
+        ============================================
+
+        Ru:
+        ============================================
+        :param results: Результаты run();
+
+        :param path: Путь к json файлу.
+        ============================================
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"metadata": Benchmark.metadata(), "results": results}, file, indent=2)
+
+    @staticmethod
+    def load(path):
+        """
+        Eng:
+        ============================================
+        :param path: Path to json file from save();
+
+        :return: List of results.
+        ============================================
+
+        Ru:
+        ============================================
+        :param path: Путь к json файлу из save();
+
+        :return: Список результатов.
+        ============================================
+        """
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)["results"]
+
+    @staticmethod
+    def compare(results, baseline, tolerance=0.1, memory_tolerance=0.1):
+        """
+        Eng:
+        ==========================================================================================
+        :param results: Results of run();
+
+        :param baseline: Results of a previous run (e.g. from load());
+
+        :param tolerance: Allowed relative loss of throughput;
+
+        :param memory_tolerance: Allowed relative growth of peak RSS;
+
+        :return: List of regressions: results whose throughput is lower (or peak RSS is higher)
+                 than that of the same stage, language, size and n in baseline by more than
+                 tolerance (memory_tolerance), with "metric" ("throughput" or "peak_rss_mb"),
+                 "baseline" (value of the metric in baseline) and "change" added.
+        ==========================================================================================
+
+        Ru:
+        ==========================================================================================
+        :param results: Результаты run();
+
+        :param baseline: Результаты предыдущего запуска (например, из load());
+
+        :param tolerance: Допустимое относительное снижение пропускной способности;
+
+        :param memory_tolerance: Допустимый относительный рост пикового RSS;
+
+        :return: Список регрессий: результаты, пропускная способность которых ниже (или пиковый
+                 RSS выше), чем у того же этапа, языка, размера и n в baseline, больше чем на
+                 tolerance (memory_tolerance), с добавленными "metric" ("throughput" или
+                 "peak_rss_mb"), "baseline" (значение метрики в baseline) и "change".
+        ==========================================================================================
+        """
+        key = lambda r: (r["stage"], r["lang"], r["docs"], r["n"])
+        base = {key(r): r for r in baseline}
+        regressions = []
+        for result in results:
+            old = base.get(key(result))
+            if old is None:
+                continue
+            change = result["throughput"] / old["throughput"] - 1
+            if change < -tolerance:
+                regressions.append(dict(result, metric="throughput", baseline=old["throughput"], change=change))
+            if old.get("peak_rss_mb"):
+                change = result["peak_rss_mb"] / old["peak_rss_mb"] - 1
+                if change > memory_tolerance:
+                    regressions.append(dict(result, metric="peak_rss_mb", baseline=old["peak_rss_mb"],
+                                            change=change))
+        return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of preprocessing, training and scoring.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--ngrams", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--langs", nargs="+", default=["eng", "ru"])
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--methods", nargs="+", default=None, help="partial preprocessing methods")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="path to save results (json)")
+    parser.add_argument("--baseline", help="path to baseline results (json)")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative loss of throughput")
+    parser.add_argument("--memory-tolerance", type=float, default=0.1, help="allowed relative growth of peak RSS")
+    args = parser.parse_args(argv)
+
+    results = Benchmark(args.sizes, args.ngrams, args.langs, args.stages, args.repeat, args.methods,
+                        args.seed).run()
+    for r in results:
+        print("{stage:>14} {lang:>4} docs={docs:<8} n={n!s:<5} {throughput:12.1f} msg/s  rss={peak_rss_mb:.0f}MB"
+              .format(**r))
+    if args.output:
+        Benchmark.save(results, args.output)
+    if args.baseline:
+        regressions = Benchmark.compare(results, Benchmark.load(args.baseline), args.tolerance,
+                                        args.memory_tolerance)
+        for r in regressions:
+            print("REGRESSION {stage} {lang} docs={docs} n={n} {metric}: {change:+.1%}".format(**r))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+
+class CorpusGenerator:
+    """
+    Eng:
+    ==========================================================================================================
+    Seeded generator of synthetic labeled corpora with Russian-like or English-like words.
+
+    Words are random strings of the language's letters, word frequencies follow Zipf's law. Every label
+    has it's own permutation of frequent words, so a part of every message depends on it's label and the
+    classifier has something to learn. The same seed always gives the same corpus.
+    ==========================================================================================================
+
+    Ru:
+    ==========================================================================================================
+    Генератор синтетических размеченных корпусов с русскоподобными или англоподобными словами с заданным
+    начальным значением.
+
+    Слова - случайные строки из букв языка, частоты слов подчиняются закону Ципфа. У каждой метки своя
+    перестановка частых слов, поэтому часть каждого сообщения зависит от его метки и классификатору есть
+    чему учиться. Одно и то же начальное значение всегда дает один и тот же корпус.
+    ==========================================================================================================
+    """
+    ALPHABETS = {
+        "ru": "абвгдеёжзийклмнопрстуфхцчшщъыьэюя",
+        "eng": "abcdefghijklmnopqrstuvwxyz"
+    }
+    PUNCTUATION = ",.!?:;"
+
+    def __init__(self, lang="eng", vocab_size=20000, zipf_exponent=1.1, mean_length=20, label_share=0.3,
+                 seed=1):
+        """
+        Eng:
+        ====================================================================================
+        :param lang: "ru" or "eng";
+
+        :param vocab_size: Amount of different words;
+
+        :param zipf_exponent: Exponent s of Zipf's law (frequency of k-th word ~ 1 / k^s);
+
+        :param mean_length: Mean amount of words in a message;
+
+        :param label_share: Share of words drawn from the label's own word ranking;
+
+        :param seed: Seed of random generator.
+        ====================================================================================
+
+        Ru:
+        ====================================================================================
+        :param lang: "ru" или "eng";
+
+        :param vocab_size: Количество различных слов;
+
+        :param zipf_exponent: Показатель s закона Ципфа (частота k-го слова ~ 1 / k^s);
+
+        :param mean_length: Среднее количество слов в сообщении;
+
+        :param label_share: Доля слов, выбираемых по собственному ранжированию слов метки;
+
+        :param seed: Начальное значение генератора случайных чисел.
+        ====================================================================================
+        """
+        self.lang = lang
+        self.vocab_size = vocab_size
+        self.zipf_exponent = zipf_exponent
+        self.mean_length = mean_length
+        self.label_share = label_share
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        letters = np.array(list(self.ALPHABETS[lang]))
+        lengths = np.clip(rng.geometric(0.2, size=vocab_size) + 1, 2, 14)
+        self.words = np.array(["".join(rng.choice(letters, size=length)) for length in lengths])
+        ranks = np.arange(1, vocab_size + 1, dtype=np.float64)
+        self.probabilities = ranks ** -zipf_exponent
+        self.probabilities /= self.probabilities.sum()
+        self.label_words = {label: rng.permutation(self.words) for label in ("pos", "neg")}
+
+    def generate(self, n_docs, seed=None):
+        """
+        Eng:
+        ============================================================================
+        :param n_docs: Amount of messages;
+
+        :param seed: Seed of random generator (the generator's seed if None);
+
+        :return: DF with "label" ("pos" or "neg") and "text" columns.
+        ============================================================================
+
+        Ru:
+        ============================================================================
+        :param n_docs: Количество сообщений;
+
+        :param seed: Начальное значение генератора (начальное значение генератора
+                     корпусов, если None);
+
+        :return: DF со столбцами "label" ("pos" или "neg") и "text".
+        ============================================================================
+        """
+        rng = np.random.default_rng(self.seed if seed is None else seed)
+        labels = rng.choice(["pos", "neg"], size=n_docs)
+        lengths = rng.poisson(self.mean_length, size=n_docs) + 1
+        total = int(lengths.sum())
+        ranks = rng.choice(self.vocab_size, size=total, p=self.probabilities)
+        own = rng.random(total) < self.label_share
+        marks = rng.random(total)
+        punctuation = rng.choice(list(self.PUNCTUATION), size=total)
+        digits = rng.integers(0, 1000, size=total)
+
+        texts = []
+        start = 0
+        for label, length in zip(labels, lengths):
+            end = start + length
+            words = np.where(own[start:end], self.label_words[label][ranks[start:end]], self.words[ranks[start:end]])
+            tokens = []
+            for i, word in enumerate(words):
+                mark = marks[start + i]
+                if mark < 0.03:
+                    word = str(digits[start + i])
+                elif mark < 0.1:
+                    word = word + punctuation[start + i]
+                tokens.append(word)
+            tokens[0] = tokens[0].capitalize()
+            texts.append(" ".join(tokens))
+            start = end
+        return pd.DataFrame({"label": labels, "text": texts})
@@ -1,7 +1,10 @@
-from math import log
+import time
+from collections import deque
+import numpy as np
 import pandas as pd
 from joblib import Parallel, delayed
-from utils.helpers import get_ngram, get_count
+from utils.DataIO import DataIO
+from utils.Instrumentation import Instrumentation
 from utils.TextPreprocessor import TextPreprocessor
 
 
@@ -9,65 +12,308 @@ class IncorrectPreprocessMethodError(ValueError):
     """If preprocess method is not "full" or "partial"."""
 
 
+class MissingDestinationError(ValueError):
+    """If streaming classification has no destination file."""
+
+
 class Classifier:
     def __init__(self, model, lang):
         self.model = model
         self.lang = lang
+        self._plans = {}
+
+    def _plan(self, preprocess, punc, regexp_lst, methods):
+        """Compiled preprocessing plan for the parameters (None if texts are not preprocessed)."""
+        if preprocess != "full" and preprocess != "partial":
+            return None
+        if preprocess == "full":
+            methods = None
+        key = (punc, tuple(regexp_lst or ()), tuple(methods) if methods is not None else None)
+        if key not in self._plans:
+            tp = TextPreprocessor(punc=punc, regexp_lst=regexp_lst, lang=self.lang)
+            self._plans[key] = tp.compile(methods)
+        return self._plans[key]
 
     def classify_text(self, text, preprocess=None, punc=None, regexp_lst=None, methods=None):
         # if (preprocess != "full") or (preprocess != "partial"):
         #     raise IncorrectPreprocessMethodError(
         #         "Method \"{prep}\" is incorrect. Correct method is \"full\" or \"partial\"")
-        prepmsg = ""
-        if preprocess == "full":
-            tp = TextPreprocessor(punc=punc, regexp_lst=regexp_lst, lang=self.lang)
-            prepmsg = get_ngram((tp.full_preprocess(text)), self.model.n)
-        if preprocess == "partial":
-            tp = TextPreprocessor(punc=punc, regexp_lst=regexp_lst, part_methods=methods, lang=self.lang)
-            prepmsg = get_ngram(tp.partial_preprocess(text), self.model.n)
-        if preprocess is None:
-            prepmsg = get_ngram(text, self.model.n)
-        try:
-            pos = log(self.model.pos_label_count /
-                      (self.model.pos_label_count + self.model.neg_label_count))
+        plan = self._plan(preprocess, punc, regexp_lst, methods)
+        if plan is not None:
+            text = plan(text)
+        start = time.perf_counter()
+        ngrams = self.model.ngrams(text)
+        score = self.model.log_odds(ngrams)
+        if Instrumentation.enabled:
+            Instrumentation.record("classify_text.score", time.perf_counter() - start, ngrams=len(ngrams))
+        if score != score:
+            return None
+        if score > 0:
+            return "pos"
+        else:
+            return "neg"
 
-            neg = log(self.model.neg_label_count /
-                      (self.model.pos_label_count + self.model.neg_label_count))
+    def batch_scores(self, texts, preprocess=None, punc=None, regexp_lst=None, methods=None, n_jobs=8):
+        """
+        Eng:
+        ==============================================================================================
+        :param texts: Iterable of source texts;
 
-            for ngram in prepmsg.split("|"):
-                pos += log((get_count(self.model.posNgrams, ngram) + self.model.lp) /
-                           (self.model.pos_Ngram_count + self.model.lp * self.model.unique_Ngram_count))
+        :param preprocess: "full", "partial" or None (texts are already preprocessed);
 
-                neg += log((get_count(self.model.negNgrams, ngram) + self.model.lp) /
-                           (self.model.neg_Ngram_count + self.model.lp * self.model.unique_Ngram_count))
+        :param punc: String which contains punctuational symbols;
 
-            if pos > neg:
-                return "pos"
-            else:
-                return "neg"
-        except ValueError:
-            return None
+        :param regexp_lst: List of regular expressions for preprocessing;
+
+        :param methods: List of methods names for partial preprocess;
+
+        :param n_jobs: Number of processors for preprocessing;
+
+        :return: Array of log-odds log P(pos | text) - log P(neg | text), NaN if it is undefined.
+
+        Texts are converted into sparse matrix of n-gram counts which is scored with one
+        matrix-vector product.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        :param texts: Последовательность исходных текстов;
+
+        :param preprocess: "full", "partial" или None (тексты уже предобработаны);
+
+        :param punc: Строка, содержащая пунктуационные символы;
+
+        :param regexp_lst: Список регулярных выражений для предобработки;
+
+        :param methods: Список с именами методов для частичной предобработки;
+
+        :param n_jobs: Число процессов для предобработки;
+
+        :return: Массив логарифмов отношения шансов log P(pos | текст) - log P(neg | текст), NaN, если
+                 оно не определено.
+
+        Тексты преобразуются в разреженную матрицу количеств n-грамм, которая оценивается одним
+        умножением матрицы на вектор.
+        ==============================================================================================
+        """
+        plan = self._plan(preprocess, punc, regexp_lst, methods)
+        if plan is not None:
+            preprocess_text = Instrumentation.wrap(plan)
+            texts = list(Instrumentation.unwrap(Parallel(n_jobs=n_jobs)(delayed(preprocess_text)(text)
+                                                                        for text in texts)))
+        return self._score_texts(texts, "batch_scores")
+
+    def _score_texts(self, texts, stage):
+        """Scores preprocessed texts with one count matrix, records time of both steps if instrumented."""
+        start = time.perf_counter()
+        X, unseen = self.model.count_matrix(self.model.ngrams(text) for text in texts)
+        counted = time.perf_counter()
+        scores = self.model.batch_log_odds(X, unseen)
+        if Instrumentation.enabled:
+            rows = X.shape[0]
+            Instrumentation.record(stage + ".count_matrix", counted - start, calls=rows,
+                                   ngrams=int(X.sum() + unseen.sum()))
+            Instrumentation.record(stage + ".score", time.perf_counter() - counted, calls=rows)
+        return scores
+
+    @staticmethod
+    def scores_to_labels(scores):
+        """
+        Eng:
+        =================================================================
+        :param scores: Array of log-odds from batch_scores();
+
+        :return: Array of labels: "pos", "neg" or None for NaN scores.
+        =================================================================
+
+        Ru:
+        =================================================================
+        :param scores: Массив логарифмов шансов из batch_scores();
+
+        :return: Массив меток: "pos", "neg" или None для NaN значений.
+        =================================================================
+        """
+        labels = np.where(scores > 0, "pos", "neg").astype(object)
+        labels[np.isnan(scores)] = None
+        return labels
 
     def batch_classify(self, src_csv_path, text_column, label_column, dst_csv_path=None,
-                       preprocess=None, punc=None, regexp_lst=None, methods=None, n_jobs=8):
+                       preprocess=None, punc=None, regexp_lst=None, methods=None, n_jobs=8,
+                       vectorized=True, score_column=None, chunksize=None, max_in_flight=None):
+        """
+        Eng:
+        ==============================================================================================
+        :param src_csv_path: Path to source CSV, Parquet or Arrow IPC file (see utils.DataIO);
+
+        :param text_column: Name of column with texts;
+
+        :param label_column: Name of new column with predicted labels;
+
+        :param dst_csv_path: Path to save result (if not None);
+
+        :param preprocess: "full", "partial" or None;
+
+        :param punc: String which contains punctuational symbols;
+
+        :param regexp_lst: List of regular expressions for preprocessing;
 
-        df = pd.read_csv(src_csv_path, index_col=0)
+        :param methods: List of methods names for partial preprocess;
+
+        :param n_jobs: Number of processors;
+
+        :param vectorized: Score all texts with batch_scores() instead of one joblib task per text;
+
+        :param score_column: Name of new column with raw log-odds (vectorized mode only);
+
+        :param chunksize: If not None, streaming mode: source is read, classified and appended to
+                          dst_csv_path by chunks of chunksize rows, so memory use doesn't depend on the
+                          size of the file (compressed files like .gz or .zst are read by extension);
+
+        :param max_in_flight: Max amount of chunks preprocessed by workers at once in streaming mode
+                              (2 * n_jobs if None);
+
+        :return: t: DF with source columns (except text column) and predicted labels (amount of
+                 classified rows in streaming mode).
+
+        Output format is chosen by extension of dst_csv_path. If the source is Parquet or Arrow IPC
+        (vectorized mode), only the text column is converted into Python strings: prediction columns
+        are added to the source Arrow table and the other columns are written without going through
+        pandas.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        :param src_csv_path: Путь к исходному файлу CSV, Parquet или Arrow IPC (см. utils.DataIO);
+
+        :param text_column: Имя столбца с текстами;
+
+        :param label_column: Имя нового столбца с предсказанными метками;
+
+        :param dst_csv_path: Путь для сохранения результата (если не None);
+
+        :param preprocess: "full", "partial" или None;
+
+        :param punc: Строка, содержащая пунктуационные символы;
+
+        :param regexp_lst: Список регулярных выражений для предобработки;
+
+        :param methods: Список с именами методов для частичной предобработки;
+
+        :param n_jobs: Число процессов;
+
+        :param vectorized: Оценивать все тексты с помощью batch_scores() вместо отдельной задачи joblib
+                           на каждый текст;
+
+        :param score_column: Имя нового столбца с логарифмами шансов (только для vectorized);
+
+        :param chunksize: Если не None, потоковый режим: исходный файл читается, классифицируется и
+                          дописывается в dst_csv_path частями по chunksize строк, поэтому расход памяти
+                          не зависит от размера файла (сжатые файлы, например .gz или .zst, читаются по
+                          расширению);
+
+        :param max_in_flight: Максимальное количество частей, одновременно обрабатываемых процессами в
+                              потоковом режиме (2 * n_jobs, если None);
+
+        :return: t: DF с исходными столбцами (кроме столбца с текстом) и предсказанными метками
+                 (количество классифицированных строк в потоковом режиме).
+
+        Формат результата выбирается по расширению dst_csv_path. Если исходный файл в формате Parquet
+        или Arrow IPC (режим vectorized), в строки Python преобразуется только столбец с текстом:
+        столбцы предсказаний добавляются к исходной таблице Arrow, а остальные столбцы записываются,
+        минуя pandas.
+        ==============================================================================================
+        """
+        if chunksize is not None:
+            return self._stream_classify(src_csv_path, text_column, label_column, dst_csv_path, preprocess, punc,
+                                         regexp_lst, methods, n_jobs, score_column, chunksize, max_in_flight)
+
+        if vectorized and DataIO.is_columnar(src_csv_path):
+            return self._columnar_classify(src_csv_path, text_column, label_column, dst_csv_path, preprocess, punc,
+                                           regexp_lst, methods, n_jobs, score_column)
+
+        df = DataIO.read(src_csv_path)
         t = pd.DataFrame()
 
         for key in df.keys():
             if key != text_column:
                 t[key] = df[key]
 
-        if preprocess == "full":
-            t[label_column] = Parallel(n_jobs=n_jobs)(delayed(
-                self.classify_text)(text, "full", punc, regexp_lst) for text in df[text_column])
-        if preprocess == "partial":
-            t[label_column] = Parallel(n_jobs=n_jobs)(delayed(
-                self.classify_text)(text, "partial", punc, regexp_lst, methods) for text in df[text_column])
-        if preprocess is None:
-            t[label_column] = Parallel(n_jobs=n_jobs)(delayed(
-                self.classify_text)(text) for text in df[text_column])
+        if vectorized:
+            scores = self.batch_scores(df[text_column], preprocess, punc, regexp_lst, methods, n_jobs)
+            t[label_column] = self.scores_to_labels(scores)
+            if score_column is not None:
+                t[score_column] = scores
+        else:
+            if preprocess == "full":
+                t[label_column] = Parallel(n_jobs=n_jobs)(delayed(
+                    self.classify_text)(text, "full", punc, regexp_lst) for text in df[text_column])
+            if preprocess == "partial":
+                t[label_column] = Parallel(n_jobs=n_jobs)(delayed(
+                    self.classify_text)(text, "partial", punc, regexp_lst, methods) for text in df[text_column])
+            if preprocess is None:
+                t[label_column] = Parallel(n_jobs=n_jobs)(delayed(
+                    self.classify_text)(text) for text in df[text_column])
 
         if dst_csv_path is not None:
-            t.to_csv(dst_csv_path)
+            DataIO.write(t, dst_csv_path)
         return t
+
+    def _columnar_classify(self, src_path, text_column, label_column, dst_path, preprocess, punc, regexp_lst,
+                           methods, n_jobs, score_column):
+        """batch_classify() for Parquet or Arrow IPC source: predictions are added to the Arrow table."""
+        table = DataIO.read_table(src_path)
+        scores = self.batch_scores(table.column(text_column).to_pylist(), preprocess, punc, regexp_lst, methods,
+                                   n_jobs)
+        columns = {label_column: self.scores_to_labels(scores)}
+        if score_column is not None:
+            columns[score_column] = scores
+        table = DataIO.with_columns(table, columns, drop=[text_column])
+        if dst_path is not None:
+            DataIO.write_table(table, dst_path)
+        return table.to_pandas()
+
+    def _stream_classify(self, src_csv_path, text_column, label_column, dst_csv_path, preprocess, punc, regexp_lst,
+                         methods, n_jobs, score_column, chunksize, max_in_flight):
+        """Streaming mode of batch_classify()."""
+        if dst_csv_path is None:
+            raise MissingDestinationError("Streaming classification needs dst_csv_path!")
+        reader = DataIO.iter_batches(src_csv_path, batch_size=chunksize)
+        plan = self._plan(preprocess, punc, regexp_lst, methods)
+        if plan is None:
+            chunks = ((chunk, chunk[text_column]) for chunk in reader)
+        else:
+            # Chunks are kept until their preprocessed texts come back (joblib keeps the order).
+            pending = deque()
+
+            preprocess_batch = Instrumentation.wrap(plan.batch)
+
+            def dispatched():
+                for chunk in reader:
+                    pending.append(chunk)
+                    yield delayed(preprocess_batch)(chunk[text_column].tolist())
+
+            results = Parallel(n_jobs=n_jobs, return_as="generator",
+                               pre_dispatch=max_in_flight or 2 * n_jobs)(dispatched())
+            chunks = ((pending.popleft(), texts) for texts in Instrumentation.unwrap(results))
+
+        def classified(chunk, texts):
+            scores = self._score_texts(texts, "batch_classify")
+            t = chunk.drop(columns=[text_column])
+            t[label_column] = self.scores_to_labels(scores)
+            if score_column is not None:
+                t[score_column] = scores
+            return t
+
+        rows = 0
+        writer = DataIO.writer(dst_csv_path)
+        try:
+            for chunk, texts in chunks:
+                t = classified(chunk, texts)
+                writer.write(t)
+                rows += len(t)
+            if not rows:
+                # Empty source still gives a destination file with all columns.
+                writer.write(classified(DataIO.empty(src_csv_path), []))
+        finally:
+            writer.close()
+        return rows
@@ -1,7 +1,12 @@
-from pandas import read_csv
-from classification.Model import Model
+import numpy as np
+from joblib import Parallel, delayed
+from pandas import DataFrame
+from classification.Model import Model, _count_shard
 from classification.Tester import Tester
-from classification.Classifier import Classifier
+from utils.DataIO import DataIO
+from utils.DataSplitter import DataSplitter
+from utils.helpers import iter_ngrams
+from utils.Instrumentation import Instrumentation
 
 
 class CrossValidator:
@@ -10,37 +15,245 @@ class CrossValidator:
         self.ngrams = ngrams
         self.lang = lang
 
-    def validate(self, train_data_path, validation_data_path):
-        cv_errs = []
-        val_df = read_csv(validation_data_path, index_col=0)
+    def grid_errors(self, train_df, val_df):
+        """
+        Eng:
+        ================================================================================================
+        :param train_df: DF with training set ("label" and "text" columns);
+
+        :param val_df: DF with validation set ("label" and "text" columns);
+
+        :return: errors, models: Matrix (ngrams x lpfs) of validation errors and list of models
+                 (one for every n, with Laplace factor lpfs[0]).
+
+        Counts don't depend on Laplace factor, so only one model is trained for every n. Validation
+        texts are converted into count matrix once for every n and all Laplace factors are scored
+        together with Model.grid_log_odds().
+        ================================================================================================
+
+        Ru:
+        ================================================================================================
+        :param train_df: DF с тренировочным набором (столбцы "label" и "text");
+
+        :param val_df: DF с валидационным набором (столбцы "label" и "text");
 
+        :return: errors, models: Матрица (ngrams x lpfs) ошибок на валидации и список моделей
+                 (по одной для каждого n, с множителем Лапласа lpfs[0]).
+
+        Счетчики не зависят от множителя Лапласа, поэтому для каждого n обучается только одна
+        модель. Валидационные тексты преобразуются в матрицу количеств один раз для каждого n, а все
+        множители Лапласа оцениваются вместе с помощью Model.grid_log_odds().
+        ================================================================================================
+        """
+        errors = np.zeros((len(self.ngrams), len(self.lpfs)))
         models = []
-        print("============================================================")
-        for ngram in self.ngrams:
-            for lp in self.lpfs:
-                print("Creating model M({lf}, {n}) ...".format(lf=lp, n=ngram))
-                model = Model(
-                    "label",
-                    "text",
-                    read_csv(train_data_path, index_col=0),
-                    n=ngram,
-                    laplace_factor=lp)
-                print("Model successfully created!")
-
-                models.append(model)
-
-                print("Starting validation for M({lf}, {n}) ...".format(lf=lp, n=ngram))
-                classifier = Classifier(model, lang=self.lang)
-                t = Tester.test(classifier, val_df)
-                cv_errs.append((t, lp, ngram))
-                print("Validation successfully complete!")
+        for i, ngram in enumerate(self.ngrams):
+            print("Creating model M(*, {n}) ...".format(n=ngram))
+            model = Model("label", "text", train_df, n=ngram, laplace_factor=self.lpfs[0])
+            print("Model successfully created!")
+            models.append(model)
 
+            print("Starting validation for M(*, {n}) ...".format(n=ngram))
+            X, unseen = model.count_matrix(iter_ngrams(text, ngram) for text in val_df[model.tcn])
+            errors[i] = Tester.error_rates(model.grid_log_odds(X, unseen, self.lpfs), val_df[model.lcn])
+            print("Validation successfully complete!")
+
+            for lp, t in zip(self.lpfs, errors[i]):
                 print("Result of validation: E(M({lf}, {n})) = {ce}".format(lf=lp, n=ngram, ce=t))
-                print("============================================================")
-                print()
-        print("Best model is M({lf}, {n}) = ".format(lf=min(cv_errs)[1], n=min(cv_errs)[2]))
-        print(models[cv_errs.index(min(cv_errs))])
-        return models[cv_errs.index(min(cv_errs))], min(cv_errs)[1], min(cv_errs)[2]
+            print("============================================================")
+            print()
+        return errors, models
+
+    def kfold_errors(self, df, k=5, folds=None, n_jobs=8):
+        """
+        Eng:
+        ================================================================================================
+        :param df: DF with the whole data set ("label" and "text" columns);
+
+        :param k: Number of folds;
+
+        :param folds: List of arrays with row positions of every fold (if None, label-stratified folds
+                      from DataSplitter.kfold_indices() are used);
+
+        :param n_jobs: Number of processors;
+
+        :return: errors, models: Array (folds x ngrams x lpfs) of validation errors and list of models
+                 counted on the whole data set (one for every n, with Laplace factor lpfs[0]).
+
+        Every fold is counted once for every n in a separate process (joblib). The model of the whole
+        data set is the merge of fold models, and the training model of fold i is the whole model minus
+        the model of fold i (Model.subtract()), so k-fold validation costs about one training pass.
+        ================================================================================================
+
+        Ru:
+        ================================================================================================
+        :param df: DF со всем набором данных (столбцы "label" и "text");
+
+        :param k: Число блоков;
+
+        :param folds: Список массивов с номерами строк каждого блока (если None, используются
+                      стратифицированные по меткам блоки из DataSplitter.kfold_indices());
+
+        :param n_jobs: Число процессов;
+
+        :return: errors, models: Массив (блоки x ngrams x lpfs) ошибок на валидации и список моделей,
+                 подсчитанных на всем наборе данных (по одной для каждого n, с множителем Лапласа
+                 lpfs[0]).
+
+        Каждый блок подсчитывается один раз для каждого n в отдельном процессе (joblib). Модель всего
+        набора данных - объединение моделей блоков, а тренировочная модель блока i - модель всего
+        набора за вычетом модели блока i (Model.subtract()), поэтому перекрестная проверка по k блокам
+        стоит примерно одного прохода обучения.
+        ================================================================================================
+        """
+        if folds is None:
+            folds = DataSplitter.kfold_indices(len(df), k, df["label"])
+        texts = [df["text"].iloc[fold].tolist() for fold in folds]
+        labels = [df["label"].iloc[fold].tolist() for fold in folds]
+
+        print("Counting {k} folds ...".format(k=len(folds)))
+        count_shard = Instrumentation.wrap(_count_shard)
+        parts = list(Instrumentation.unwrap(Parallel(n_jobs=n_jobs)(
+            delayed(count_shard)(texts[i], labels[i], "label", "text", ngram, self.lpfs[0])
+            for ngram in self.ngrams for i in range(len(folds)))))
+        print("Folds successfully counted!")
+
+        errors = np.zeros((len(folds), len(self.ngrams), len(self.lpfs)))
+        models = []
+        for j, ngram in enumerate(self.ngrams):
+            fold_models = parts[j * len(folds):(j + 1) * len(folds)]
+            model = Model("label", "text", n=ngram, laplace_factor=self.lpfs[0])
+            for part in fold_models:
+                model._add(part)
+            model.compile()
+            models.append(model)
+
+            for i, part in enumerate(fold_models):
+                train_model = model.subtract(part)
+                X, unseen = train_model.count_matrix(iter_ngrams(text, ngram) for text in texts[i])
+                errors[i, j] = Tester.error_rates(train_model.grid_log_odds(X, unseen, self.lpfs), labels[i])
+            for lp, t in zip(self.lpfs, errors[:, j].mean(axis=0)):
+                print("Result of {k}-fold validation: E(M({lf}, {n})) = {ce}".format(k=len(folds), lf=lp, n=ngram,
+                                                                                    ce=t))
+            print("============================================================")
+            print()
+        return errors, models
+
+    def validate_kfold(self, data_path, k=5, folds=None, n_jobs=8):
+        """
+        Eng:
+        ===============================================================================================
+        :param data_path: Path to CSV, Parquet or Arrow IPC file with the whole data set;
+
+        :param k: Number of folds;
+
+        :param folds: List of arrays with row positions of every fold (see kfold_errors());
+
+        :param n_jobs: Number of processors;
+
+        :return: model, lp, n: Model counted on the whole data set with the least mean k-fold error,
+                 it's Laplace factor and n-parameter (like validate()).
+        ===============================================================================================
+
+        Ru:
+        ===============================================================================================
+        :param data_path: Путь к файлу CSV, Parquet или Arrow IPC со всем набором данных;
+
+        :param k: Число блоков;
+
+        :param folds: Список массивов с номерами строк каждого блока (см. kfold_errors());
+
+        :param n_jobs: Число процессов;
+
+        :return: model, lp, n: Модель, подсчитанная на всем наборе данных, с наименьшей средней
+                 ошибкой по k блокам, ее множитель Лапласа и параметр n (как в validate()).
+        ===============================================================================================
+        """
+        print("============================================================")
+        errors, models = self.kfold_errors(self._read(data_path), k, folds, n_jobs)
+        return self._best(errors.mean(axis=0), models)
+
+    @staticmethod
+    def _read(path):
+        """Reads only "label" and "text" columns of CSV, Parquet or Arrow IPC data set (see utils.DataIO)."""
+        return DataIO.read(path, ["label", "text"])
+
+    def _best(self, errors, models):
+        """Model with the least error (ties are broken by smaller lp and n), it's lp and n."""
+        cv_errs = [(errors[i, j], lp, ngram) for i, ngram in enumerate(self.ngrams)
+                   for j, lp in enumerate(self.lpfs)]
+        t, lp, ngram = min(cv_errs)
+        model = models[self.ngrams.index(ngram)]
+        model.lp = lp
+        model.compile()
+        print("Best model is M({lf}, {n}) = ".format(lf=lp, n=ngram))
+        print(model)
+        return model, lp, ngram
+
+    @staticmethod
+    def pruning_report(model, val_df, min_counts=(), top_ks=(), target_sizes=()):
+        """
+        Eng:
+        ================================================================================================
+        :param model: Trained Model() object;
+
+        :param val_df: DF with validation set (model's label and text columns);
+
+        :param min_counts: Values of min_count to try (see Model.prune());
+
+        :param top_ks: Values of top_k to try;
+
+        :param target_sizes: Values of target_size (bytes) to try;
+
+        :return: DF with one row for the unpruned model and one for every pruning parameter: "mode",
+                 "value", "ngrams" (unique n-grams), "json_bytes" (see Model.json_size()) and "error"
+                 (validation error rate), sorted by size, to choose an operating point.
+        ================================================================================================
+
+        Ru:
+        ================================================================================================
+        :param model: Обученный объект Model();
+
+        :param val_df: DF с валидационным набором (столбцы меток и текстов модели);
+
+        :param min_counts: Проверяемые значения min_count (см. Model.prune());
+
+        :param top_ks: Проверяемые значения top_k;
+
+        :param target_sizes: Проверяемые значения target_size (в байтах);
+
+        :return: DF с одной строкой для исходной модели и по одной для каждого параметра удаления:
+                 "mode", "value", "ngrams" (уникальные n-граммы), "json_bytes" (см. Model.json_size())
+                 и "error" (доля ошибок на валидации), отсортированный по размеру, для выбора рабочей
+                 точки.
+        ================================================================================================
+        """
+        # Validation texts are converted into n-grams once, every pruned model only looks them up.
+        docs = [list(iter_ngrams(text, model.n)) for text in val_df[model.tcn]]
+        labels = val_df[model.lcn]
+        candidates = [("none", None, model)]
+        candidates += [("min_count", v, model.prune(min_count=v)) for v in min_counts]
+        candidates += [("top_k", v, model.prune(top_k=v)) for v in top_ks]
+        candidates += [("target_size", v, model.prune(target_size=v)) for v in target_sizes]
+
+        rows = []
+        for mode, value, pruned in candidates:
+            X, unseen = pruned.count_matrix(docs)
+            rows.append({
+                "mode": mode,
+                "value": value,
+                "ngrams": pruned.unique_Ngram_count,
+                "json_bytes": pruned.json_size(),
+                "error": Tester.error_rates(pruned.batch_log_odds(X, unseen), labels)
+            })
+        return DataFrame(rows).sort_values("json_bytes", kind="stable").reset_index(drop=True)
+
+    def validate(self, train_data_path, validation_data_path):
+        val_df = self._read(validation_data_path)
+
+        print("============================================================")
+        errors, models = self.grid_errors(self._read(train_data_path), val_df)
+        return self._best(errors, models)
 
     def validate_for_stat_with_methods(self, path):
         cv_errs = []
@@ -49,27 +262,11 @@ class CrossValidator:
         i = 0
         print("============================================================")
         for train, val in path:
-            for ngram in self.ngrams:
-                for lp in self.lpfs:
-                    val_df = read_csv(val, index_col=0)
-                    print("Creating model M({lf}, {n}) ...".format(lf=lp, n=ngram))
-                    model = Model(
-                        "label",
-                        "text",
-                        read_csv(train, index_col=0),
-                        n=ngram,
-                        laplace_factor=lp)
-                    print("Model successfully created!")
+            errors, _ = self.grid_errors(self._read(train), self._read(val))
+            for ngram, row in zip(self.ngrams, errors):
+                for lp, t in zip(self.lpfs, row):
                     x.append((ngram, lp, i))
                     lps.append(lp)
-                    print("Starting validation for M({lf}, {n}) ...".format(lf=lp, n=ngram))
-                    classifier = Classifier(model, lang=self.lang)
-                    t = Tester.test(classifier, val_df)
-                    cv_errs.append(t)
-                    print("Validation successfully complete!")
-
-                    print("Result of validation: E(M({lf}, {n})) = {ce}".format(lf=lp, n=ngram, ce=t))
-                    print("============================================================")
-                    print()
+                    cv_errs.append(float(t))
             i += 1
         return cv_errs, x, lps
@@ -0,0 +1,126 @@
+import json
+import os
+
+
+class DeltaLog:
+    """
+    Eng:
+    ==========================================================================================================
+    Append-only write-ahead log of model updates (one json record per line).
+
+    Every record holds the count changes of one update batch and it's sequence number. A record is written
+    with one write and synced to disk before append() returns, so after a crash the log contains every
+    finished batch; a partially written last line is cut off when the log is opened again.
+    ==========================================================================================================
+
+    Ru:
+    ==========================================================================================================
+    Журнал обновлений модели с записью только в конец (одна json запись в строке).
+
+    Каждая запись содержит изменения счетчиков одного пакета обновлений и ее порядковый номер. Запись
+    пишется одной операцией и сбрасывается на диск до возврата из append(), поэтому после сбоя журнал
+    содержит все завершенные пакеты; частично записанная последняя строка отрезается при следующем открытии.
+    ==========================================================================================================
+    """
+    def __init__(self, path, fsync=True):
+        """
+        Eng:
+        ========================================================
+        :param path: Path to log file (created if it's absent);
+
+        :param fsync: Sync every record to disk.
+        ========================================================
+
+        Ru:
+        ========================================================
+        :param path: Путь к файлу журнала (создается, если его
+                     нет);
+
+        :param fsync: Сбрасывать каждую запись на диск.
+        ========================================================
+        """
+        self.path = path
+        self.fsync = fsync
+        self._repair()
+        self._file = open(path, "ab")
+
+    def _repair(self):
+        """Cuts off a partially written last line."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as file:
+            data = file.read()
+            if data and not data.endswith(b"\n"):
+                file.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, record):
+        """
+        Eng:
+        ===========================================
+        :param record: Dictionary with "seq" key.
+        ===========================================
+
+        Ru:
+        ===========================================
+        :param record: Словарь с ключом "seq".
+        ===========================================
+        """
+        self._file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    @staticmethod
+    def records(path, after_seq=0):
+        """
+        Eng:
+        ======================================================================
+        :param path: Path to log file;
+
+        :param after_seq: Records with sequence number <= after_seq are skipped
+                          (they are already in the snapshot);
+
+        :return: Generator of records in order of writing.
+        ======================================================================
+
+        Ru:
+        ======================================================================
+        :param path: Путь к файлу журнала;
+
+        :param after_seq: Записи с номером <= after_seq пропускаются (они уже
+                          есть в снимке);
+
+        :return: Генератор записей в порядке их записи.
+        ======================================================================
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # Partially written last line.
+                    return
+                record = json.loads(line.decode("utf-8"))
+                if record["seq"] > after_seq:
+                    yield record
+
+    def clear(self):
+        """
+        Eng:
+        ==================================================
+        Removes all records (after compaction).
+        ==================================================
+
+        Ru:
+        ==================================================
+        Удаляет все записи (после уплотнения).
+        ==================================================
+        """
+        self._file.truncate(0)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Closes log file."""
+        self._file.close()
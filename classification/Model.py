@@ -1,13 +1,70 @@
 import json
+import os
+import time
+from array import array
 from collections import Counter
-from utils.helpers import get_ngram
+from functools import lru_cache
+from itertools import islice
+from math import log
+import numpy as np
+from joblib import Parallel, delayed
+from scipy.sparse import csr_matrix
+from utils.DataIO import DataIO
+from utils.helpers import iter_ngrams, iter_token_ngrams, tokenize
+from utils.Instrumentation import Instrumentation
 from utils.TextPreprocessor import TextPreprocessor
+from classification.DeltaLog import DeltaLog
+from classification.Vocabulary import Vocabulary, MappedVocabulary, HashingVocabulary, ngram_hash
 
 
 class IncorrectLabelError(KeyError):
     """If label is not "pos" or "neg"."""
 
 
+class IncompatibleModelsError(ValueError):
+    """If models with different n-parameters are merged or subtracted model is not a part of the model."""
+
+
+class IncorrectModelFileError(ValueError):
+    """If binary model file has unknown format."""
+
+
+class DeltaLogNotAttachedError(ValueError):
+    """If compact() is called before attach_log()."""
+
+
+# Binary model file: magic, header length (uint64), json header, arrays aligned to _ALIGNMENT bytes.
+_MAGIC = b"NBMODEL1"
+_ALIGNMENT = 64
+_BINARY_ARRAYS = ("hashes", "offsets", "keys", "pos_counts", "neg_counts", "log_ratios")
+
+
+def _log_diff(a, b):
+    """log(a) - log(b), or NaN if one of the logarithms is undefined."""
+    try:
+        return log(a) - log(b)
+    except (ValueError, ZeroDivisionError):
+        return float("nan")
+
+
+# Default preprocessing parameters of update() and update_many().
+_UPDATE_PUNC = "\\r\\n\\$/#^@'=+_:;*-~`)({}[]|<>.,&%!?\'\""
+_UPDATE_REGEXPS = ("bSubject", "bsubject")
+
+
+@lru_cache(maxsize=None)
+def _update_plan(lang, punc, regexps, methods):
+    """Compiled preprocessing plan for update_many() (built once for every set of parameters)."""
+    return TextPreprocessor(lang=lang, punc=punc, regexp_lst=list(regexps)).compile(methods)
+
+
+def _count_shard(texts, labels, label_column_name, text_column_name, n, laplace_factor):
+    """Counts one shard of the corpus (runs in a worker process)."""
+    m = Model(label_column_name, text_column_name, n=n, laplace_factor=laplace_factor)
+    m._count(texts, labels)
+    return m
+
+
 class Model:
     def __init__(self, label_column_name=None, text_column_name=None, df=None, n=3, laplace_factor=None):
         """
@@ -46,27 +103,538 @@ class Model:
         self.lcn = label_column_name if label_column_name is not None else ""
         self.tcn = text_column_name if text_column_name is not None else ""
         self.lp = laplace_factor if laplace_factor is not None else 0
-        self.total_msg_count = len(df) if df is not None else 0
+        self.total_msg_count = 0
+
+        # Every n-gram is stored once in the vocabulary, counts are arrays indexed by n-gram id.
+        self.vocab = Vocabulary()
+        self.pos_counts = np.zeros(0, dtype=np.int64)
+        self.neg_counts = np.zeros(0, dtype=np.int64)
+
+        self.pos_label_count = 0
+        self.neg_label_count = 0
+
+        self.pos_Ngram_count = 0
+        self.neg_Ngram_count = 0
+
+        self.unique_Ngram_count = 0
+
+        # Compiled scoring tables (see compile()), never saved with the model.
+        self._log_ratios = None
+        self._log_ratio_list = None
+        self._unseen_log_ratio = None
+        self._ngram_log_offset = None
+        self._prior_log_odds = None
+
+        # Sequence number of the last delta log record included in the counts (see attach_log()).
+        self.delta_seq = 0
+        self._delta_log = None
+        self._snapshot_path = None
+
+        if df is not None:
+            self._count(df[text_column_name], df[label_column_name])
+            self.compile()
+
+    def __getstate__(self):
+        # Open delta log stays with the original object.
+        state = self.__dict__.copy()
+        state["_delta_log"] = None
+        return state
+
+    @property
+    def posNgrams(self):
+        """Dictionary with positive n-gram as key and amount of that n-gram as value."""
+        return {ngram: int(count) for ngram, count in zip(self.vocab, self.pos_counts) if count}
+
+    @property
+    def negNgrams(self):
+        """Dictionary with negative n-gram as key and amount of that n-gram as value."""
+        return {ngram: int(count) for ngram, count in zip(self.vocab, self.neg_counts) if count}
+
+    def ngrams(self, text):
+        """
+        Eng:
+        ======================================================
+        :param text: Preprocessed text;
+
+        :return: List of text's n-grams used for scoring (see
+                 log_odds() and count_matrix()).
+        ======================================================
+
+        Ru:
+        ======================================================
+        :param text: Предобработанный текст;
+
+        :return: Список n-грамм текста, используемых для
+                 оценки (см. log_odds() и count_matrix()).
+        ======================================================
+        """
+        return list(iter_ngrams(text, self.n))
+
+    def _count(self, texts, labels, delta=None):
+        """
+        Adds n-grams of texts to the counts, labels other than "pos" and "neg" are only counted in total.
+        Returns ids of touched n-grams (None if all counts were recomputed, see _add_ids()). If delta is
+        a {"pos": Counter(), "neg": Counter()} dictionary, added n-grams are also counted in it.
+        """
+        return self._count_docs((iter_ngrams(text, self.n) for text in texts), labels, delta)
+
+    def _count_docs(self, docs, labels, delta=None):
+        """_count() for texts which are already split into n-grams (docs is an iterable of iterables)."""
+        self._ensure_writable()
+        start = time.perf_counter()
+        msgs = self.total_msg_count
+        pos_ids = array("q")
+        neg_ids = array("q")
+        add_all = self.vocab.add_all
+        for doc, label in zip(docs, labels):
+            self.total_msg_count += 1
+            if label == "pos" or label == "neg":
+                ngrams = list(doc)
+                if delta is not None:
+                    delta[label].update(ngrams)
+                if label == "pos":
+                    self.pos_label_count += 1
+                    pos_ids.extend(add_all(ngrams))
+                else:
+                    self.neg_label_count += 1
+                    neg_ids.extend(add_all(ngrams))
+        touched = self._add_ids(np.frombuffer(pos_ids, dtype=np.int64), np.frombuffer(neg_ids, dtype=np.int64))
+        if Instrumentation.enabled:
+            Instrumentation.record("train.count", time.perf_counter() - start, calls=self.total_msg_count - msgs,
+                                   ngrams=len(pos_ids) + len(neg_ids))
+        return touched
+
+    def _add_ids(self, pos_ids, neg_ids):
+        """
+        Adds occurrences of n-gram ids to the counts and totals. A batch which is small compared with the
+        vocabulary only touches it's own ids and their ids are returned, a big one is added with bincount
+        over the whole vocabulary and None is returned.
+        """
+        size = len(self.vocab)
+        self.pos_counts = self._grown(self.pos_counts, size)
+        self.neg_counts = self._grown(self.neg_counts, size)
+        self.pos_Ngram_count += len(pos_ids)
+        self.neg_Ngram_count += len(neg_ids)
+        if (len(pos_ids) + len(neg_ids)) * 8 >= size:
+            self.pos_counts += np.bincount(pos_ids, minlength=size)
+            self.neg_counts += np.bincount(neg_ids, minlength=size)
+            self.unique_Ngram_count = int(np.count_nonzero(self.pos_counts + self.neg_counts))
+            return None
+        touched = np.unique(np.concatenate((pos_ids, neg_ids)))
+        self.unique_Ngram_count += int(np.count_nonzero(self.pos_counts[touched] + self.neg_counts[touched] == 0))
+        np.add.at(self.pos_counts, pos_ids, 1)
+        np.add.at(self.neg_counts, neg_ids, 1)
+        return touched
+
+    def _ensure_writable(self):
+        """Copies vocabulary and counts of memory-mapped model (see read_binary()) into memory."""
+        if isinstance(self.vocab, MappedVocabulary):
+            self.vocab = self.vocab.to_vocabulary()
+        if not self.pos_counts.flags.writeable:
+            self.pos_counts = np.array(self.pos_counts)
+        if not self.neg_counts.flags.writeable:
+            self.neg_counts = np.array(self.neg_counts)
+
+    @staticmethod
+    def _grown(counts, size):
+        """Pads counts array with zeros up to the vocabulary size."""
+        if len(counts) >= size:
+            return counts
+        return np.concatenate((counts, np.zeros(size - len(counts), dtype=counts.dtype)))
+
+    @staticmethod
+    def from_pairs(pairs, label_column_name=None, text_column_name=None, n=3, laplace_factor=None,
+                   chunksize=100000):
+        """
+        Eng:
+        ==============================================================================================
+        :param pairs: Iterable of (text, label) pairs;
+
+        :param label_column_name: Name of label column (saved in the model);
+
+        :param text_column_name: Name of text column (saved in the model);
+
+        :param n: n-parameter for n-grams;
+
+        :param laplace_factor: Model's Laplace factor for Laplace smoothing;
+
+        :param chunksize: Amount of pairs which are counted at once;
+
+        :return: m: Model() object, the same as one built from DF with these texts and labels.
+
+        Pairs are counted chunk by chunk, so peak memory depends on vocabulary size and chunksize
+        but not on the size of the corpus.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        :param pairs: Последовательность пар (текст, метка);
+
+        :param label_column_name: Название столбца с метками (сохраняется в модели);
 
-        self.posNgrams = dict(
-            Counter(ng for ng in "|".join(
-                [get_ngram(text, self.n) for text in [
-                    row[1][text_column_name] for row in df[df.label == "pos"].iterrows()]]).split("|"))) \
-            if df is not None else None
-        self.negNgrams = dict(
-            Counter(ng for ng in "|".join(
-                [get_ngram(text, self.n) for text in [
-                    row[1][text_column_name] for row in df[df.label == "neg"].iterrows()]]).split("|"))) \
-            if df is not None else None
+        :param text_column_name: Название столбца с текстом (сохраняется в модели);
 
-        self.pos_label_count = int(df[label_column_name].value_counts().at["pos"]) if df is not None else 0
-        self.neg_label_count = int(df[label_column_name].value_counts().at["neg"]) if df is not None else 0
+        :param n: Параметр n для n-грамм;
+
+        :param laplace_factor: Множитель Лапласа для сглаживания;
+
+        :param chunksize: Количество пар, подсчитываемых за один раз;
+
+        :return: m: Объект Model(), такой же, как построенный по DF с этими текстами и метками.
+
+        Пары подсчитываются по частям, поэтому пиковое потребление памяти зависит от размера словаря
+        и chunksize, но не от размера корпуса.
+        ==============================================================================================
+        """
+        m = Model(label_column_name, text_column_name, n=n, laplace_factor=laplace_factor)
+        pairs = iter(pairs)
+        chunk = list(islice(pairs, chunksize))
+        while chunk:
+            m._count([text for text, _ in chunk], [label for _, label in chunk])
+            chunk = list(islice(pairs, chunksize))
+        m.compile()
+        return m
+
+    @staticmethod
+    def from_csv(path, label_column_name, text_column_name, n=3, laplace_factor=None, chunksize=100000,
+                 n_jobs=1):
+        """
+        Eng:
+        ==============================================================================================
+        :param path: Path to CSV, Parquet or Arrow IPC file with training set (see utils.DataIO);
+
+        :param label_column_name: Name of column in CSV where labels are placed;
+
+        :param text_column_name: Name of column in CSV where doc's text is placed;
+
+        :param n: n-parameter for n-grams;
+
+        :param laplace_factor: Model's Laplace factor for Laplace smoothing;
+
+        :param chunksize: Amount of rows which are read and counted at once;
+
+        :param n_jobs: Number of processors, if it is not 1 chunks are counted in parallel (see from_shards());
+
+        :return: m: Model() object, the same as Model(label_column_name, text_column_name,
+                 read_csv(path, index_col=0), n, laplace_factor).
+
+        Only label and text columns are read, chunk by chunk.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        :param path: Путь к файлу CSV, Parquet или Arrow IPC с тренировочным набором данных (см.
+                     utils.DataIO);
+
+        :param label_column_name: Название столбца в CSV, в котором расположены метки;
+
+        :param text_column_name: Название столбца в CSV, в котором расположен текст документов;
+
+        :param n: Параметр n для n-грамм;
+
+        :param laplace_factor: Множитель Лапласа для сглаживания;
+
+        :param chunksize: Количество строк, читаемых и подсчитываемых за один раз;
+
+        :param n_jobs: Число процессов, если не 1, части подсчитываются параллельно (см. from_shards());
+
+        :return: m: Объект Model(), такой же, как Model(label_column_name, text_column_name,
+                 read_csv(path, index_col=0), n, laplace_factor).
+
+        Читаются только столбцы с метками и текстом, по частям.
+        ==============================================================================================
+        """
+        chunks = DataIO.iter_batches(path, [label_column_name, text_column_name], chunksize)
+        if n_jobs != 1:
+            return Model.from_shards(((chunk[text_column_name], chunk[label_column_name]) for chunk in chunks),
+                                     label_column_name, text_column_name, n, laplace_factor, n_jobs)
+        m = Model(label_column_name, text_column_name, n=n, laplace_factor=laplace_factor)
+        for chunk in chunks:
+            m._count(chunk[text_column_name], chunk[label_column_name])
+        m.compile()
+        return m
+
+    @staticmethod
+    def from_shards(shards, label_column_name=None, text_column_name=None, n=3, laplace_factor=None, n_jobs=8):
+        """
+        Eng:
+        ==============================================================================================
+        :param shards: Iterable of (texts, labels) pairs, every pair is one shard of the corpus;
+
+        :param label_column_name: Name of label column (saved in the model);
+
+        :param text_column_name: Name of text column (saved in the model);
+
+        :param n: n-parameter for n-grams;
+
+        :param laplace_factor: Model's Laplace factor for Laplace smoothing;
+
+        :param n_jobs: Number of processors;
+
+        :return: m: Model() object, the same as one built from the whole corpus.
+
+        Map-reduce training: every shard is counted in a separate process (joblib) and the partial
+        models are merged with merge() as soon as they are ready.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        :param shards: Последовательность пар (тексты, метки), каждая пара - одна часть корпуса;
+
+        :param label_column_name: Название столбца с метками (сохраняется в модели);
+
+        :param text_column_name: Название столбца с текстом (сохраняется в модели);
+
+        :param n: Параметр n для n-грамм;
+
+        :param laplace_factor: Множитель Лапласа для сглаживания;
+
+        :param n_jobs: Число процессов;
+
+        :return: m: Объект Model(), такой же, как построенный по всему корпусу.
+
+        Обучение по схеме map-reduce: каждая часть подсчитывается в отдельном процессе (joblib), а
+        частичные модели объединяются с помощью merge() по мере готовности.
+        ==============================================================================================
+        """
+        m = Model(label_column_name, text_column_name, n=n, laplace_factor=laplace_factor)
+        count_shard = Instrumentation.wrap(_count_shard)
+        for part in Instrumentation.unwrap(Parallel(n_jobs=n_jobs, return_as="generator")(
+                delayed(count_shard)(list(texts), list(labels), label_column_name, text_column_name, n,
+                                     laplace_factor) for texts, labels in shards)):
+            m._add(part)
+        m.compile()
+        return m
+
+    def merge(self, other):
+        """
+        Eng:
+        ==================================================================================================
+        :param other: Model() object with the same n-parameter;
 
-        self.pos_Ngram_count = sum(self.posNgrams.values()) if df is not None else 0
-        self.neg_Ngram_count = sum(self.negNgrams.values()) if df is not None else 0
+        :return: m: New Model() object with counts of both models (Laplace factor is taken from self).
 
-        self.unique_Ngram_count = len(
-            set.union(set(self.posNgrams.keys()), set(self.negNgrams.keys()))) if df is not None else 0
+        N-gram counts, label counts, n-gram totals and amount of unique n-grams are combined, so merge
+        is associative: a.merge(b).merge(c) is the same as a.merge(b.merge(c)).
+        ==================================================================================================
+
+        Ru:
+        ==================================================================================================
+        :param other: Объект Model() с тем же параметром n;
+
+        :return: m: Новый объект Model() со счетчиками обеих моделей (множитель Лапласа берется из self).
+
+        Объединяются количества n-грамм, количества меток, общие количества n-грамм и количество
+        уникальных n-грамм, поэтому объединение ассоциативно: a.merge(b).merge(c) совпадает с
+        a.merge(b.merge(c)).
+        ==================================================================================================
+        """
+        m = self._empty()
+        m._add(self)
+        m._add(other)
+        m.compile()
+        return m
+
+    def subtract(self, other):
+        """
+        Eng:
+        ==================================================================================================
+        :param other: Model() object with the same n-parameter, counted on a part of self's corpus;
+
+        :return: m: New Model() object with counts of self minus counts of other (Laplace factor is
+                 taken from self), the same as a model counted on the rest of the corpus.
+
+        Inverse of merge(): a.merge(b).subtract(b) scores messages the same as a. N-grams which are left
+        with zero counts stay in the vocabulary, they are scored the same as unknown n-grams.
+        ==================================================================================================
+
+        Ru:
+        ==================================================================================================
+        :param other: Объект Model() с тем же параметром n, подсчитанный на части корпуса self;
+
+        :return: m: Новый объект Model() со счетчиками self за вычетом счетчиков other (множитель Лапласа
+                 берется из self), такой же, как модель, подсчитанная на остальной части корпуса.
+
+        Обратная операция к merge(): a.merge(b).subtract(b) оценивает сообщения так же, как a. N-граммы с
+        нулевыми счетчиками остаются в словаре, они оцениваются так же, как неизвестные n-граммы.
+        ==================================================================================================
+        """
+        m = self._empty()
+        m._add(self)
+        m._add(other, sign=-1)
+        if (m.pos_counts < 0).any() or (m.neg_counts < 0).any() or m.total_msg_count < 0:
+            raise IncompatibleModelsError("Subtracted model is not a part of the model!")
+        m.compile()
+        return m
+
+    def information(self):
+        """
+        Eng:
+        ==============================================================================================
+        :return: Array with information of every n-gram id: it's total count multiplied by the
+                 absolute value of it's smoothed log-ratio (with Laplace factor lp, or 1 if lp is 0)
+                 corrected by the n-gram totals, i.e. how much the n-gram moves log-odds of the
+                 training corpus. N-grams seen once in both classes have almost zero information.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        :return: Массив с информативностью каждого id n-граммы: ее общее количество, умноженное на
+                 модуль сглаженного логарифма отношения (с множителем Лапласа lp или 1, если lp равен
+                 0) с поправкой на общие количества n-грамм, т.е. насколько n-грамма сдвигает
+                 логарифм шансов на тренировочном корпусе. У n-грамм, встреченных по разу в обоих
+                 классах, информативность почти нулевая.
+        ==============================================================================================
+        """
+        lp = self.lp or 1
+        pos = np.asarray(self.pos_counts, dtype=np.float64)
+        neg = np.asarray(self.neg_counts, dtype=np.float64)
+        offset = _log_diff(self.neg_Ngram_count + lp * self.unique_Ngram_count,
+                           self.pos_Ngram_count + lp * self.unique_Ngram_count)
+        if offset != offset:
+            offset = 0.0
+        return (pos + neg) * np.abs(np.log(pos + lp) - np.log(neg + lp) + offset)
+
+    def _key_sizes(self):
+        """Length of json key of every n-gram id (see save_model())."""
+        return np.fromiter((len(json.dumps(ngram)) for ngram in self.vocab), dtype=np.int64, count=len(self.vocab))
+
+    def _json_sizes(self):
+        """Size of json file without n-grams and size of entries of every n-gram id in it."""
+        header = self._empty().to_dict()
+        for name in ("total_msg_count", "pos_label_count", "neg_label_count", "pos_Ngram_count",
+                     "neg_Ngram_count", "unique_Ngram_count"):
+            header[name] = getattr(self, name)
+        sizes = np.zeros(len(self.vocab), dtype=np.int64)
+        keys = self._key_sizes()
+        for counts in (self.pos_counts, self.neg_counts):
+            # '"n-gram": count, ' for every non-zero count.
+            nonzero = counts > 0
+            digits = np.floor(np.log10(np.maximum(counts, 1))).astype(np.int64) + 1
+            sizes += np.where(nonzero, keys + digits + 4, 0)
+        return len(json.dumps(header)), sizes
+
+    def json_size(self):
+        """
+        Eng:
+        ======================================================================
+        :return: Estimated size of json file of the model (see save_model())
+                 in bytes (not more than 2 bytes per n-gram above the real one).
+        ======================================================================
+
+        Ru:
+        ======================================================================
+        :return: Оценка размера json файла модели (см. save_model()) в байтах
+                 (превышает реальный не больше чем на 2 байта на n-грамму).
+        ======================================================================
+        """
+        header, sizes = self._json_sizes()
+        return int(header + sizes.sum())
+
+    def prune(self, min_count=1, top_k=None, target_size=None):
+        """
+        Eng:
+        ==================================================================================================
+        :param min_count: N-grams with total (positive + negative) count less than min_count are dropped;
+
+        :param top_k: If not None, only top_k n-grams with the most information (see information()) are
+                      kept;
+
+        :param target_size: If not None, the most informative n-grams are kept while the estimated json
+                            size of the model (see json_size()) is not more than target_size bytes;
+
+        :return: m: New pruned Model() object.
+
+        Conditions are applied in the given order. Dropped n-grams are scored as unknown ones. Label
+        counts are kept, n-gram totals and amount of unique n-grams are recomputed from the kept counts,
+        so the pruned model is consistent (the same as a model whose corpus never had dropped n-grams).
+        N-grams with zero counts (e.g. after subtract()) are always dropped.
+        ==================================================================================================
+
+        Ru:
+        ==================================================================================================
+        :param min_count: N-граммы с общим (положительные + отрицательные) количеством меньше min_count
+                          удаляются;
+
+        :param top_k: Если не None, сохраняются только top_k n-грамм с наибольшей информативностью (см.
+                      information());
+
+        :param target_size: Если не None, самые информативные n-граммы сохраняются, пока оценка размера
+                            json файла модели (см. json_size()) не больше target_size байт;
+
+        :return: m: Новый объект Model() после удаления n-грамм.
+
+        Условия применяются в указанном порядке. Удаленные n-граммы оцениваются как неизвестные.
+        Количества меток сохраняются, общие количества n-грамм и количество уникальных n-грамм
+        пересчитываются по оставшимся счетчикам, поэтому модель остается согласованной (такой же, как
+        модель, в корпусе которой никогда не было удаленных n-грамм). N-граммы с нулевыми счетчиками
+        (например, после subtract()) удаляются всегда.
+        ==================================================================================================
+        """
+        total = np.asarray(self.pos_counts) + np.asarray(self.neg_counts)
+        keep = total >= max(min_count, 1)
+        if top_k is not None or target_size is not None:
+            information = self.information()
+            # Kept n-grams by decreasing information, ties are broken by id.
+            order = np.flatnonzero(keep)
+            order = order[np.argsort(-information[order], kind="stable")]
+            if top_k is not None:
+                order = order[:top_k]
+            if target_size is not None:
+                header, sizes = self._json_sizes()
+                order = order[:np.searchsorted(header + np.cumsum(sizes[order]), target_size, side="right")]
+            keep = np.zeros(len(total), dtype=bool)
+            keep[order] = True
+        return self._pruned(keep)
+
+    def _pruned(self, keep):
+        """New model with counts of n-gram ids where keep is True."""
+        m = self._empty()
+        m.vocab = Vocabulary(ngram for ngram, kept in zip(self.vocab, keep.tolist()) if kept)
+        m.pos_counts = np.array(self.pos_counts[keep], dtype=np.int64)
+        m.neg_counts = np.array(self.neg_counts[keep], dtype=np.int64)
+        m._pruned_totals(self)
+        return m
+
+    def _pruned_totals(self, source):
+        """Copies label counts of source model, recomputes n-gram totals from counts and compiles."""
+        self.total_msg_count = source.total_msg_count
+        self.pos_label_count = source.pos_label_count
+        self.neg_label_count = source.neg_label_count
+        self.pos_Ngram_count = int(self.pos_counts.sum())
+        self.neg_Ngram_count = int(self.neg_counts.sum())
+        self.unique_Ngram_count = int(np.count_nonzero(self.pos_counts + self.neg_counts))
+        self.compile()
+
+    def _add(self, other, sign=1):
+        """Adds all counts of other model to self (subtracts them if sign is -1)."""
+        if other.n != self.n:
+            raise IncompatibleModelsError("Can't merge models for {n1}-grams and {n2}-grams!".format(
+                n1=self.n, n2=other.n))
+        self._ensure_writable()
+        ids = self._merge_ids(other)
+        size = len(self.vocab)
+        self.pos_counts = self._grown(self.pos_counts, size)
+        self.neg_counts = self._grown(self.neg_counts, size)
+        self.pos_counts[ids] += sign * other.pos_counts
+        self.neg_counts[ids] += sign * other.neg_counts
+        self.total_msg_count += sign * other.total_msg_count
+        self.pos_label_count += sign * other.pos_label_count
+        self.neg_label_count += sign * other.neg_label_count
+        self.pos_Ngram_count += sign * other.pos_Ngram_count
+        self.neg_Ngram_count += sign * other.neg_Ngram_count
+        self.unique_Ngram_count = int(np.count_nonzero(self.pos_counts + self.neg_counts))
+        self._log_ratios = None
+
+    def _merge_ids(self, other):
+        """Ids of other model's n-grams in self's vocabulary (new n-grams are added to it)."""
+        if isinstance(other, HashedModel):
+            raise IncompatibleModelsError("Can't merge hashed and plain models!")
+        return self.vocab.add_all(other.vocab)
+
+    def _empty(self):
+        """New empty model with the same parameters."""
+        return Model(self.lcn, self.tcn, n=self.n, laplace_factor=self.lp)
 
     def __repr__(self):
         """
@@ -99,6 +667,303 @@ class Model:
             ung=self.unique_Ngram_count
         )
 
+    def compile(self):
+        """
+        Eng:
+        ===============================================================================================
+        Precomputes the tables used for scoring:
+            - self._log_ratios: log(pos_count + lp) - log(neg_count + lp) for every n-gram id;
+            - self._unseen_log_ratio: the same value for an n-gram which is not in the model;
+            - self._ngram_log_offset: log(neg_Ngram_count + lp * U) - log(pos_Ngram_count + lp * U),
+              added once per n-gram of the message;
+            - self._prior_log_odds: log(pos_label_count) - log(neg_label_count).
+
+        Undefined logarithms (e.g. zero counts with lp = 0) are stored as NaN.
+        ===============================================================================================
+
+        Ru:
+        ===============================================================================================
+        Предварительно вычисляет таблицы, используемые для классификации:
+            - self._log_ratios: log(pos_count + lp) - log(neg_count + lp) для каждого id n-граммы;
+            - self._unseen_log_ratio: то же значение для n-граммы, отсутствующей в модели;
+            - self._ngram_log_offset: log(neg_Ngram_count + lp * U) - log(pos_Ngram_count + lp * U),
+              прибавляется один раз на каждую n-грамму сообщения;
+            - self._prior_log_odds: log(pos_label_count) - log(neg_label_count).
+
+        Неопределенные логарифмы (например, нулевые счетчики при lp = 0) сохраняются как NaN.
+        ===============================================================================================
+        """
+        lp = self.lp
+        pos = self.pos_counts + lp
+        neg = self.neg_counts + lp
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._log_ratios = np.log(pos) - np.log(neg)
+        self._log_ratios[(pos <= 0) | (neg <= 0)] = np.nan
+        self._compile_scalars()
+        # Built on the first log_odds() call.
+        self._log_ratio_list = None
+
+    def _compile_scalars(self):
+        """Computes the scoring values which don't depend on a single n-gram."""
+        lp = self.lp
+        self._unseen_log_ratio = _log_diff(lp, lp)
+        self._ngram_log_offset = _log_diff(self.neg_Ngram_count + lp * self.unique_Ngram_count,
+                                           self.pos_Ngram_count + lp * self.unique_Ngram_count)
+        self._prior_log_odds = _log_diff(self.pos_label_count, self.neg_label_count)
+
+    def _refresh(self, touched):
+        """Recomputes compiled log-ratios only for touched n-gram ids (all tables if touched is None)."""
+        if self._log_ratios is None:
+            return
+        if touched is None:
+            self.compile()
+            return
+        old = len(self._log_ratios)
+        size = len(self.vocab)
+        ratios = self._log_ratios
+        if len(ratios) < size or not ratios.flags.writeable:
+            ratios = np.concatenate((ratios, np.full(size - old, np.nan)))
+        lp = self.lp
+        pos = self.pos_counts[touched] + lp
+        neg = self.neg_counts[touched] + lp
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.log(pos) - np.log(neg)
+        values[(pos <= 0) | (neg <= 0)] = np.nan
+        ratios[touched] = values
+        self._log_ratios = ratios
+        self._compile_scalars()
+        if self._log_ratio_list is not None:
+            lst = self._log_ratio_list
+            # The last element is the ratio of unknown n-grams, new ids are inserted before it.
+            lst.pop()
+            lst.extend(ratios[old:].tolist())
+            for i, value in zip(touched.tolist(), values.tolist()):
+                lst[i] = value
+            lst.append(self._unseen_log_ratio)
+
+    def count_matrix(self, docs):
+        """
+        Eng:
+        ===============================================================================================
+        :param docs: Iterable of messages, every message is an iterable of it's n-grams;
+
+        :return: X, unseen: Sparse CSR matrix (docs x model's n-grams) with n-gram counts and
+                 array with amount of n-grams of every message which are not in the model.
+        ===============================================================================================
+
+        Ru:
+        ===============================================================================================
+        :param docs: Последовательность сообщений, каждое сообщение - последовательность его n-грамм;
+
+        :return: X, unseen: Разреженная CSR матрица (документы x n-граммы модели) с количествами
+                 n-грамм и массив с количеством n-грамм каждого сообщения, отсутствующих в модели.
+        ===============================================================================================
+        """
+        ngrams = []
+        lengths = array("q")
+        for doc in docs:
+            start = len(ngrams)
+            ngrams.extend(doc)
+            lengths.append(len(ngrams) - start)
+        ids = self.vocab.lookup(ngrams)
+        lengths = np.frombuffer(lengths, dtype=np.int64)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        known = ids >= 0
+        X = csr_matrix((np.ones(np.count_nonzero(known)), (rows[known], ids[known])),
+                       shape=(len(lengths), len(self.vocab)))
+        unseen = lengths - np.bincount(rows[known], minlength=len(lengths))
+        return X, unseen.astype(np.float64)
+
+    def batch_log_odds(self, X, unseen):
+        """
+        Eng:
+        ======================================================================================
+        :param X: Count matrix from count_matrix();
+
+        :param unseen: Amounts of unknown n-grams from count_matrix();
+
+        :return: Array of log P(pos | message) - log P(neg | message) for every row of X.
+
+        All messages are scored with one sparse matrix-vector product.
+        ======================================================================================
+
+        Ru:
+        ======================================================================================
+        :param X: Матрица количеств, полученная из count_matrix();
+
+        :param unseen: Количества неизвестных n-грамм, полученные из count_matrix();
+
+        :return: Массив log P(pos | сообщение) - log P(neg | сообщение) для каждой строки X.
+
+        Все сообщения оцениваются с помощью одного умножения разреженной матрицы на вектор.
+        ======================================================================================
+        """
+        if self._log_ratios is None:
+            self.compile()
+        lengths = np.asarray(X.sum(axis=1)).ravel() + unseen
+        scores = X @ self._log_ratios + (self._prior_log_odds + lengths * self._ngram_log_offset)
+        has_unseen = unseen > 0
+        scores[has_unseen] += unseen[has_unseen] * self._unseen_log_ratio
+        return scores
+
+    def grid_log_odds(self, X, unseen, laplace_factors):
+        """
+        Eng:
+        =================================================================================================
+        :param X: Count matrix from count_matrix();
+
+        :param unseen: Amounts of unknown n-grams from count_matrix();
+
+        :param laplace_factors: List of Laplace factors;
+
+        :return: Matrix (rows of X x laplace factors) of log P(pos | message) - log P(neg | message),
+                 the column j is the same as batch_log_odds() of the model with laplace_factors[j].
+
+        Counts don't depend on Laplace factor, so all factors are scored with one sparse matrix-matrix
+        product of X and the matrix of log-ratios (model's n-grams x laplace factors).
+        =================================================================================================
+
+        Ru:
+        =================================================================================================
+        :param X: Матрица количеств, полученная из count_matrix();
+
+        :param unseen: Количества неизвестных n-грамм, полученные из count_matrix();
+
+        :param laplace_factors: Список множителей Лапласа;
+
+        :return: Матрица (строки X x множители Лапласа) значений log P(pos | сообщение) -
+                 log P(neg | сообщение), столбец j совпадает с batch_log_odds() модели с
+                 множителем laplace_factors[j].
+
+        Счетчики не зависят от множителя Лапласа, поэтому все множители оцениваются одним умножением
+        разреженной матрицы X на матрицу логарифмов отношений (n-граммы модели x множители Лапласа).
+        =================================================================================================
+        """
+        lps = np.asarray(laplace_factors, dtype=np.float64)
+        pos = self.pos_counts[:, None] + lps
+        neg = self.neg_counts[:, None] + lps
+        tot_pos = self.pos_Ngram_count + lps * self.unique_Ngram_count
+        tot_neg = self.neg_Ngram_count + lps * self.unique_Ngram_count
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.log(pos) - np.log(neg)
+            unseen_ratios = np.log(lps) - np.log(lps)
+            offsets = np.log(tot_neg) - np.log(tot_pos)
+        ratios[(pos <= 0) | (neg <= 0)] = np.nan
+        unseen_ratios[lps <= 0] = np.nan
+        offsets[(tot_pos <= 0) | (tot_neg <= 0)] = np.nan
+
+        lengths = np.asarray(X.sum(axis=1)).ravel() + unseen
+        scores = np.asarray(X @ ratios) + _log_diff(self.pos_label_count, self.neg_label_count)
+        scores += lengths[:, None] * offsets
+        has_unseen = unseen > 0
+        scores[has_unseen] += unseen[has_unseen, None] * unseen_ratios
+        return scores
+
+    def log_odds(self, ngrams):
+        """
+        Eng:
+        ===============================================================================
+        :param ngrams: List of message's n-grams;
+
+        :return: log P(pos | message) - log P(neg | message) (NaN if it is undefined).
+        ===============================================================================
+
+        Ru:
+        ===============================================================================
+        :param ngrams: Список n-грамм сообщения;
+
+        :return: log P(pos | сообщение) - log P(neg | сообщение) (NaN, если не определен).
+        ===============================================================================
+        """
+        if self._log_ratios is None:
+            self.compile()
+        score = self._prior_log_odds + len(ngrams) * self._ngram_log_offset
+        if isinstance(self.vocab, MappedVocabulary):
+            ids = self.vocab.lookup(ngrams)
+            known = ids >= 0
+            score += self._log_ratios[ids[known]].sum()
+            if not known.all():
+                score += (len(ids) - np.count_nonzero(known)) * self._unseen_log_ratio
+            return float(score)
+        if self._log_ratio_list is None:
+            # Id -1 (unknown n-gram) points to the last element.
+            self._log_ratio_list = self._log_ratios.tolist() + [self._unseen_log_ratio]
+        get = self.vocab.get
+        ratios = self._log_ratio_list
+        for ngram in ngrams:
+            score += ratios[get(ngram, -1)]
+        return score
+
+    def to_dict(self):
+        """
+        Eng:
+        ===============================================================
+        :return: Dictionary with model's attributes (format of json).
+        ===============================================================
+
+        Ru:
+        ===============================================================
+        :return: Словарь с атрибутами модели (формат json файла).
+        ===============================================================
+        """
+        d = {
+            "n": self.n,
+            "lcn": self.lcn,
+            "tcn": self.tcn,
+            "lp": self.lp,
+            "total_msg_count": self.total_msg_count,
+            "posNgrams": self.posNgrams,
+            "negNgrams": self.negNgrams,
+            "pos_label_count": self.pos_label_count,
+            "neg_label_count": self.neg_label_count,
+            "pos_Ngram_count": self.pos_Ngram_count,
+            "neg_Ngram_count": self.neg_Ngram_count,
+            "unique_Ngram_count": self.unique_Ngram_count
+        }
+        if self.delta_seq:
+            d["delta_seq"] = self.delta_seq
+        return d
+
+    @staticmethod
+    def from_dict(d):
+        """
+        Eng:
+        ==================================================
+        :param d: Dictionary from to_dict() (or json file);
+
+        :return: m: Model() object.
+        ==================================================
+
+        Ru:
+        ==================================================
+        :param d: Словарь из to_dict() (или json файла);
+
+        :return: m: Объект Model().
+        ==================================================
+        """
+        if "buckets" in d:
+            return HashedModel.from_dict(d)
+        if "orders" in d:
+            return BackoffModel.from_dict(d)
+        m = Model(d["lcn"], d["tcn"], n=d["n"], laplace_factor=d["lp"])
+        m.total_msg_count = d["total_msg_count"]
+        pos_ngrams = d["posNgrams"] or {}
+        neg_ngrams = d["negNgrams"] or {}
+        m.vocab = Vocabulary(pos_ngrams)
+        m.vocab.add_all(neg_ngrams)
+        m.pos_counts = np.zeros(len(m.vocab), dtype=np.int64)
+        m.neg_counts = np.zeros(len(m.vocab), dtype=np.int64)
+        m.pos_counts[m.vocab.lookup(pos_ngrams)] = np.fromiter(pos_ngrams.values(), dtype=np.int64)
+        m.neg_counts[m.vocab.lookup(neg_ngrams)] = np.fromiter(neg_ngrams.values(), dtype=np.int64)
+        m.pos_label_count = d["pos_label_count"]
+        m.neg_label_count = d["neg_label_count"]
+        m.pos_Ngram_count = d["pos_Ngram_count"]
+        m.neg_Ngram_count = d["neg_Ngram_count"]
+        m.unique_Ngram_count = d["unique_Ngram_count"]
+        m.delta_seq = d.get("delta_seq", 0)
+        m.compile()
+        return m
+
     def save_model(self, path):
         """
         Eng:
@@ -112,7 +977,7 @@ class Model:
         ================================================================
         """
         with open(path, 'w', encoding='utf-8') as file:
-            json.dump(self.__dict__, file)
+            json.dump(self.to_dict(), file)
 
     @staticmethod
     def read_model(path):
@@ -121,19 +986,235 @@ class Model:
         ==========================================
         :param path: Path to model;
 
-        :return: m: Model() object from json file.
+        :return: m: Model() object from json (or binary) file.
+
+        If delta log path + ".log" exists (see attach_log()), it's records which are not in the file
+        are replayed.
         ==========================================
 
         Ru:
         ==========================================
         :param path: Путь к модели;
 
-        :return: m: Объект Model() из json файла.
+        :return: m: Объект Model() из json (или бинарного) файла.
+
+        Если существует журнал изменений path + ".log" (см. attach_log()), его записи, которых нет в
+        файле, применяются к модели.
         ==========================================
         """
-        with open(path) as file:
-            m = Model()
-            m.__dict__ = json.load(file)
+        with open(path, "rb") as file:
+            binary = file.read(len(_MAGIC)) == _MAGIC
+        if binary:
+            m = Model.read_binary(path)
+        else:
+            with open(path) as file:
+                m = Model.from_dict(json.load(file))
+        for record in DeltaLog.records(path + ".log", m.delta_seq):
+            m._apply_delta(record)
+        return m
+
+    def attach_log(self, path, fsync=True):
+        """
+        Eng:
+        ==============================================================================================
+        :param path: Path of the model snapshot, the log is written to path + ".log";
+
+        :param fsync: Sync every record to disk.
+
+        Every following update_many() call appends it's count changes to the log, so persisting an
+        update costs O(size of update). compact() writes a new snapshot and clears the log,
+        read_model(path) loads the snapshot and replays the log tail.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        :param path: Путь к снимку модели, журнал пишется в path + ".log";
+
+        :param fsync: Сбрасывать каждую запись на диск.
+
+        Каждый следующий вызов update_many() дописывает в журнал свои изменения счетчиков, поэтому
+        сохранение обновления стоит O(размер обновления). compact() записывает новый снимок и очищает
+        журнал, read_model(path) загружает снимок и применяет оставшиеся записи журнала.
+        ==============================================================================================
+        """
+        if self._delta_log is not None:
+            self._delta_log.close()
+        self._delta_log = DeltaLog(path + ".log", fsync)
+        self._snapshot_path = path
+
+    def compact(self, binary=False):
+        """
+        Eng:
+        ==============================================================================================
+        :param binary: Write snapshot in binary format (see save_binary()) instead of json.
+
+        Writes full snapshot of the model to a temporary file, atomically replaces the snapshot with
+        it (os.replace), syncs the directory and clears the delta log. The snapshot keeps the number of
+        the last record, so records left in the log after a crash between these steps are not replayed
+        twice.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        :param binary: Записать снимок в бинарном формате (см. save_binary()) вместо json.
+
+        Записывает полный снимок модели во временный файл, атомарно заменяет им снимок (os.replace),
+        сбрасывает каталог на диск и очищает журнал изменений. Снимок хранит номер последней записи,
+        поэтому записи, оставшиеся в журнале после сбоя между этими шагами, не применяются повторно.
+        ==============================================================================================
+        """
+        if self._delta_log is None:
+            raise DeltaLogNotAttachedError("Delta log is not attached, call attach_log() first!")
+        tmp_path = self._snapshot_path + ".tmp"
+        if binary:
+            self.save_binary(tmp_path)
+        else:
+            self.save_model(tmp_path)
+        with open(tmp_path, "rb") as file:
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+        # The rename itself is durable only after the directory is synced, the log is cleared after it.
+        directory = os.open(os.path.dirname(os.path.abspath(self._snapshot_path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self._delta_log.clear()
+
+    def _apply_delta(self, record):
+        """Adds count changes of one delta log record."""
+        self._ensure_writable()
+        self.total_msg_count += record["msgs"]
+        self.pos_label_count += record["pos_labels"]
+        self.neg_label_count += record["neg_labels"]
+        ids = {}
+        for label in ("pos", "neg"):
+            counts = record[label]
+            ids[label] = np.repeat(np.asarray(self.vocab.add_all(counts), dtype=np.int64),
+                                   np.fromiter(counts.values(), dtype=np.int64, count=len(counts)))
+        self._refresh(self._add_ids(ids["pos"], ids["neg"]))
+        self.delta_seq = record["seq"]
+
+    def save_binary(self, path):
+        """
+        Eng:
+        =============================================================================================
+        :param path: Path to locate saved model file (binary format).
+
+        File contains small json header and arrays: sorted 64-bit hashes of n-grams, offsets and
+        UTF-8 bytes of n-grams, positive and negative counts and log-ratios (see compile()). Ids of
+        n-grams in the file are positions of their hashes, so no other index is needed.
+        =============================================================================================
+
+        Ru:
+        =============================================================================================
+        :param path: Путь, в котором будет размещен файл модели (бинарный формат).
+
+        Файл содержит небольшой json заголовок и массивы: отсортированные 64-битные хэши n-грамм,
+        смещения и байты n-грамм в UTF-8, положительные и отрицательные счетчики и логарифмы
+        отношений (см. compile()). Идентификаторы n-грамм в файле - позиции их хэшей, поэтому другой
+        индекс не нужен.
+        =============================================================================================
+        """
+        if self._log_ratios is None:
+            self.compile()
+        arrays = self._binary_arrays()
+        header = {key: value for key, value in self.to_dict().items() if key not in ("posNgrams", "negNgrams")}
+        header["arrays"] = {}
+        offset = 0
+        for name in _BINARY_ARRAYS:
+            header["arrays"][name] = {"offset": offset, "dtype": arrays[name].dtype.str, "length": len(arrays[name])}
+            offset += -(-arrays[name].nbytes // _ALIGNMENT) * _ALIGNMENT
+        header = json.dumps(header).encode("utf-8")
+        data_start = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+
+        with open(path, "wb") as file:
+            file.write(_MAGIC)
+            file.write(len(header).to_bytes(8, "little"))
+            file.write(header)
+            file.write(b"\0" * (data_start - file.tell()))
+            for name in _BINARY_ARRAYS:
+                file.write(arrays[name].tobytes())
+                file.write(b"\0" * (-arrays[name].nbytes % _ALIGNMENT))
+
+    def _binary_arrays(self):
+        """Arrays of binary model file (see save_binary()), n-grams are sorted by their hashes."""
+        keys = [ngram.encode("utf-8") for ngram in self.vocab]
+        hashes = np.fromiter((ngram_hash(ngram) for ngram in self.vocab), dtype=np.uint64, count=len(keys))
+        order = np.argsort(hashes, kind="stable")
+        lengths = np.fromiter((len(keys[i]) for i in order), dtype=np.int64, count=len(keys))
+        return {
+            "hashes": hashes[order],
+            "offsets": np.concatenate((np.zeros(1, dtype=np.int64), np.cumsum(lengths))),
+            "keys": np.frombuffer(b"".join(keys[i] for i in order), dtype=np.uint8),
+            "pos_counts": np.asarray(self.pos_counts, dtype=np.int64)[order],
+            "neg_counts": np.asarray(self.neg_counts, dtype=np.int64)[order],
+            "log_ratios": np.asarray(self._log_ratios, dtype=np.float64)[order]
+        }
+
+    @staticmethod
+    def read_binary(path, mmap=True):
+        """
+        Eng:
+        ================================================================================================
+        :param path: Path to model file saved by save_binary();
+
+        :param mmap: Memory-map the file instead of reading it;
+
+        :return: m: Model() object.
+
+        With mmap=True loading reads only the header: vocabulary and counts stay in the (read-only)
+        file pages, which are shared by all processes using the same file. Updating such a model
+        copies it into memory first.
+        ================================================================================================
+
+        Ru:
+        ================================================================================================
+        :param path: Путь к файлу модели, сохраненному с помощью save_binary();
+
+        :param mmap: Отобразить файл в память вместо чтения;
+
+        :return: m: Объект Model().
+
+        При mmap=True читается только заголовок: словарь и счетчики остаются в страницах файла (только
+        для чтения), которые разделяются всеми процессами, использующими этот файл. При дообучении
+        такая модель сначала копируется в память.
+        ================================================================================================
+        """
+        with open(path, "rb") as file:
+            if file.read(len(_MAGIC)) != _MAGIC:
+                raise IncorrectModelFileError("File \"{path}\" is not a binary model!".format(path=path))
+            header_length = int.from_bytes(file.read(8), "little")
+            header = json.loads(file.read(header_length).decode("utf-8"))
+        data_start = -(-(len(_MAGIC) + 8 + header_length) // _ALIGNMENT) * _ALIGNMENT
+        if mmap:
+            buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        else:
+            buffer = np.fromfile(path, dtype=np.uint8)
+
+        arrays = {}
+        for name, info in header.pop("arrays").items():
+            dtype = np.dtype(info["dtype"])
+            start = data_start + info["offset"]
+            arrays[name] = buffer[start:start + info["length"] * dtype.itemsize].view(dtype)
+
+        if "buckets" in header:
+            m = HashedModel(header["lcn"], header["tcn"], n=header["n"], laplace_factor=header["lp"],
+                            buckets=header["buckets"])
+        else:
+            m = Model(header["lcn"], header["tcn"], n=header["n"], laplace_factor=header["lp"])
+            m.vocab = MappedVocabulary(arrays["hashes"], arrays["offsets"], arrays["keys"])
+        m.total_msg_count = header["total_msg_count"]
+        m.pos_label_count = header["pos_label_count"]
+        m.neg_label_count = header["neg_label_count"]
+        m.pos_Ngram_count = header["pos_Ngram_count"]
+        m.neg_Ngram_count = header["neg_Ngram_count"]
+        m.unique_Ngram_count = header["unique_Ngram_count"]
+        m.delta_seq = header.get("delta_seq", 0)
+        m.pos_counts = arrays["pos_counts"]
+        m.neg_counts = arrays["neg_counts"]
+        m._log_ratios = arrays["log_ratios"]
+        m._compile_scalars()
         return m
 
     def update(self, msg, label, lang):
@@ -173,26 +1254,590 @@ class Model:
         ===============================================================================================================
         """
 
-        if label == "pos" or label == "neg":
-            self.total_msg_count += 1
-            tp = TextPreprocessor(punc="\\r\\n\\$/#^@'=+_:;*-~`)({}[]|<>.,&%!?\'\"",
-                                  regexp_lst=["bSubject", "bsubject"], lang=lang)
-            prepmsg = get_ngram(tp.full_preprocess(msg), self.n).split("|")
-
-            lbl_ngrams = "".join([label, "Ngrams"])
-            lbl_lbl_count = "".join([label, "_label_count"])
-            lbl_lbl_ngram_count = "".join([label, "_Ngram_count"])
-
-            t = self.__getattribute__(lbl_lbl_count)
-            t += 1
-            for ngram in prepmsg:
-                if ngram in self.__getattribute__(lbl_ngrams).keys():
-                    self.__getattribute__(lbl_ngrams)[ngram] += 1
-                else:
-                    self.__getattribute__(lbl_ngrams).update({ngram: 1})
-                    self.unique_Ngram_count += 1
-                t = self.__getattribute__(lbl_lbl_ngram_count)
-                t += 1
+        self.update_many([msg], [label], lang)
+
+    def update_many(self, texts, labels, lang=None, punc=_UPDATE_PUNC, regexp_lst=_UPDATE_REGEXPS, methods=None):
+        """
+        Eng:
+        ==============================================================================================
+        :param texts: List of messages with which the model will be updated;
+
+        :param labels: List of their labels ("pos" or "neg");
+
+        :param lang: Language of messages (if None, messages are already preprocessed);
+
+        :param punc: String which contains punctuational symbols;
+
+        :param regexp_lst: List of regular expressions for preprocessing;
+
+        :param methods: List of methods names for partial preprocess (None - full preprocess).
+
+        Messages are preprocessed with one compiled plan (cached for the same parameters), counts
+        and totals are updated in bulk and compiled log-ratios are recomputed only for touched
+        n-grams, so the model can be kept online with small batches of messages.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        :param texts: Список сообщений, с помощью которых происходит дообучение модели;
+
+        :param labels: Список их меток ("pos" или "neg");
+
+        :param lang: Язык сообщений (если None, сообщения уже предобработаны);
+
+        :param punc: Строка, содержащая пунктуационные символы;
+
+        :param regexp_lst: Список регулярных выражений для предобработки;
+
+        :param methods: Список с именами методов для частичной предобработки (None - полная).
+
+        Сообщения обрабатываются одним скомпилированным планом (кэшируется для одинаковых параметров),
+        счетчики и общие количества обновляются сразу для всех сообщений, а скомпилированные
+        логарифмы отношений пересчитываются только для затронутых n-грамм, поэтому модель можно
+        дообучать онлайн небольшими пакетами сообщений.
+        ==============================================================================================
+        """
+        labels = list(labels)
+        for label in labels:
+            if label != "pos" and label != "neg":
+                raise IncorrectLabelError("Label {lbl} is incorrect!"
+                                          " Label should be \"pos\" or \"neg\"".format(lbl=label))
+        texts = list(texts)
+        if lang is not None:
+            texts = _update_plan(lang, punc, tuple(regexp_lst or ()),
+                                 tuple(methods) if methods is not None else None).batch(texts)
+        if self._delta_log is None:
+            self._refresh(self._count(texts, labels))
+            return
+        delta = {"pos": Counter(), "neg": Counter()}
+        self._refresh(self._count(texts, labels, delta))
+        self.delta_seq += 1
+        self._delta_log.append({
+            "seq": self.delta_seq,
+            "msgs": len(labels),
+            "pos_labels": labels.count("pos"),
+            "neg_labels": labels.count("neg"),
+            "pos": delta["pos"],
+            "neg": delta["neg"]
+        })
+
+
+class HashedModel(Model):
+    def __init__(self, label_column_name=None, text_column_name=None, df=None, n=3, laplace_factor=None,
+                 buckets=1 << 20):
+        """
+        Eng:
+        ====================================================================================================
+        :param label_column_name: Name of column in DF where labels are placed;
+
+        :param text_column_name: Name of column in DF where doc's text is places;
+
+        :param df: Source DF with training set;
+
+        :param n: n-parameter for n-grams;
+
+        :param laplace_factor: Model's Laplace factor for Laplace smoothing;
+
+        :param buckets: Amount of buckets for n-grams.
+
+        Model with fixed memory budget: n-grams are not stored, every n-gram is counted in the bucket
+        crc32(n-gram) % buckets (see HashingVocabulary), counts are two arrays of buckets length. The same
+        hashing is used for scoring, merging models with the same amount of buckets is addition of arrays.
+        Unique n-grams are counted as occupied buckets, collision_rate() estimates the share of n-grams lost
+        in collisions.
+        ====================================================================================================
+
+        Ru:
+        ====================================================================================================
+        :param label_column_name: Название столбца в DF, в котором расположены метки;
+
+        :param text_column_name: Название столбца в DF, в котором расположен текст документов;
+
+        :param df: Исходный DF для тренировочного набора данных;
+
+        :param n: Параметр n для n-грамм;
+
+        :param laplace_factor: Множитель Лапласа для сглаживания;
+
+        :param buckets: Количество корзин для n-грамм.
+
+        Модель с фиксированным объемом памяти: n-граммы не хранятся, каждая n-грамма считается в корзине
+        crc32(n-грамма) % buckets (см. HashingVocabulary), счетчики - два массива длины buckets. То же
+        хэширование используется при классификации, объединение моделей с одинаковым количеством корзин -
+        сложение массивов. Уникальными n-граммами считаются занятые корзины, collision_rate() оценивает
+        долю n-грамм, потерянных из-за коллизий.
+        ====================================================================================================
+        """
+        super().__init__(label_column_name, text_column_name, n=n, laplace_factor=laplace_factor)
+        self.vocab = HashingVocabulary(buckets)
+        self.pos_counts = np.zeros(buckets, dtype=np.int64)
+        self.neg_counts = np.zeros(buckets, dtype=np.int64)
+
+        if df is not None:
+            self._count(df[text_column_name], df[label_column_name])
+            self.compile()
+
+    @property
+    def buckets(self):
+        """Amount of buckets."""
+        return self.vocab.buckets
+
+    @staticmethod
+    def _bucket_counts(counts):
+        nonzero = np.flatnonzero(counts)
+        return dict(zip(nonzero.tolist(), counts[nonzero].tolist()))
+
+    @property
+    def posNgrams(self):
+        """Dictionary with bucket as key and amount of positive n-grams in it as value."""
+        return self._bucket_counts(self.pos_counts)
+
+    @property
+    def negNgrams(self):
+        """Dictionary with bucket as key and amount of negative n-grams in it as value."""
+        return self._bucket_counts(self.neg_counts)
+
+    def _merge_ids(self, other):
+        if not isinstance(other, HashedModel):
+            raise IncompatibleModelsError("Can't merge hashed and plain models!")
+        if other.buckets != self.buckets:
+            raise IncompatibleModelsError("Can't merge models with {b1} and {b2} buckets!".format(
+                b1=self.buckets, b2=other.buckets))
+        return slice(None)
+
+    def _empty(self):
+        return HashedModel(self.lcn, self.tcn, n=self.n, laplace_factor=self.lp, buckets=self.buckets)
+
+    def collision_rate(self):
+        """
+        Eng:
+        ==================================================================================================
+        :return: Dictionary with:
+                    - "buckets": amount of buckets;
+                    - "occupied": amount of buckets with counts;
+                    - "estimated_ngrams": amount of unique n-grams estimated by linear counting:
+                      -buckets * ln(empty buckets / buckets) (inf if there are no empty buckets);
+                    - "collision_rate": share of unique n-grams which share a bucket with another n-gram:
+                      1 - occupied / estimated_ngrams.
+
+        Use HashingVocabulary.expected_collision_rate() to choose the amount of buckets for a corpus.
+        ==================================================================================================
+
+        Ru:
+        ==================================================================================================
+        :return: Словарь с ключами:
+                    - "buckets": количество корзин;
+                    - "occupied": количество корзин со счетчиками;
+                    - "estimated_ngrams": количество уникальных n-грамм, оцененное линейным подсчетом:
+                      -buckets * ln(пустые корзины / buckets) (inf, если пустых корзин нет);
+                    - "collision_rate": доля уникальных n-грамм, попавших в корзину вместе с другой
+                      n-граммой: 1 - occupied / estimated_ngrams.
+
+        Для выбора количества корзин для корпуса используйте HashingVocabulary.expected_collision_rate().
+        ==================================================================================================
+        """
+        buckets = self.buckets
+        occupied = int(np.count_nonzero(self.pos_counts + self.neg_counts))
+        empty = buckets - occupied
+        if empty == 0:
+            estimated = float("inf")
         else:
-            raise IncorrectLabelError("Label {lbl} is incorrect!"
-                                      " Label should be \"spam\" or \"ham\"".format(lbl=label))
+            estimated = float(-buckets * np.log(empty / buckets))
+        return {
+            "buckets": buckets,
+            "occupied": occupied,
+            "estimated_ngrams": estimated,
+            "collision_rate": 1 - occupied / estimated if occupied else 0.0
+        }
+
+    def to_dict(self):
+        """
+        Eng:
+        ==================================================================================
+        :return: Dictionary with model's attributes (format of json), "posNgrams" and
+                 "negNgrams" hold counts of non-empty buckets.
+        ==================================================================================
+
+        Ru:
+        ==================================================================================
+        :return: Словарь с атрибутами модели (формат json файла), "posNgrams" и
+                 "negNgrams" содержат счетчики непустых корзин.
+        ==================================================================================
+        """
+        d = super().to_dict()
+        d["buckets"] = self.buckets
+        return d
+
+    @staticmethod
+    def from_dict(d):
+        """
+        Eng:
+        ==================================================
+        :param d: Dictionary from to_dict() (or json file);
+
+        :return: m: HashedModel() object.
+        ==================================================
+
+        Ru:
+        ==================================================
+        :param d: Словарь из to_dict() (или json файла);
+
+        :return: m: Объект HashedModel().
+        ==================================================
+        """
+        m = HashedModel(d["lcn"], d["tcn"], n=d["n"], laplace_factor=d["lp"], buckets=d["buckets"])
+        m.total_msg_count = d["total_msg_count"]
+        for counts, buckets in ((m.pos_counts, d["posNgrams"] or {}), (m.neg_counts, d["negNgrams"] or {})):
+            counts[np.fromiter(map(int, buckets), dtype=np.int64, count=len(buckets))] = \
+                np.fromiter(buckets.values(), dtype=np.int64, count=len(buckets))
+        m.pos_label_count = d["pos_label_count"]
+        m.neg_label_count = d["neg_label_count"]
+        m.pos_Ngram_count = d["pos_Ngram_count"]
+        m.neg_Ngram_count = d["neg_Ngram_count"]
+        m.unique_Ngram_count = d["unique_Ngram_count"]
+        m.delta_seq = d.get("delta_seq", 0)
+        m.compile()
+        return m
+
+    def _key_sizes(self):
+        ids = np.arange(self.buckets, dtype=np.int64)
+        return np.floor(np.log10(np.maximum(ids, 1))).astype(np.int64) + 3
+
+    def _pruned(self, keep):
+        # Buckets are fixed, dropped buckets are emptied.
+        m = self._empty()
+        m.pos_counts = np.where(keep, self.pos_counts, 0)
+        m.neg_counts = np.where(keep, self.neg_counts, 0)
+        m._pruned_totals(self)
+        return m
+
+    def _binary_arrays(self):
+        return {
+            "hashes": np.zeros(0, dtype=np.uint64),
+            "offsets": np.zeros(1, dtype=np.int64),
+            "keys": np.zeros(0, dtype=np.uint8),
+            "pos_counts": np.asarray(self.pos_counts, dtype=np.int64),
+            "neg_counts": np.asarray(self.neg_counts, dtype=np.int64),
+            "log_ratios": np.asarray(self._log_ratios, dtype=np.float64)
+        }
+
+
+class BackoffModel:
+    def __init__(self, label_column_name=None, text_column_name=None, df=None, orders=(1, 2, 3), laplace_factor=None,
+                 chunksize=10000):
+        """
+        Eng:
+        ====================================================================================================
+        :param label_column_name: Name of column in DF where labels are placed;
+
+        :param text_column_name: Name of column in DF where doc's text is places;
+
+        :param df: Source DF with training set;
+
+        :param orders: n-parameters of the models, e.g. (1, 2, 3);
+
+        :param laplace_factor: Laplace factor of every model;
+
+        :param chunksize: Amount of texts split into tokens at once during training.
+
+        Mixed-order model: one Model() for every order, all of them are counted in one pass over the
+        corpus, every text is split into tokens only once (see utils.helpers.iter_token_ngrams()).
+        A message is scored word by word: the n-gram starting at a word is taken from the highest order
+        whose model knows it, and the model backs off to lower orders otherwise; words unknown even to
+        the lowest order are scored as unknown n-grams of it. Every n-gram adds it's log-ratio and the
+        per-n-gram offset of it's own model (see Model.compile()), the prior is taken from the highest
+        order. Has the scoring interface of Model (ngrams(), log_odds(), count_matrix(),
+        batch_log_odds()), so it can be used by Classifier.
+        ====================================================================================================
+
+        Ru:
+        ====================================================================================================
+        :param label_column_name: Название столбца в DF, в котором расположены метки;
+
+        :param text_column_name: Название столбца в DF, в котором расположен текст документов;
+
+        :param df: Исходный DF для тренировочного набора данных;
+
+        :param orders: Параметры n моделей, например (1, 2, 3);
+
+        :param laplace_factor: Множитель Лапласа каждой модели;
+
+        :param chunksize: Количество текстов, одновременно разбиваемых на токены при обучении.
+
+        Модель смешанного порядка: по одной Model() для каждого порядка, все они подсчитываются за один
+        проход по корпусу, каждый текст разбивается на токены только один раз (см.
+        utils.helpers.iter_token_ngrams()). Сообщение оценивается по словам: n-грамма, начинающаяся со
+        слова, берется из наибольшего порядка, модель которого ее знает, иначе модель переходит к меньшим
+        порядкам; слова, неизвестные даже наименьшему порядку, оцениваются как его неизвестные n-граммы.
+        Каждая n-грамма добавляет свой логарифм отношения и поправку на n-грамму своей модели (см.
+        Model.compile()), априорная часть берется из наибольшего порядка. Имеет интерфейс оценки Model
+        (ngrams(), log_odds(), count_matrix(), batch_log_odds()), поэтому может использоваться в
+        Classifier.
+        ====================================================================================================
+        """
+        self.orders = tuple(sorted(orders))
+        self.lcn = label_column_name if label_column_name is not None else ""
+        self.tcn = text_column_name if text_column_name is not None else ""
+        self.models = {n: Model(label_column_name, text_column_name, n=n, laplace_factor=laplace_factor)
+                       for n in self.orders}
+        self.chunksize = chunksize
+        # Delta log is not supported, read_model() has nothing to replay.
+        self.delta_seq = 0
+
+        # Compiled scoring tables (see compile()).
+        self._log_ratios = None
+        self._log_ratio_list = None
+        self._id_offsets = None
+
+        if df is not None:
+            self._count(df[text_column_name], df[label_column_name])
+            self.compile()
+
+    @property
+    def n(self):
+        """The highest order."""
+        return self.orders[-1]
+
+    @property
+    def lp(self):
+        return self.models[self.n].lp
+
+    @lp.setter
+    def lp(self, value):
+        for model in self.models.values():
+            model.lp = value
+        self._log_ratios = None
+
+    def _count(self, texts, labels):
+        """Counts texts in the models of all orders, every chunk of texts is split into tokens once."""
+        texts = iter(texts)
+        labels = iter(labels)
+        while True:
+            tokens = [tokenize(text) for text in islice(texts, self.chunksize)]
+            if not tokens:
+                break
+            chunk_labels = list(islice(labels, len(tokens)))
+            for n, model in self.models.items():
+                model._count_docs((iter_token_ngrams(t, n) for t in tokens), chunk_labels)
+
+    def compile(self):
+        """
+        Eng:
+        ==============================================================================================
+        Compiles models of all orders and builds one table of log-ratios: ids of every order are
+        shifted by the total size of lower orders, the per-n-gram offset of every order is added to
+        it's log-ratios. The last element is the value of a word unknown to every order.
+        ==============================================================================================
+
+        Ru:
+        ==============================================================================================
+        Компилирует модели всех порядков и строит одну таблицу логарифмов отношений: идентификаторы
+        каждого порядка сдвигаются на общий размер меньших порядков, к логарифмам отношений каждого
+        порядка прибавляется его поправка на n-грамму. Последний элемент - значение слова, неизвестного
+        всем порядкам.
+        ==============================================================================================
+        """
+        tables = []
+        self._id_offsets = {}
+        offset = 0
+        for n in self.orders:
+            model = self.models[n]
+            model.compile()
+            self._id_offsets[n] = offset
+            offset += len(model._log_ratios)
+            tables.append(np.asarray(model._log_ratios) + model._ngram_log_offset)
+        lowest = self.models[self.orders[0]]
+        tables.append(np.array([lowest._unseen_log_ratio + lowest._ngram_log_offset]))
+        self._log_ratios = np.concatenate(tables)
+        self._log_ratio_list = None
+
+    def ngrams(self, text):
+        """
+        Eng:
+        ==========================================================================================
+        :param text: Preprocessed text;
+
+        :return: List of ids (in the table of compile()) of the n-grams chosen by backoff: the
+                 empty n-gram of the highest order and one n-gram for every word, -1 for words
+                 unknown to every order.
+        ==========================================================================================
+
+        Ru:
+        ==========================================================================================
+        :param text: Предобработанный текст;
+
+        :return: Список идентификаторов (в таблице compile()) n-грамм, выбранных с переходом к
+                 меньшим порядкам: пустая n-грамма наибольшего порядка и по одной n-грамме на
+                 каждое слово, -1 для слов, неизвестных всем порядкам.
+        ==========================================================================================
+        """
+        if self._log_ratios is None:
+            self.compile()
+        tokens = tokenize(text)
+        orders = [(n, self.models[n].vocab.get, self._id_offsets[n]) for n in reversed(self.orders)]
+        top_get, top_offset = orders[0][1], orders[0][2]
+        ids = []
+        empty = top_get("")
+        if empty is not None:
+            ids.append(top_offset + empty)
+        for i in range(len(tokens)):
+            for n, get, offset in orders:
+                if i + n > len(tokens):
+                    continue
+                j = get(tokens[i] if n == 1 else " ".join(tokens[i:i + n]))
+                if j is not None:
+                    ids.append(offset + j)
+                    break
+            else:
+                ids.append(-1)
+        return ids
+
+    def log_odds(self, ids):
+        """
+        Eng:
+        ===============================================================================
+        :param ids: Result of ngrams();
+
+        :return: log P(pos | message) - log P(neg | message) (NaN if it is undefined).
+        ===============================================================================
+
+        Ru:
+        ===============================================================================
+        :param ids: Результат ngrams();
+
+        :return: log P(pos | сообщение) - log P(neg | сообщение) (NaN, если не определен).
+        ===============================================================================
+        """
+        if self._log_ratios is None:
+            self.compile()
+        if self._log_ratio_list is None:
+            self._log_ratio_list = self._log_ratios.tolist()
+        ratios = self._log_ratio_list
+        score = self.models[self.n]._prior_log_odds
+        for i in ids:
+            score += ratios[i]
+        return score
+
+    def count_matrix(self, docs):
+        """
+        Eng:
+        ===================================================================================
+        :param docs: Iterable of results of ngrams();
+
+        :return: X, unseen: Sparse CSR matrix (docs x ids) and array of amounts of words
+                 unknown to every order (see Model.count_matrix()).
+        ===================================================================================
+
+        Ru:
+        ===================================================================================
+        :param docs: Последовательность результатов ngrams();
+
+        :return: X, unseen: Разреженная CSR матрица (документы x идентификаторы) и массив
+                 количеств слов, неизвестных всем порядкам (см. Model.count_matrix()).
+        ===================================================================================
+        """
+        if self._log_ratios is None:
+            self.compile()
+        ids = array("q")
+        lengths = array("q")
+        for doc in docs:
+            start = len(ids)
+            ids.extend(doc)
+            lengths.append(len(ids) - start)
+        ids = np.frombuffer(ids, dtype=np.int64)
+        lengths = np.frombuffer(lengths, dtype=np.int64)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        known = ids >= 0
+        X = csr_matrix((np.ones(np.count_nonzero(known)), (rows[known], ids[known])),
+                       shape=(len(lengths), len(self._log_ratios) - 1))
+        unseen = lengths - np.bincount(rows[known], minlength=len(lengths))
+        return X, unseen.astype(np.float64)
+
+    def batch_log_odds(self, X, unseen):
+        """
+        Eng:
+        =================================================================================
+        :param X: Count matrix from count_matrix();
+
+        :param unseen: Amounts of unknown words from count_matrix();
+
+        :return: Array of log P(pos | message) - log P(neg | message) for every row of X.
+        =================================================================================
+
+        Ru:
+        =================================================================================
+        :param X: Матрица количеств, полученная из count_matrix();
+
+        :param unseen: Количества неизвестных слов, полученные из count_matrix();
+
+        :return: Массив log P(pos | сообщение) - log P(neg | сообщение) для каждой строки X.
+        =================================================================================
+        """
+        if self._log_ratios is None:
+            self.compile()
+        scores = X @ self._log_ratios[:-1] + self.models[self.n]._prior_log_odds
+        has_unseen = unseen > 0
+        scores[has_unseen] += unseen[has_unseen] * self._log_ratios[-1]
+        return scores
+
+    def to_dict(self):
+        """
+        Eng:
+        ==============================================================
+        :return: Dictionary with orders and to_dict() of every model.
+        ==============================================================
+
+        Ru:
+        ==============================================================
+        :return: Словарь с порядками и to_dict() каждой модели.
+        ==============================================================
+        """
+        return {
+            "orders": list(self.orders),
+            "lcn": self.lcn,
+            "tcn": self.tcn,
+            "models": [self.models[n].to_dict() for n in self.orders]
+        }
+
+    @staticmethod
+    def from_dict(d):
+        """
+        Eng:
+        ==================================================
+        :param d: Dictionary from to_dict() (or json file);
+
+        :return: m: BackoffModel() object.
+        ==================================================
+
+        Ru:
+        ==================================================
+        :param d: Словарь из to_dict() (или json файла);
+
+        :return: m: Объект BackoffModel().
+        ==================================================
+        """
+        m = BackoffModel(d["lcn"], d["tcn"], orders=d["orders"])
+        m.models = {n: Model.from_dict(model) for n, model in zip(m.orders, d["models"])}
+        m.compile()
+        return m
+
+    def save_model(self, path):
+        """
+        Eng:
+        ===================================================
+        :param path: Path to locate saved model file (json),
+                     it's read by Model.read_model().
+        ===================================================
+
+        Ru:
+        ===================================================
+        :param path: Путь к файлу модели (json), он читается
+                     Model.read_model().
+        ===================================================
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file)
+
+    def __repr__(self):
+        return "Backoff model for orders {orders}:{models}".format(
+            orders=self.orders, models="".join(repr(self.models[n]) for n in self.orders))
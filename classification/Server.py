@@ -0,0 +1,322 @@
+import asyncio
+import json
+import time
+from collections import deque
+import numpy as np
+from classification.Classifier import Classifier
+from classification.Model import Model
+
+
+class IncorrectTextError(TypeError):
+    """If text of a request is not str."""
+
+
+class Server:
+    """
+    Eng:
+    ==========================================================================================================
+    Asyncio inference server with line-delimited JSON protocol over TCP.
+
+    Every request is one line: {"id": ..., "text": "..."}, the answer is one line: {"id": ..., "label": "pos",
+    "score": 1.5} ("label" and "score" are null if the score is undefined). A line {"stats": true} returns
+    the counters from stats().
+
+    The model is loaded once. Concurrent requests (from one or many connections) are collected into
+    micro-batches, a batch is flushed when it has max_batch_size texts or when the first text has waited
+    max_wait seconds. Every batch is scored with one Classifier.batch_scores() call in a thread, so the event
+    loop keeps accepting requests meanwhile.
+    ==========================================================================================================
+
+    Ru:
+    ==========================================================================================================
+    Асинхронный сервер классификации с протоколом JSON по строкам поверх TCP.
+
+    Каждый запрос - одна строка: {"id": ..., "text": "..."}, ответ - одна строка: {"id": ..., "label": "pos",
+    "score": 1.5} ("label" и "score" равны null, если оценка не определена). Строка {"stats": true}
+    возвращает счетчики из stats().
+
+    Модель загружается один раз. Одновременные запросы (из одного или многих соединений) собираются в
+    микропакеты, пакет отправляется на обработку, когда в нем max_batch_size текстов или когда первый текст
+    ждет max_wait секунд. Каждый пакет оценивается одним вызовом Classifier.batch_scores() в отдельном
+    потоке, поэтому цикл событий в это время продолжает принимать запросы.
+    ==========================================================================================================
+    """
+    def __init__(self, classifier, host="127.0.0.1", port=8765, max_batch_size=64, max_wait=0.005,
+                 preprocess=None, punc=None, regexp_lst=None, methods=None, latency_window=10000):
+        """
+        Eng:
+        ==========================================================================================
+        :param classifier: Classifier() object;
+
+        :param host: Host to listen;
+
+        :param port: Port to listen;
+
+        :param max_batch_size: Max amount of texts in one batch;
+
+        :param max_wait: Max time in seconds which the first text of a batch waits for others;
+
+        :param preprocess: "full", "partial" or None (texts are already preprocessed);
+
+        :param punc: String which contains punctuational symbols;
+
+        :param regexp_lst: List of regular expressions for preprocessing;
+
+        :param methods: List of methods names for partial preprocess;
+
+        :param latency_window: Amount of last requests used for latency percentiles.
+        ==========================================================================================
+
+        Ru:
+        ==========================================================================================
+        :param classifier: Объект Classifier();
+
+        :param host: Адрес для прослушивания;
+
+        :param port: Порт для прослушивания;
+
+        :param max_batch_size: Максимальное количество текстов в одном пакете;
+
+        :param max_wait: Максимальное время в секундах, которое первый текст пакета ждет остальные;
+
+        :param preprocess: "full", "partial" или None (тексты уже предобработаны);
+
+        :param punc: Строка, содержащая пунктуационные символы;
+
+        :param regexp_lst: Список регулярных выражений для предобработки;
+
+        :param methods: Список с именами методов для частичной предобработки;
+
+        :param latency_window: Количество последних запросов для процентилей задержки.
+        ==========================================================================================
+        """
+        self.classifier = classifier
+        self.host = host
+        self.port = port
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.preprocess = preprocess
+        self.punc = punc
+        self.regexp_lst = regexp_lst
+        self.methods = methods
+
+        self.requests = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self._latencies = deque(maxlen=latency_window)
+        self._queue = None
+        self._server = None
+        self._batcher = None
+
+    @staticmethod
+    def from_model_path(path, lang, **kwargs):
+        """
+        Eng:
+        ======================================================================
+        :param path: Path to model (see Model.read_model());
+
+        :param lang: Language of texts;
+
+        :param kwargs: Other parameters of Server();
+
+        :return: Server() object with the loaded model.
+        ======================================================================
+
+        Ru:
+        ======================================================================
+        :param path: Путь к модели (см. Model.read_model());
+
+        :param lang: Язык текстов;
+
+        :param kwargs: Остальные параметры Server();
+
+        :return: Объект Server() с загруженной моделью.
+        ======================================================================
+        """
+        return Server(Classifier(Model.read_model(path), lang), **kwargs)
+
+    def _score(self, texts):
+        """Scores one batch (runs in executor thread)."""
+        return self.classifier.batch_scores(texts, self.preprocess, self.punc, self.regexp_lst, self.methods,
+                                            n_jobs=1)
+
+    def _score_each(self, texts):
+        """Scores texts one by one, the exception of a failed text is returned instead of it's score."""
+        scores = []
+        for text in texts:
+            try:
+                scores.append(self._score([text])[0])
+            except Exception as e:
+                scores.append(e)
+        return scores
+
+    async def classify(self, text):
+        """
+        Eng:
+        =======================================================================
+        :param text: Source text;
+
+        :return: label, score: Predicted label and log-odds (None, None if the
+                 score is undefined).
+
+        The text is scored together with other texts of it's micro-batch.
+        Raises IncorrectTextError if text is not str.
+        =======================================================================
+
+        Ru:
+        =======================================================================
+        :param text: Исходный текст;
+
+        :return: label, score: Предсказанная метка и логарифм шансов (None,
+                 None, если оценка не определена).
+
+        Текст оценивается вместе с другими текстами своего микропакета.
+        Вызывает IncorrectTextError, если text не str.
+        =======================================================================
+        """
+        if not isinstance(text, str):
+            raise IncorrectTextError("Text should be str, not {t}!".format(t=type(text).__name__))
+        self._ensure_batcher()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    def _ensure_batcher(self):
+        if self._batcher is None:
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.get_running_loop().create_task(self._run_batches())
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _, _ in batch]
+            try:
+                scores = await loop.run_in_executor(None, self._score, texts)
+            except Exception:
+                # One bad text shouldn't fail unrelated requests: the batch is scored text by text.
+                scores = await loop.run_in_executor(None, self._score_each, texts)
+
+            self.batches += 1
+            done = time.perf_counter()
+            for (_, future, start), score in zip(batch, scores):
+                self.requests += 1
+                self._latencies.append(done - start)
+                if future.done():
+                    continue
+                if isinstance(score, Exception):
+                    future.set_exception(score)
+                elif score != score:
+                    future.set_result((None, None))
+                else:
+                    future.set_result(("pos" if score > 0 else "neg", float(score)))
+
+    def stats(self):
+        """
+        Eng:
+        ==========================================================================================
+        :return: Dictionary with amount of requests and batches, mean batch size, current and max
+                 queue depth and p50/p99 latency (in milliseconds) of the last requests.
+        ==========================================================================================
+
+        Ru:
+        ==========================================================================================
+        :return: Словарь с количеством запросов и пакетов, средним размером пакета, текущей и
+                 максимальной длиной очереди и задержкой p50/p99 (в миллисекундах) последних
+                 запросов.
+        ==========================================================================================
+        """
+        latencies = np.array(self._latencies) * 1000
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0.0
+        }
+
+    async def _answer(self, line, writer, lock):
+        request = None
+        try:
+            request = json.loads(line)
+            if request.get("stats"):
+                response = self.stats()
+            else:
+                label, score = await self.classify(request["text"])
+                response = {"id": request.get("id"), "label": label, "score": score}
+        except Exception as e:
+            response = {"id": request.get("id") if isinstance(request, dict) else None,
+                        "error": "{name}: {e}".format(name=type(e).__name__, e=e)}
+        async with lock:
+            writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    async def _handle(self, reader, writer):
+        """Reads requests of one connection, every request is answered as soon as it's batch is scored."""
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.ensure_future(self._answer(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def start(self):
+        """
+        Eng:
+        ===================================================
+        Starts listening, returns asyncio server object.
+        ===================================================
+
+        Ru:
+        ===================================================
+        Начинает прослушивание, возвращает объект сервера
+        asyncio.
+        ===================================================
+        """
+        self._ensure_batcher()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self._server
+
+    async def serve_forever(self):
+        """Starts the server and serves until it's cancelled."""
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        """
+        Eng:
+        =============================================
+        Runs the server in a new event loop (blocks).
+        =============================================
+
+        Ru:
+        =============================================
+        Запускает сервер в новом цикле событий
+        (блокирует выполнение).
+        =============================================
+        """
+        asyncio.run(self.serve_forever())
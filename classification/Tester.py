@@ -1,45 +1,285 @@
+import numpy as np
+
+
+def _ratio(a, b):
+    """a / b, or 0 if b is 0 (elementwise for arrays)."""
+    if np.ndim(b) == 0:
+        return a / b if b else 0.0
+    a = np.asarray(a, dtype=np.float64)
+    return np.divide(a, b, out=np.zeros_like(a), where=np.asarray(b) != 0)
+
+
 class Tester:
+    @staticmethod
+    def scores(clsr_obj, test_df):
+        """
+        Eng:
+        ===================================================================================
+        :param clsr_obj: Classifier() object;
+
+        :param test_df: DF with test set (model's text and label columns);
+
+        :return: Array of log-odds of every message (one batched pass, see batch_scores()).
+        ===================================================================================
+
+        Ru:
+        ===================================================================================
+        :param clsr_obj: Объект Classifier();
+
+        :param test_df: DF с тестовым набором (столбцы текста и меток модели);
+
+        :return: Массив логарифмов шансов каждого сообщения (за один проход, см.
+                 batch_scores()).
+        ===================================================================================
+        """
+        return clsr_obj.batch_scores(test_df[clsr_obj.model.tcn])
+
     @staticmethod
     def test(clsr_obj, test_df):
-        wrong_answers = 0
-        for row in test_df.iterrows():
-            predicted_label = clsr_obj.classify_text(
-                row[1][clsr_obj.model.tcn])
-            if predicted_label != row[1][clsr_obj.model.lcn]:
-                wrong_answers += 1
-        return wrong_answers / len(test_df)
+        return Tester.error_rates(Tester.scores(clsr_obj, test_df), test_df[clsr_obj.model.lcn])
 
     @staticmethod
-    def get_summary(clsr_obj, test_df):
-        wrong_answers = 0
-        TP = 0
-        TN = 0
-        FP = 0
-        FN = 0
-        for row in test_df.iterrows():
-            predicted_label = clsr_obj.classify_text(row[1][clsr_obj.model.tcn])
-
-            if predicted_label != row[1][clsr_obj.model.lcn]:
-                wrong_answers += 1
-                if predicted_label == "pos":
-                    FP += 1
-                if predicted_label == "neg":
-                    FN += 1
-            else:
-                if predicted_label == "pos":
-                    TP += 1
-                if predicted_label == "neg":
-                    TN += 1
-        Precision = TP / (TP + FP)
-        Recall = TP / (TP + FN)
-        F_1 = (2 * Precision * Recall) / (Precision + Recall)
+    def error_rates(scores, labels):
+        """
+        Eng:
+        =====================================================================================
+        :param scores: Array (messages) or matrix (messages x models) of log-odds;
+
+        :param labels: True labels of messages;
+
+        :return: Error rate (the same as test()) or array of error rates of every model.
+        =====================================================================================
+
+        Ru:
+        =====================================================================================
+        :param scores: Массив (сообщения) или матрица (сообщения x модели) логарифмов шансов;
+
+        :param labels: Истинные метки сообщений;
+
+        :return: Доля ошибок (такая же, как у test()) или массив долей ошибок каждой модели.
+        =====================================================================================
+        """
+        labels = np.asarray(labels, dtype=object)
+        if np.ndim(scores) == 2:
+            labels = labels[:, None]
+        # NaN scores (label None) are wrong for every label.
+        right = ((scores > 0) & (labels == "pos")) | ((scores <= 0) & (labels == "neg"))
+        return np.count_nonzero(~right, axis=0) / len(labels)
+
+    @staticmethod
+    def confusion_matrix(scores, labels):
+        """
+        Eng:
+        ===========================================================================================
+        :param scores: Array of log-odds;
+
+        :param labels: True labels of messages;
+
+        :return: Dictionary with "TP", "TN", "FP" and "FN" counts.
+
+        Message is predicted "pos" if it's score > 0 and "neg" if it's score <= 0, messages with NaN
+        score (label None) are only counted as errors.
+        ===========================================================================================
+
+        Ru:
+        ===========================================================================================
+        :param scores: Массив логарифмов шансов;
+
+        :param labels: Истинные метки сообщений;
+
+        :return: Словарь с количествами "TP", "TN", "FP" и "FN".
+
+        Сообщение предсказывается как "pos", если его оценка > 0, и как "neg", если оценка <= 0,
+        сообщения с оценкой NaN (метка None) учитываются только как ошибки.
+        ===========================================================================================
+        """
+        labels = np.asarray(labels, dtype=object)
+        pos = labels == "pos"
+        neg = labels == "neg"
+        predicted_pos = scores > 0
+        predicted_neg = scores <= 0
+        return {
+            "TP": int(np.count_nonzero(predicted_pos & pos)),
+            "TN": int(np.count_nonzero(predicted_neg & neg)),
+            "FP": int(np.count_nonzero(predicted_pos & ~pos)),
+            "FN": int(np.count_nonzero(predicted_neg & ~neg))
+        }
+
+    @staticmethod
+    def summary_from_scores(scores, labels):
+        """
+        Eng:
+        ===================================================================================
+        :param scores: Array of log-odds;
+
+        :param labels: True labels of messages;
+
+        :return: Dictionary like get_summary(), precision, recall or F-1 measure are 0 if
+                 their denominator is 0.
+        ===================================================================================
+
+        Ru:
+        ===================================================================================
+        :param scores: Массив логарифмов шансов;
+
+        :param labels: Истинные метки сообщений;
+
+        :return: Словарь как у get_summary(), точность, полнота или F-мера равны 0, если
+                 их знаменатель равен 0.
+        ===================================================================================
+        """
+        cm = Tester.confusion_matrix(scores, labels)
+        precision = _ratio(cm["TP"], cm["TP"] + cm["FP"])
+        recall = _ratio(cm["TP"], cm["TP"] + cm["FN"])
         return {
-                "Error:": wrong_answers / len(test_df),
-                "True positive": TP,
-                "True negative": TN,
-                "False positive": FP,
-                "False negative": FN,
-                "Precision": Precision,
-                "Recall": Recall,
-                "F-1 measure": F_1
+                "Error:": Tester.error_rates(scores, labels),
+                "True positive": cm["TP"],
+                "True negative": cm["TN"],
+                "False positive": cm["FP"],
+                "False negative": cm["FN"],
+                "Precision": precision,
+                "Recall": recall,
+                "F-1 measure": _ratio(2 * precision * recall, precision + recall)
             }
+
+    @staticmethod
+    def get_summary(clsr_obj, test_df):
+        return Tester.summary_from_scores(Tester.scores(clsr_obj, test_df), test_df[clsr_obj.model.lcn])
+
+    @staticmethod
+    def _sweep(scores, labels):
+        """Distinct scores in descending order and cumulative TP, FP when score >= threshold is "pos"."""
+        labels = np.asarray(labels, dtype=object)
+        defined = ~np.isnan(scores)
+        scores = scores[defined]
+        pos = labels[defined] == "pos"
+        order = np.argsort(-scores, kind="mergesort")
+        scores = scores[order]
+        pos = pos[order]
+        # Last position of every distinct score.
+        last = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1] if len(scores) else np.zeros(0, dtype=int)
+        tp = np.cumsum(pos)[last]
+        fp = (last + 1) - tp
+        return scores[last], tp, fp
+
+    @staticmethod
+    def roc_curve(scores, labels):
+        """
+        Eng:
+        ==========================================================================================
+        :param scores: Array of log-odds;
+
+        :param labels: True labels of messages;
+
+        :return: fpr, tpr, thresholds: False and true positive rates when messages with score >=
+                 threshold are predicted "pos" (the curve starts at (0, 0)).
+
+        Messages with NaN score are skipped.
+        ==========================================================================================
+
+        Ru:
+        ==========================================================================================
+        :param scores: Массив логарифмов шансов;
+
+        :param labels: Истинные метки сообщений;
+
+        :return: fpr, tpr, thresholds: Доли ложно и истинно положительных, когда сообщения с
+                 оценкой >= порога предсказываются как "pos" (кривая начинается в (0, 0)).
+
+        Сообщения с оценкой NaN пропускаются.
+        ==========================================================================================
+        """
+        thresholds, tp, fp = Tester._sweep(scores, labels)
+        tp = np.r_[0, tp]
+        fp = np.r_[0, fp]
+        return _ratio(fp, fp[-1]), _ratio(tp, tp[-1]), np.r_[np.inf, thresholds]
+
+    @staticmethod
+    def pr_curve(scores, labels):
+        """
+        Eng:
+        ==========================================================================================
+        :param scores: Array of log-odds;
+
+        :param labels: True labels of messages;
+
+        :return: precision, recall, thresholds: Precision and recall when messages with score >=
+                 threshold are predicted "pos".
+
+        Messages with NaN score are skipped.
+        ==========================================================================================
+
+        Ru:
+        ==========================================================================================
+        :param scores: Массив логарифмов шансов;
+
+        :param labels: Истинные метки сообщений;
+
+        :return: precision, recall, thresholds: Точность и полнота, когда сообщения с оценкой >=
+                 порога предсказываются как "pos".
+
+        Сообщения с оценкой NaN пропускаются.
+        ==========================================================================================
+        """
+        thresholds, tp, fp = Tester._sweep(scores, labels)
+        total_pos = tp[-1] if len(tp) else 0
+        return _ratio(tp, tp + fp), _ratio(tp, total_pos), thresholds
+
+    @staticmethod
+    def auc(x, y):
+        """
+        Eng:
+        ==============================================
+        :param x: Increasing x coordinates of curve;
+
+        :param y: y coordinates of curve;
+
+        :return: Area under curve (trapezoidal rule).
+        ==============================================
+
+        Ru:
+        ==============================================
+        :param x: Возрастающие координаты x кривой;
+
+        :param y: Координаты y кривой;
+
+        :return: Площадь под кривой (метод трапеций).
+        ==============================================
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        return float(np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2))
+
+    @staticmethod
+    def evaluate(clsr_obj, test_df):
+        """
+        Eng:
+        ====================================================================================
+        :param clsr_obj: Classifier() object;
+
+        :param test_df: DF with test set (model's text and label columns);
+
+        :return: Dictionary like get_summary() with "ROC AUC" and "Average precision" added.
+
+        The whole test set is scored once, all metrics are computed from these scores.
+        ====================================================================================
+
+        Ru:
+        ====================================================================================
+        :param clsr_obj: Объект Classifier();
+
+        :param test_df: DF с тестовым набором (столбцы текста и меток модели);
+
+        :return: Словарь как у get_summary() с добавленными "ROC AUC" и "Average precision".
+
+        Весь тестовый набор оценивается один раз, все метрики вычисляются по этим оценкам.
+        ====================================================================================
+        """
+        scores = Tester.scores(clsr_obj, test_df)
+        labels = test_df[clsr_obj.model.lcn]
+        summary = Tester.summary_from_scores(scores, labels)
+        fpr, tpr, _ = Tester.roc_curve(scores, labels)
+        precision, recall, _ = Tester.pr_curve(scores, labels)
+        summary["ROC AUC"] = Tester.auc(fpr, tpr)
+        summary["Average precision"] = float(np.sum(np.diff(np.r_[0, recall]) * precision))
+        return summary
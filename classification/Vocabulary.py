@@ -0,0 +1,403 @@
+from hashlib import blake2b
+from zlib import crc32
+import numpy as np
+
+
+def ngram_hash(ngram):
+    """Stable 64-bit hash of n-gram (the same in every process, unlike hash())."""
+    return int.from_bytes(blake2b(ngram.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class Vocabulary:
+    """
+    Eng:
+    ==========================================================================================
+    Maps every n-gram to a dense integer id (0, 1, 2, ... in order of first appearance).
+
+    The vocabulary is shared by the positive and negative counts of a Model, so every
+    n-gram is stored only once and the counts themselves are kept in NumPy arrays indexed
+    by id.
+    ==========================================================================================
+
+    Ru:
+    ==========================================================================================
+    Сопоставляет каждой n-грамме плотный целочисленный идентификатор (0, 1, 2, ... в порядке
+    первого появления).
+
+    Словарь общий для положительных и отрицательных счетчиков модели, поэтому каждая n-грамма
+    хранится только один раз, а сами счетчики хранятся в массивах NumPy, индексируемых по id.
+    ==========================================================================================
+    """
+    def __init__(self, ngrams=None):
+        """
+        Eng:
+        =====================================================
+        :param ngrams: Iterable of n-grams for initial ids.
+        =====================================================
+
+        Ru:
+        =====================================================
+        :param ngrams: Последовательность начальных n-грамм.
+        =====================================================
+        """
+        self._ids = {}
+        if ngrams is not None:
+            self.add_all(ngrams)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, ngram):
+        return ngram in self._ids
+
+    def __iter__(self):
+        """N-grams in order of their ids."""
+        return iter(self._ids)
+
+    def get(self, ngram, default=None):
+        """
+        Eng:
+        ============================================================
+        :param ngram: Source n-gram;
+
+        :param default: Value for n-gram which is not in vocabulary;
+
+        :return: Id of n-gram or default.
+        ============================================================
+
+        Ru:
+        ============================================================
+        :param ngram: Исходная n-грамма;
+
+        :param default: Значение для n-граммы, отсутствующей в словаре;
+
+        :return: Идентификатор n-граммы или default.
+        ============================================================
+        """
+        return self._ids.get(ngram, default)
+
+    def add(self, ngram):
+        """
+        Eng:
+        =============================================================
+        :param ngram: Source n-gram;
+
+        :return: Id of n-gram (new id if n-gram is not in vocabulary).
+        =============================================================
+
+        Ru:
+        =============================================================
+        :param ngram: Исходная n-грамма;
+
+        :return: Идентификатор n-граммы (новый, если ее нет в словаре).
+        =============================================================
+        """
+        return self._ids.setdefault(ngram, len(self._ids))
+
+    def add_all(self, ngrams):
+        """
+        Eng:
+        ==============================================================================
+        :param ngrams: Iterable of n-grams;
+
+        :return: List of ids of n-grams, new n-grams are added to vocabulary.
+        ==============================================================================
+
+        Ru:
+        ==============================================================================
+        :param ngrams: Последовательность n-грамм;
+
+        :return: Список идентификаторов n-грамм, новые n-граммы добавляются в словарь.
+        ==============================================================================
+        """
+        ids = self._ids
+        return [ids.setdefault(ngram, len(ids)) for ngram in ngrams]
+
+    def lookup(self, ngrams, default=-1):
+        """
+        Eng:
+        ===================================================================
+        :param ngrams: Iterable of n-grams;
+
+        :param default: Id for n-grams which are not in vocabulary;
+
+        :return: NumPy array of ids of n-grams.
+        ===================================================================
+
+        Ru:
+        ===================================================================
+        :param ngrams: Последовательность n-грамм;
+
+        :param default: Идентификатор для n-грамм, отсутствующих в словаре;
+
+        :return: Массив NumPy с идентификаторами n-грамм.
+        ===================================================================
+        """
+        get = self._ids.get
+        return np.fromiter((get(ngram, default) for ngram in ngrams), dtype=np.int64)
+
+
+class MappedVocabulary:
+    """
+    Eng:
+    ==========================================================================================
+    Read-only vocabulary over arrays (usually memory-mapped from a binary model file):
+        - hashes: sorted ngram_hash() values, the id of n-gram is it's position in this array;
+        - offsets: offsets of UTF-8 encoded n-grams in keys (len(hashes) + 1 values);
+        - keys: UTF-8 encoded n-grams in order of ids.
+
+    Has the same lookup interface as Vocabulary, n-grams are found by binary search of their
+    hash and checked against the stored key, so hash collisions are handled.
+    ==========================================================================================
+
+    Ru:
+    ==========================================================================================
+    Словарь только для чтения поверх массивов (как правило, отображенных в память из
+    бинарного файла модели):
+        - hashes: отсортированные значения ngram_hash(), id n-граммы - ее позиция в массиве;
+        - offsets: смещения n-грамм в кодировке UTF-8 в массиве keys (len(hashes) + 1 значений);
+        - keys: n-граммы в кодировке UTF-8 в порядке их идентификаторов.
+
+    Имеет тот же интерфейс поиска, что и Vocabulary. N-граммы ищутся бинарным поиском по хэшу
+    и сверяются с сохраненным ключом, поэтому коллизии хэшей обрабатываются.
+    ==========================================================================================
+    """
+    def __init__(self, hashes, offsets, keys):
+        self.hashes = hashes
+        self.offsets = offsets
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, ngram):
+        return self.get(ngram) is not None
+
+    def __iter__(self):
+        """N-grams in order of their ids."""
+        for i in range(len(self.hashes)):
+            yield self._key(i)
+
+    def _key(self, i):
+        return self.keys[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def _find(self, ngram, h, i):
+        """Id of n-gram with hash h starting from position i of the first equal hash, or None."""
+        while i < len(self.hashes) and self.hashes[i] == h:
+            if self._key(i) == ngram:
+                return i
+            i += 1
+        return None
+
+    def get(self, ngram, default=None):
+        """
+        Eng:
+        ============================================================
+        :param ngram: Source n-gram;
+
+        :param default: Value for n-gram which is not in vocabulary;
+
+        :return: Id of n-gram or default.
+        ============================================================
+
+        Ru:
+        ============================================================
+        :param ngram: Исходная n-грамма;
+
+        :param default: Значение для n-граммы, отсутствующей в словаре;
+
+        :return: Идентификатор n-граммы или default.
+        ============================================================
+        """
+        h = np.uint64(ngram_hash(ngram))
+        i = self._find(ngram, h, int(np.searchsorted(self.hashes, h)))
+        return default if i is None else i
+
+    def lookup(self, ngrams, default=-1):
+        """
+        Eng:
+        ===================================================================
+        :param ngrams: Iterable of n-grams;
+
+        :param default: Id for n-grams which are not in vocabulary;
+
+        :return: NumPy array of ids of n-grams.
+        ===================================================================
+
+        Ru:
+        ===================================================================
+        :param ngrams: Последовательность n-грамм;
+
+        :param default: Идентификатор для n-грамм, отсутствующих в словаре;
+
+        :return: Массив NumPy с идентификаторами n-грамм.
+        ===================================================================
+        """
+        ngrams = list(ngrams)
+        hashes = np.fromiter((ngram_hash(ngram) for ngram in ngrams), dtype=np.uint64, count=len(ngrams))
+        positions = np.searchsorted(self.hashes, hashes)
+        ids = np.full(len(ngrams), default, dtype=np.int64)
+        if len(self.hashes) == 0:
+            return ids
+        found = self.hashes[np.minimum(positions, len(self.hashes) - 1)] == hashes
+        for j in np.flatnonzero(found):
+            i = self._find(ngrams[j], hashes[j], int(positions[j]))
+            if i is not None:
+                ids[j] = i
+        return ids
+
+    def to_vocabulary(self):
+        """
+        Eng:
+        ============================================================
+        :return: Vocabulary() object with the same ids of n-grams.
+        ============================================================
+
+        Ru:
+        ============================================================
+        :return: Объект Vocabulary() с теми же идентификаторами n-грамм.
+        ============================================================
+        """
+        return Vocabulary(self)
+
+
+class HashingVocabulary:
+    """
+    Eng:
+    ==========================================================================================
+    Maps every n-gram to one of a fixed number of buckets: id = crc32(UTF-8 n-gram) % buckets.
+
+    Nothing is stored per n-gram, so the size of the model is fixed by the amount of buckets
+    and doesn't grow with the corpus. Different n-grams may share a bucket (collision), their
+    counts are then added together. Has the same interface as Vocabulary, every n-gram is
+    "known".
+    ==========================================================================================
+
+    Ru:
+    ==========================================================================================
+    Сопоставляет каждой n-грамме одну из фиксированного числа корзин:
+    id = crc32(n-грамма в UTF-8) % buckets.
+
+    Для n-грамм ничего не хранится, поэтому размер модели задается количеством корзин и не
+    растет вместе с корпусом. Разные n-граммы могут попасть в одну корзину (коллизия), тогда их
+    счетчики складываются. Имеет тот же интерфейс, что и Vocabulary, каждая n-грамма
+    "известна".
+    ==========================================================================================
+    """
+    def __init__(self, buckets):
+        """
+        Eng:
+        ========================================================
+        :param buckets: Amount of buckets (from 1 to 2 ** 32).
+        ========================================================
+
+        Ru:
+        ========================================================
+        :param buckets: Количество корзин (от 1 до 2 ** 32).
+        ========================================================
+        """
+        if not 0 < buckets <= 1 << 32:
+            raise ValueError("Amount of buckets should be from 1 to 2 ** 32!")
+        self.buckets = buckets
+
+    def __len__(self):
+        return self.buckets
+
+    def __contains__(self, ngram):
+        return True
+
+    def __iter__(self):
+        """Ids of buckets (n-grams themselves are not stored)."""
+        return iter(range(self.buckets))
+
+    def get(self, ngram, default=None):
+        """
+        Eng:
+        =========================================
+        :param ngram: Source n-gram;
+
+        :param default: Not used;
+
+        :return: Bucket of n-gram.
+        =========================================
+
+        Ru:
+        =========================================
+        :param ngram: Исходная n-грамма;
+
+        :param default: Не используется;
+
+        :return: Корзина n-граммы.
+        =========================================
+        """
+        return crc32(ngram.encode("utf-8")) % self.buckets
+
+    add = get
+
+    def add_all(self, ngrams):
+        """
+        Eng:
+        ======================================
+        :param ngrams: Iterable of n-grams;
+
+        :return: List of buckets of n-grams.
+        ======================================
+
+        Ru:
+        ======================================
+        :param ngrams: Последовательность n-грамм;
+
+        :return: Список корзин n-грамм.
+        ======================================
+        """
+        buckets = self.buckets
+        return [crc32(ngram.encode("utf-8")) % buckets for ngram in ngrams]
+
+    def lookup(self, ngrams, default=-1):
+        """
+        Eng:
+        =============================================
+        :param ngrams: Iterable of n-grams;
+
+        :param default: Not used;
+
+        :return: NumPy array of buckets of n-grams.
+        =============================================
+
+        Ru:
+        =============================================
+        :param ngrams: Последовательность n-грамм;
+
+        :param default: Не используется;
+
+        :return: Массив NumPy с корзинами n-грамм.
+        =============================================
+        """
+        return np.fromiter((crc32(ngram.encode("utf-8")) for ngram in ngrams), dtype=np.int64) % self.buckets
+
+    @staticmethod
+    def expected_collision_rate(ngrams, buckets):
+        """
+        Eng:
+        ========================================================================================
+        :param ngrams: Expected amount of unique n-grams;
+
+        :param buckets: Amount of buckets;
+
+        :return: Expected share of unique n-grams which share a bucket with another n-gram
+                 counted earlier: 1 - buckets * (1 - exp(-ngrams / buckets)) / ngrams.
+        ========================================================================================
+
+        Ru:
+        ========================================================================================
+        :param ngrams: Ожидаемое количество уникальных n-грамм;
+
+        :param buckets: Количество корзин;
+
+        :return: Ожидаемая доля уникальных n-грамм, попадающих в корзину вместе с другой,
+                 ранее подсчитанной n-граммой: 1 - buckets * (1 - exp(-ngrams / buckets)) / ngrams.
+        ========================================================================================
+        """
+        if ngrams <= 0:
+            return 0.0
+        return float(1 - buckets * -np.expm1(-ngrams / buckets) / ngrams)
@@ -1,5 +1,7 @@
+from functools import lru_cache
 import pandas as pd
 from joblib import Parallel, delayed
+from utils.Instrumentation import Instrumentation
 from utils.TextPreprocessor import TextPreprocessor
 
 
@@ -11,6 +13,40 @@ class IncorrectTransformationLabelError(KeyError):
     """If converter dict hasn't got needed keys ..."""
 
 
+@lru_cache(maxsize=None)
+def _plan(lang, punc, regexps, methods):
+    """
+    Compiled preprocessing plan for the config (built once in every worker process, so only the small
+    config is sent with a task instead of the pickled plan).
+    """
+    regexp_lst = list(regexps) if regexps is not None else None
+    part_methods = list(methods) if methods is not None else None
+    return TextPreprocessor(lang=lang, punc=punc, regexp_lst=regexp_lst, part_methods=part_methods).compile(
+        part_methods)
+
+
+def _preprocess_batch(config, texts):
+    """Preprocesses one batch of texts (runs in a worker process)."""
+    return _plan(*config).batch(texts)
+
+
+def _char_batches(texts, batch_size, batch_chars):
+    """
+    Bounds (start, end) of consecutive batches of texts: a batch is closed when it has batch_size texts or
+    it's texts have batch_chars characters in total, so batches of long documents are shorter.
+    """
+    start = 0
+    chars = 0
+    for i, text in enumerate(texts):
+        chars += len(text) if isinstance(text, str) else 1
+        if i + 1 - start >= batch_size or chars >= batch_chars:
+            yield start, i + 1
+            start = i + 1
+            chars = 0
+    if start < len(texts):
+        yield start, len(texts)
+
+
 class DFPreprocessor:
     """For parallel using joblib-module is needed."""
     def __init__(self, lang, src_df, converter_dict=None):
@@ -43,7 +79,8 @@ class DFPreprocessor:
         self.cd = converter_dict
         self.lang = lang
 
-    def preprocess_text_column(self, columns, puncs=None, regexps=None, n_jobs=8):
+    def preprocess_text_column(self, columns, puncs=None, regexps=None, n_jobs=8, batch_size=1000, cache=None,
+                               batch_chars=200000):
         """
         Eng:
         ========================================================================================================
@@ -55,9 +92,17 @@ class DFPreprocessor:
 
         :param n_jobs: Number of processors;
 
+        :param batch_size: Max amount of texts preprocessed by one joblib task;
+
+        :param cache: PreprocessCache object (texts found in it are not preprocessed again) or None;
+
+        :param batch_chars: Max total length of texts preprocessed by one joblib task;
+
         :return: t: New DF containing preprocessed text columns.
 
-        Parallel preprocessing is released by joblib module.
+        Parallel preprocessing is released by joblib module. All columns are preprocessed in one pass
+        with one pool: texts are sent in batches limited by amount and total length, the preprocessor
+        is built once in every worker from it's parameters. Order of texts is preserved.
         ========================================================================================================
 
         Ru:
@@ -70,9 +115,18 @@ class DFPreprocessor:
 
         :param n_jobs: Число процессов;
 
+        :param batch_size: Максимальное количество текстов, обрабатываемых одной задачей joblib;
+
+        :param cache: Объект PreprocessCache (найденные в нем тексты не обрабатываются повторно) или None;
+
+        :param batch_chars: Максимальная общая длина текстов, обрабатываемых одной задачей joblib;
+
         :return: t: Новый DF с предобработанными столбцами из списка columns.
 
-        Реализована параллельная предобработка данных с помощью модуля joblib.
+        Реализована параллельная предобработка данных с помощью модуля joblib. Все столбцы обрабатываются
+        за один проход одним пулом: тексты отправляются пакетами, ограниченными по количеству и общей
+        длине, предобработчик строится один раз в каждом процессе по своим параметрам. Порядок текстов
+        сохраняется.
         ========================================================================================================
         """
         for cn in columns:
@@ -86,17 +140,62 @@ class DFPreprocessor:
                 t[key] = self.src[key]
 
         # Parallel preprocessing
-        if self.lang == "ru":
-            tp = TextPreprocessor(lang="ru", punc=puncs, regexp_lst=regexps)
-        else:
-            tp = TextPreprocessor(lang="eng", punc=puncs, regexp_lst=regexps)
-        for cn in columns:
-            t[cn] = Parallel(n_jobs=n_jobs)(delayed(tp.full_preprocess)(text) for text in self.src[cn])
+        config = self._config(puncs, regexps, None)
+        for cn, texts in self._preprocess_columns(config, columns, n_jobs, batch_size, batch_chars, cache).items():
+            t[cn] = texts
 
         t.drop_duplicates()
         t = t.sample(frac=1).reset_index(drop=True)
         return t
 
+    def _config(self, puncs, regexps, methods):
+        """Hashable parameters of the preprocessor (see _plan())."""
+        return ("ru" if self.lang == "ru" else "eng", puncs, tuple(regexps) if regexps is not None else None,
+                tuple(methods) if methods is not None else None)
+
+    def _preprocess_columns(self, config, columns, n_jobs, batch_size, batch_chars, cache):
+        """Preprocesses all columns as one sequence of texts, returns {column: list of texts}."""
+        texts = []
+        for cn in columns:
+            texts.extend(self.src[cn])
+        texts = self._cached_preprocess(config, texts, n_jobs, batch_size, batch_chars, cache)
+        result = {}
+        start = 0
+        for cn in columns:
+            result[cn] = texts[start:start + len(self.src)]
+            start += len(self.src)
+        return result
+
+    @staticmethod
+    def _batch_preprocess(config, texts, n_jobs, batch_size, batch_chars):
+        """Preprocesses texts in batches limited by batch_size texts and batch_chars characters."""
+        texts = list(texts)
+        preprocess_batch = Instrumentation.wrap(_preprocess_batch)
+        batches = Parallel(n_jobs=n_jobs)(delayed(preprocess_batch)(config, texts[start:end])
+                                          for start, end in _char_batches(texts, batch_size, batch_chars))
+        return [text for batch in Instrumentation.unwrap(batches) for text in batch]
+
+    def _cached_preprocess(self, config, texts, n_jobs, batch_size, batch_chars, cache):
+        """Like _batch_preprocess(), but texts found in cache are taken from it and only the rest are preprocessed."""
+        texts = list(texts)
+        if cache is None or not cache.enabled:
+            return self._batch_preprocess(config, texts, n_jobs, batch_size, batch_chars)
+        _, puncs, regexps, _ = config
+        steps = _plan(*config).steps
+        regexps = list(regexps) if regexps is not None else None
+        keys = [cache.key(text, self.lang, puncs, regexps, steps) for text in texts]
+        found = cache.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            preprocessed = self._batch_preprocess(config, missing.values(), n_jobs, batch_size, batch_chars)
+            new = dict(zip(missing, preprocessed))
+            cache.put_many(new.items())
+            found.update(new)
+        return [found[key] for key in keys]
+
     def preprocess_label_column(self, lbl_column, old_pos_label, old_neg_label):
         """
         Eng:
@@ -142,7 +241,8 @@ class DFPreprocessor:
 
         return t
 
-    def partial_preprocess_text_column(self, columns, puncs=None, methods=None, regexps=None, n_jobs=8):
+    def partial_preprocess_text_column(self, columns, puncs=None, methods=None, regexps=None, n_jobs=8,
+                                       batch_size=1000, cache=None, batch_chars=200000):
         """
         Eng:
         ========================================================================================================
@@ -156,9 +256,17 @@ class DFPreprocessor:
 
         :param n_jobs: Number of processors;
 
+        :param batch_size: Max amount of texts preprocessed by one joblib task;
+
+        :param cache: PreprocessCache object (texts found in it are not preprocessed again) or None;
+
+        :param batch_chars: Max total length of texts preprocessed by one joblib task;
+
         :return: t: New DF containing preprocessed text columns.
 
-        Parallel preprocessing is released by joblib module.
+        Parallel preprocessing is released by joblib module. All columns are preprocessed in one pass
+        with one pool: texts are sent in batches limited by amount and total length, the preprocessor
+        is built once in every worker from it's parameters. Order of texts is preserved.
         ========================================================================================================
 
         Ru:
@@ -173,9 +281,18 @@ class DFPreprocessor:
 
         :param n_jobs: Число процессов;
 
+        :param batch_size: Максимальное количество текстов, обрабатываемых одной задачей joblib;
+
+        :param cache: Объект PreprocessCache (найденные в нем тексты не обрабатываются повторно) или None;
+
+        :param batch_chars: Максимальная общая длина текстов, обрабатываемых одной задачей joblib;
+
         :return: t: Новый DF с предобработанными столбцами из списка columns.
 
-        Реализована параллельная предобработка данных с помощью модуля joblib.
+        Реализована параллельная предобработка данных с помощью модуля joblib. Все столбцы обрабатываются
+        за один проход одним пулом: тексты отправляются пакетами, ограниченными по количеству и общей
+        длине, предобработчик строится один раз в каждом процессе по своим параметрам. Порядок текстов
+        сохраняется.
         ========================================================================================================
         """
         for cn in columns:
@@ -189,12 +306,9 @@ class DFPreprocessor:
                 t[key] = self.src[key]
 
         # Parallel preprocessing
-        if self.lang == "ru":
-            tp = TextPreprocessor(lang="ru", punc=puncs, regexp_lst=regexps, part_methods=methods)
-        else:
-            tp = TextPreprocessor(lang="eng", punc=puncs, regexp_lst=regexps, part_methods=methods)
-        for cn in columns:
-            t[cn] = Parallel(n_jobs=n_jobs)(delayed(tp.partial_preprocess)(text) for text in self.src[cn])
+        config = self._config(puncs, regexps, methods)
+        for cn, texts in self._preprocess_columns(config, columns, n_jobs, batch_size, batch_chars, cache).items():
+            t[cn] = texts
 
         t.drop_duplicates()
         t = t.sample(frac=1).reset_index(drop=True)
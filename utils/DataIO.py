@@ -0,0 +1,398 @@
+import os
+import pandas as pd
+
+
+class MissingPyArrowError(ImportError):
+    """If Parquet or Arrow file is used but pyarrow is not installed."""
+
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+
+
+def _pyarrow():
+    """Imports pyarrow only when a columnar file is used (CSV works without it)."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise MissingPyArrowError("pyarrow is needed for Parquet and Arrow files: pip install pyarrow")
+    return pyarrow
+
+
+class _CsvWriter:
+    """Appends DFs to CSV file (header is written with the first DF)."""
+    def __init__(self, path, index):
+        self.path = path
+        self.index = index
+        self._first = True
+
+    def write(self, df):
+        df.to_csv(self.path, mode="w" if self._first else "a", header=self._first, index=self.index)
+        self._first = False
+
+    def close(self):
+        if self._first:
+            # Empty output still gets a file.
+            open(self.path, "w").close()
+
+
+class _ArrowWriter:
+    """Appends DFs to Parquet or Arrow IPC file as record batches (schema is taken from the first DF)."""
+    def __init__(self, path, index):
+        self.path = path
+        self.index = index
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=self.index)
+        if self._writer is None:
+            self._schema = table.schema
+            if DataIO.format(self.path) == "parquet":
+                self._writer = pa.parquet.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        # Without written DFs the schema is unknown, so nothing is created (write an empty DF, see DataIO.empty()).
+        if self._writer is not None:
+            self._writer.close()
+
+
+class DataIO:
+    """
+    Eng:
+    ==========================================================================================================
+    Reading and writing of corpora, splits and predictions in CSV, Parquet or Arrow IPC (Feather v2) format.
+    The format is chosen by file extension: ".parquet", ".pq" - Parquet, ".arrow", ".feather", ".ipc" -
+    Arrow IPC, anything else - CSV (written by pandas with index, like DF.to_csv()).
+
+    Columnar files are read with column projection, so e.g. training reads only label and text columns.
+    Arrow IPC files are memory-mapped: several processes reading one corpus share it's pages. pyarrow is
+    imported only when a columnar file is used.
+    ==========================================================================================================
+
+    Ru:
+    ==========================================================================================================
+    Чтение и запись корпусов, разбиений и предсказаний в формате CSV, Parquet или Arrow IPC (Feather v2).
+    Формат выбирается по расширению файла: ".parquet", ".pq" - Parquet, ".arrow", ".feather", ".ipc" -
+    Arrow IPC, остальные - CSV (записывается pandas с индексом, как DF.to_csv()).
+
+    Из колоночных файлов читаются только нужные столбцы, например, при обучении читаются только столбцы
+    меток и текстов. Файлы Arrow IPC отображаются в память: несколько процессов, читающих один корпус,
+    разделяют его страницы. pyarrow импортируется только при использовании колоночных файлов.
+    ==========================================================================================================
+    """
+    @staticmethod
+    def format(path):
+        """
+        Eng:
+        =========================================
+        :param path: Path to file;
+
+        :return: "parquet", "arrow" or "csv".
+        =========================================
+
+        Ru:
+        =========================================
+        :param path: Путь к файлу;
+
+        :return: "parquet", "arrow" или "csv".
+        =========================================
+        """
+        extension = os.path.splitext(str(path))[1].lower()
+        if extension in PARQUET_EXTENSIONS:
+            return "parquet"
+        if extension in ARROW_EXTENSIONS:
+            return "arrow"
+        return "csv"
+
+    @staticmethod
+    def is_columnar(path):
+        """True if path is Parquet or Arrow IPC file."""
+        return DataIO.format(path) != "csv"
+
+    @staticmethod
+    def read_table(path, columns=None, memory_map=True):
+        """
+        Eng:
+        ===============================================================================================
+        :param path: Path to Parquet or Arrow IPC file;
+
+        :param columns: List of columns to read (all if None);
+
+        :param memory_map: Memory-map the file instead of reading it;
+
+        :return: pyarrow.Table.
+
+        Columns of a memory-mapped Arrow IPC table point into the file pages, nothing is copied.
+        ===============================================================================================
+
+        Ru:
+        ===============================================================================================
+        :param path: Путь к файлу Parquet или Arrow IPC;
+
+        :param columns: Список читаемых столбцов (все, если None);
+
+        :param memory_map: Отобразить файл в память вместо чтения;
+
+        :return: pyarrow.Table.
+
+        Столбцы отображенной в память таблицы Arrow IPC указывают на страницы файла, ничего не
+        копируется.
+        ===============================================================================================
+        """
+        pa = _pyarrow()
+        if DataIO.format(path) == "parquet":
+            return pa.parquet.read_table(path, columns=columns, memory_map=memory_map)
+        source = pa.memory_map(path, "r") if memory_map else pa.OSFile(path, "rb")
+        table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns is not None else table
+
+    @staticmethod
+    def read(path, columns=None, memory_map=True):
+        """
+        Eng:
+        ===============================================================================================
+        :param path: Path to CSV, Parquet or Arrow IPC file;
+
+        :param columns: List of columns to read (all if None);
+
+        :param memory_map: Memory-map columnar file instead of reading it;
+
+        :return: DF. CSV without columns is read as read_csv(path, index_col=0), with columns only
+                 these columns are read (index is not needed then).
+        ===============================================================================================
+
+        Ru:
+        ===============================================================================================
+        :param path: Путь к файлу CSV, Parquet или Arrow IPC;
+
+        :param columns: Список читаемых столбцов (все, если None);
+
+        :param memory_map: Отобразить колоночный файл в память вместо чтения;
+
+        :return: DF. CSV без columns читается как read_csv(path, index_col=0), с columns читаются только
+                 эти столбцы (индекс тогда не нужен).
+        ===============================================================================================
+        """
+        if DataIO.is_columnar(path):
+            return DataIO.read_table(path, columns, memory_map).to_pandas()
+        if columns is None:
+            return pd.read_csv(path, index_col=0)
+        return pd.read_csv(path, usecols=columns)[columns]
+
+    @staticmethod
+    def empty(path):
+        """
+        Eng:
+        ===============================================================================================
+        :param path: Path to CSV, Parquet or Arrow IPC file;
+
+        :return: DF without rows with columns (and index) of the file, like read(path). Rows are not
+                 read: only the schema of columnar file or the header of CSV.
+        ===============================================================================================
+
+        Ru:
+        ===============================================================================================
+        :param path: Путь к файлу CSV, Parquet или Arrow IPC;
+
+        :return: DF без строк со столбцами (и индексом) файла, как read(path). Строки не читаются:
+                 только схема колоночного файла или заголовок CSV.
+        ===============================================================================================
+        """
+        fmt = DataIO.format(path)
+        if fmt == "csv":
+            return pd.read_csv(path, index_col=0, nrows=0)
+        pa = _pyarrow()
+        if fmt == "parquet":
+            schema = pa.parquet.read_schema(path, memory_map=True)
+        else:
+            with pa.memory_map(path, "r") as source:
+                schema = pa.ipc.open_file(source).schema
+        return schema.empty_table().to_pandas()
+
+    @staticmethod
+    def iter_batches(path, columns=None, batch_size=100000):
+        """
+        Eng:
+        ===============================================================================================
+        :param path: Path to CSV, Parquet or Arrow IPC file;
+
+        :param columns: List of columns to read (all if None, see read());
+
+        :param batch_size: Max amount of rows in one DF;
+
+        :return: Generator of DFs with consecutive rows of the file.
+        ===============================================================================================
+
+        Ru:
+        ===============================================================================================
+        :param path: Путь к файлу CSV, Parquet или Arrow IPC;
+
+        :param columns: Список читаемых столбцов (все, если None, см. read());
+
+        :param batch_size: Максимальное количество строк в одном DF;
+
+        :return: Генератор DF с последовательными строками файла.
+        ===============================================================================================
+        """
+        fmt = DataIO.format(path)
+        if fmt == "csv":
+            if columns is None:
+                chunks = pd.read_csv(path, index_col=0, chunksize=batch_size, compression="infer")
+            else:
+                chunks = pd.read_csv(path, usecols=columns, chunksize=batch_size, compression="infer")
+            for chunk in chunks:
+                yield chunk if columns is None else chunk[columns]
+            return
+        pa = _pyarrow()
+        if fmt == "parquet":
+            file = pa.parquet.ParquetFile(path, memory_map=True)
+            # Index columns stored by pandas are read too, so DFs get their index back.
+            batches = file.iter_batches(batch_size=batch_size, columns=DataIO._with_index(file.schema_arrow,
+                                                                                             columns))
+            schema = file.schema_arrow
+        else:
+            table = DataIO.read_table(path)
+            schema = table.schema
+            if columns is not None:
+                table = table.select(DataIO._with_index(schema, columns))
+            batches = table.to_batches(max_chunksize=batch_size)
+        for batch in batches:
+            yield pa.Table.from_batches([batch]).replace_schema_metadata(schema.metadata).to_pandas()
+
+    @staticmethod
+    def _with_index(schema, columns):
+        """Columns and index columns stored by pandas (from schema metadata)."""
+        if columns is None:
+            return None
+        metadata = schema.pandas_metadata or {}
+        # Range index is stored as metadata only (not as a column).
+        index = [name for name in metadata.get("index_columns", []) if isinstance(name, str)]
+        return list(columns) + [name for name in index if name not in columns]
+
+    @staticmethod
+    def write(df, path, index=True):
+        """
+        Eng:
+        ==================================================================
+        :param df: Source DF;
+
+        :param path: Path to CSV, Parquet or Arrow IPC file;
+
+        :param index: Save index of DF.
+        ==================================================================
+
+        Ru:
+        ==================================================================
+        :param df: Исходный DF;
+
+        :param path: Путь к файлу CSV, Parquet или Arrow IPC;
+
+        :param index: Сохранить индекс DF.
+        ==================================================================
+        """
+        writer = DataIO.writer(path, index)
+        writer.write(df)
+        writer.close()
+
+    @staticmethod
+    def write_table(table, path):
+        """
+        Eng:
+        =============================================================================
+        :param table: pyarrow.Table;
+
+        :param path: Path to CSV, Parquet or Arrow IPC file (CSV goes through DF).
+        =============================================================================
+
+        Ru:
+        =============================================================================
+        :param table: pyarrow.Table;
+
+        :param path: Путь к файлу CSV, Parquet или Arrow IPC (CSV записывается
+                     через DF).
+        =============================================================================
+        """
+        fmt = DataIO.format(path)
+        if fmt == "csv":
+            table.to_pandas().to_csv(path)
+            return
+        pa = _pyarrow()
+        if fmt == "parquet":
+            pa.parquet.write_table(table, path)
+        else:
+            with pa.ipc.new_file(path, table.schema) as writer:
+                writer.write_table(table)
+
+    @staticmethod
+    def writer(path, index=True):
+        """
+        Eng:
+        ================================================================================
+        :param path: Path to CSV, Parquet or Arrow IPC file;
+
+        :param index: Save index of DFs;
+
+        :return: Writer with write(df) (appends rows) and close() methods. Columnar
+                 file takes it's schema from the first DF, so close() without written
+                 DFs creates no file (write an empty DF, e.g. from empty()).
+        ================================================================================
+
+        Ru:
+        ================================================================================
+        :param path: Путь к файлу CSV, Parquet или Arrow IPC;
+
+        :param index: Сохранять индекс DF;
+
+        :return: Объект с методами write(df) (дописывает строки) и close().
+                 Колоночный файл получает схему из первого DF, поэтому close() без
+                 записанных DF не создает файл (запишите пустой DF, например, из
+                 empty()).
+        ================================================================================
+        """
+        if DataIO.is_columnar(path):
+            return _ArrowWriter(path, index)
+        return _CsvWriter(path, index)
+
+    @staticmethod
+    def with_columns(table, columns, drop=()):
+        """
+        Eng:
+        ==========================================================================================
+        :param table: pyarrow.Table;
+
+        :param columns: Dictionary {name: values} of new columns (existing ones are replaced);
+
+        :param drop: Names of columns to remove;
+
+        :return: New pyarrow.Table. Other columns are shared with the source table, they are not
+                 converted to Python objects or copied.
+        ==========================================================================================
+
+        Ru:
+        ==========================================================================================
+        :param table: pyarrow.Table;
+
+        :param columns: Словарь {имя: значения} новых столбцов (существующие заменяются);
+
+        :param drop: Имена удаляемых столбцов;
+
+        :return: Новая pyarrow.Table. Остальные столбцы разделяются с исходной таблицей, они не
+                 преобразуются в объекты Python и не копируются.
+        ==========================================================================================
+        """
+        pa = _pyarrow()
+        table = table.drop_columns([name for name in drop if name in table.column_names])
+        for name, values in columns.items():
+            array = pa.array(values, from_pandas=True)
+            if name in table.column_names:
+                table = table.set_column(table.column_names.index(name), name, array)
+            else:
+                table = table.append_column(name, array)
+        return table
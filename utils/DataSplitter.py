@@ -1,3 +1,7 @@
+import numpy as np
+from utils.DataIO import DataIO
+
+
 class InvalidFractionError(ValueError):
     """If sum of fractions for splitter greater than 1."""
 
@@ -50,21 +54,8 @@ class DataSplitter:
         валидационного наборов.
         ========================================================================================================
         """
-        # Training = 0.8
-        train = df.sample(frac=0.8, random_state=1)
-
-        # Testing = 0.1
-        diff = df.drop(train.index)
-        test = diff.sample(int(0.1 * len(df)), random_state=1)
-
-        # Validating = 0.1
-        valid = diff.drop(test.index)
-
-        train = train.reset_index(drop=True)
-        test = test.reset_index(drop=True)
-        valid = valid.reset_index(drop=True)
-
-        return train, test, valid
+        train, test, valid = DataSplitter.basic_split_indices(len(df))
+        return DataSplitter.take(df, train), DataSplitter.take(df, test), DataSplitter.take(df, valid)
 
     @staticmethod
     def split(df, fractions):
@@ -87,13 +78,249 @@ class DataSplitter:
         :return: Список DF'ов.
         =======================================================================
         """
+        return [DataSplitter.take(df, part) for part in DataSplitter.sequential_split_indices(len(df), fractions)]
+
+    @staticmethod
+    def _sample(n, frac=None, size=None):
+        """Positions of df.sample(frac=frac or n=size, random_state=1) for DF with n rows."""
+        if size is None:
+            size = round(frac * n)
+        return np.random.RandomState(1).choice(n, size=size, replace=False)
+
+    @staticmethod
+    def basic_split_indices(n):
+        """
+        Eng:
+        ==================================================================================
+        :param n: Amount of rows;
+
+        :return: train, test, valid: Arrays of row positions, the same rows as basic_split().
+        ==================================================================================
+
+        Ru:
+        ==================================================================================
+        :param n: Количество строк;
+
+        :return: train, test, valid: Массивы номеров строк, те же строки, что у basic_split().
+        ==================================================================================
+        """
+        rest = np.arange(n)
+        chosen = DataSplitter._sample(n, frac=0.8)
+        train = rest[chosen]
+        rest = np.delete(rest, chosen)
+        chosen = DataSplitter._sample(len(rest), size=int(0.1 * n))
+        test = rest[chosen]
+        valid = np.delete(rest, chosen)
+        return train, test, valid
+
+    @staticmethod
+    def sequential_split_indices(n, fractions):
+        """
+        Eng:
+        =======================================================================================
+        :param n: Amount of rows;
+
+        :param fractions: Fractions for splitting;
+
+        :return: List of arrays of row positions, the same rows as split().
+
+        As in split(), every fraction is taken from the rows left after previous fractions.
+        =======================================================================================
+
+        Ru:
+        =======================================================================================
+        :param n: Количество строк;
+
+        :param fractions: Список с долями для разделения;
+
+        :return: Список массивов номеров строк, те же строки, что у split().
+
+        Как и в split(), каждая доля берется от строк, оставшихся после предыдущих долей.
+        =======================================================================================
+        """
         if abs(1 - sum(fractions)) > 0.005:
             raise InvalidFractionError("Sum of splitting fractions must be less then 1!")
-        dfs = []
-        t = df
+        parts = []
+        rest = np.arange(n)
         for fraction in fractions:
-            p = t.sample(frac=fraction, random_state=1)
-            dfs.append(p.reset_index(drop=True))
-            t = t.drop(p.index)
+            chosen = DataSplitter._sample(len(rest), frac=fraction)
+            parts.append(rest[chosen])
+            rest = np.delete(rest, chosen)
+        return parts
+
+    @staticmethod
+    def _groups(n, labels):
+        """Arrays of row positions of every label (all rows if labels is None)."""
+        if labels is None:
+            return [np.arange(n)]
+        _, codes = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+        order = np.argsort(codes, kind="stable")
+        return np.split(order, np.flatnonzero(np.diff(codes[order])) + 1)
+
+    @staticmethod
+    def split_indices(n, fractions, labels=None, seed=1):
+        """
+        Eng:
+        ===============================================================================================
+        :param n: Amount of rows;
+
+        :param fractions: Fractions for splitting (of all rows, e.g. [0.8, 0.1, 0.1]);
 
-        return dfs
+        :param labels: Labels of rows for stratified splitting (every part has the same proportions of
+                       labels as the whole data set) or None;
+
+        :param seed: Seed of random generator;
+
+        :return: List of shuffled arrays of row positions, one array for every fraction.
+
+        Only index arrays are built, rows are copied by take() when they are needed.
+        ===============================================================================================
+
+        Ru:
+        ===============================================================================================
+        :param n: Количество строк;
+
+        :param fractions: Список с долями для разделения (от всех строк, например [0.8, 0.1, 0.1]);
+
+        :param labels: Метки строк для стратифицированного разделения (каждая часть содержит метки в
+                       тех же пропорциях, что и весь набор данных) или None;
+
+        :param seed: Начальное значение генератора случайных чисел;
+
+        :return: Список перемешанных массивов номеров строк, по одному массиву на каждую долю.
+
+        Строятся только массивы индексов, строки копируются функцией take(), когда они нужны.
+        ===============================================================================================
+        """
+        if abs(1 - sum(fractions)) > 0.005:
+            raise InvalidFractionError("Sum of splitting fractions must be less then 1!")
+        rng = np.random.default_rng(seed)
+        parts = [[] for _ in fractions]
+        for group in DataSplitter._groups(n, labels):
+            group = rng.permutation(group)
+            bounds = np.round(np.cumsum(fractions) / sum(fractions) * len(group)).astype(np.int64)
+            for part, chunk in zip(parts, np.split(group, bounds[:-1])):
+                part.append(chunk)
+        return [rng.permutation(np.concatenate(part)) for part in parts]
+
+    @staticmethod
+    def kfold_indices(n, k, labels=None, seed=1):
+        """
+        Eng:
+        ==========================================================================================
+        :param n: Amount of rows;
+
+        :param k: Number of folds;
+
+        :param labels: Labels of rows for stratified folds or None;
+
+        :param seed: Seed of random generator;
+
+        :return: List of k arrays of row positions (folds sizes differ at most by 1).
+        ==========================================================================================
+
+        Ru:
+        ==========================================================================================
+        :param n: Количество строк;
+
+        :param k: Число блоков;
+
+        :param labels: Метки строк для стратифицированных блоков или None;
+
+        :param seed: Начальное значение генератора случайных чисел;
+
+        :return: Список из k массивов номеров строк (размеры блоков отличаются не более чем на 1).
+        ==========================================================================================
+        """
+        rng = np.random.default_rng(seed)
+        folds = np.empty(n, dtype=np.int64)
+        start = 0
+        for group in DataSplitter._groups(n, labels):
+            # Rows of every label are dealt to folds in turn, continuing from the previous label.
+            folds[rng.permutation(group)] = (start + np.arange(len(group))) % k
+            start += len(group)
+        return [rng.permutation(np.flatnonzero(folds == i)) for i in range(k)]
+
+    @staticmethod
+    def take(df, indices):
+        """
+        Eng:
+        ===========================================================
+        :param df: Source pandas.DataFrame;
+
+        :param indices: Array of row positions;
+
+        :return: New DF with these rows (index is reset).
+        ===========================================================
+
+        Ru:
+        ===========================================================
+        :param df: Исходный pandas.DataFrame;
+
+        :param indices: Массив номеров строк;
+
+        :return: Новый DF с этими строками (индекс сбрасывается).
+        ===========================================================
+        """
+        return df.iloc[indices].reset_index(drop=True)
+
+    @staticmethod
+    def save_split(parts, paths):
+        """
+        Eng:
+        ======================================================================
+        :param parts: List of DFs (e.g. from split());
+
+        :param paths: List of paths, format of every file is chosen by it's
+                      extension (CSV, Parquet or Arrow IPC, see utils.DataIO).
+        ======================================================================
+
+        Ru:
+        ======================================================================
+        :param parts: Список DF (например, из split());
+
+        :param paths: Список путей, формат каждого файла выбирается по его
+                      расширению (CSV, Parquet или Arrow IPC, см. utils.DataIO).
+        ======================================================================
+        """
+        for part, path in zip(parts, paths):
+            DataIO.write(part, path)
+
+    @staticmethod
+    def save_indices(path, parts):
+        """
+        Eng:
+        ===========================================================
+        :param path: Path to .npz file;
+
+        :param parts: List of arrays of row positions.
+        ===========================================================
+
+        Ru:
+        ===========================================================
+        :param path: Путь к файлу .npz;
+
+        :param parts: Список массивов номеров строк.
+        ===========================================================
+        """
+        np.savez(path, **{"part_{i}".format(i=i): part for i, part in enumerate(parts)})
+
+    @staticmethod
+    def load_indices(path):
+        """
+        Eng:
+        ===========================================================
+        :param path: Path to file saved by save_indices();
+
+        :return: List of arrays of row positions.
+        ===========================================================
+
+        Ru:
+        ===========================================================
+        :param path: Путь к файлу, сохраненному save_indices();
+
+        :return: Список массивов номеров строк.
+        ===========================================================
+        """
+        with np.load(path) as data:
+            return [data["part_{i}".format(i=i)] for i in range(len(data.files))]
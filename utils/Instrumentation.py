@@ -0,0 +1,310 @@
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+
+class _Stage:
+    """Counters of one stage."""
+    __slots__ = ("calls", "seconds", "tokens", "ngrams", "samples")
+
+    def __init__(self, max_samples):
+        self.calls = 0
+        self.seconds = 0.0
+        self.tokens = 0
+        self.ngrams = 0
+        self.samples = deque(maxlen=max_samples)
+
+
+class _Measured:
+    """Result of a task wrapped by Instrumentation.wrap() with counters of the worker."""
+    __slots__ = ("result", "snapshot")
+
+    def __init__(self, result, snapshot):
+        self.result = result
+        self.snapshot = snapshot
+
+
+class _Collector:
+    """Picklable wrapper of joblib task which returns counters of the worker process with the result."""
+    def __init__(self, function, parent_pid):
+        self.function = function
+        self.parent_pid = parent_pid
+
+    def __call__(self, *args, **kwargs):
+        if os.getpid() == self.parent_pid:
+            # Sequential backend: counters are already recorded in this process.
+            return self.function(*args, **kwargs)
+        # Reused workers (loky) must not keep the flag or counters of this task for the next ones.
+        enabled, stages = Instrumentation.enabled, Instrumentation._stages
+        Instrumentation.enabled = True
+        Instrumentation.reset()
+        try:
+            result = self.function(*args, **kwargs)
+            return _Measured(result, Instrumentation.snapshot())
+        finally:
+            Instrumentation.enabled, Instrumentation._stages = enabled, stages
+
+
+class Instrumentation:
+    """
+    Eng:
+    ==========================================================================================================
+    Optional per-stage counters of the preprocessing, training and scoring pipeline.
+
+    For every stage (e.g. "preprocess.prep_stem", "train.count", "batch_scores.score") the amount of calls,
+    cumulative wall time, time percentiles (over the last max_samples calls) and amounts of tokens and
+    n-grams are recorded. Instrumentation is disabled by default: instrumented code checks one class
+    attribute, so it costs almost nothing.
+
+    Counters of joblib workers are collected with wrap() and unwrap() and merged into counters of the main
+    process. Results can be exported as a text report or in Prometheus text format.
+    ==========================================================================================================
+
+    Ru:
+    ==========================================================================================================
+    Необязательные счетчики по этапам предобработки, обучения и классификации.
+
+    Для каждого этапа (например, "preprocess.prep_stem", "train.count", "batch_scores.score") записываются
+    количество вызовов, суммарное время, процентили времени (по последним max_samples вызовам) и количества
+    токенов и n-грамм. По умолчанию инструментирование отключено: код проверяет один атрибут класса, поэтому
+    оно почти ничего не стоит.
+
+    Счетчики процессов joblib собираются с помощью wrap() и unwrap() и объединяются со счетчиками основного
+    процесса. Результаты можно выгрузить в виде текстового отчета или в текстовом формате Prometheus.
+    ==========================================================================================================
+    """
+    enabled = False
+    max_samples = 10000
+    _stages = {}
+
+    @staticmethod
+    def enable():
+        """Enables recording of counters."""
+        Instrumentation.enabled = True
+
+    @staticmethod
+    def disable():
+        """Disables recording of counters (recorded counters are kept)."""
+        Instrumentation.enabled = False
+
+    @staticmethod
+    def reset():
+        """Removes all recorded counters."""
+        Instrumentation._stages = {}
+
+    @staticmethod
+    def _stage(name):
+        stage = Instrumentation._stages.get(name)
+        if stage is None:
+            stage = Instrumentation._stages[name] = _Stage(Instrumentation.max_samples)
+        return stage
+
+    @staticmethod
+    def record(name, seconds, calls=1, tokens=0, ngrams=0):
+        """
+        Eng:
+        ==========================================================================
+        :param name: Name of stage;
+
+        :param seconds: Wall time of the calls;
+
+        :param calls: Amount of calls (e.g. texts of a batch), the time sample is
+                      seconds / calls;
+
+        :param tokens: Amount of processed tokens;
+
+        :param ngrams: Amount of processed n-grams.
+        ==========================================================================
+
+        Ru:
+        ==========================================================================
+        :param name: Имя этапа;
+
+        :param seconds: Время выполнения вызовов;
+
+        :param calls: Количество вызовов (например, текстов пакета), значение
+                      времени для процентилей - seconds / calls;
+
+        :param tokens: Количество обработанных токенов;
+
+        :param ngrams: Количество обработанных n-грамм.
+        ==========================================================================
+        """
+        stage = Instrumentation._stage(name)
+        stage.calls += calls
+        stage.seconds += seconds
+        stage.tokens += tokens
+        stage.ngrams += ngrams
+        if calls:
+            stage.samples.append(seconds / calls)
+
+    @staticmethod
+    @contextmanager
+    def timer(name, calls=1, tokens=0, ngrams=0):
+        """Context manager which records wall time of it's body as one record() (nothing if disabled)."""
+        if not Instrumentation.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            Instrumentation.record(name, time.perf_counter() - start, calls, tokens, ngrams)
+
+    @staticmethod
+    def snapshot():
+        """
+        Eng:
+        ==============================================================
+        :return: Picklable dictionary with counters of every stage.
+        ==============================================================
+
+        Ru:
+        ==============================================================
+        :return: Сериализуемый словарь со счетчиками каждого этапа.
+        ==============================================================
+        """
+        return {name: {"calls": stage.calls, "seconds": stage.seconds, "tokens": stage.tokens,
+                       "ngrams": stage.ngrams, "samples": list(stage.samples)}
+                for name, stage in Instrumentation._stages.items()}
+
+    @staticmethod
+    def merge(snapshot):
+        """
+        Eng:
+        ==============================================================
+        :param snapshot: Result of snapshot() (e.g. of other process).
+
+        Adds counters of the snapshot to the counters of this process.
+        ==============================================================
+
+        Ru:
+        ==============================================================
+        :param snapshot: Результат snapshot() (например, другого
+                         процесса).
+
+        Добавляет счетчики снимка к счетчикам этого процесса.
+        ==============================================================
+        """
+        for name, counters in snapshot.items():
+            stage = Instrumentation._stage(name)
+            stage.calls += counters["calls"]
+            stage.seconds += counters["seconds"]
+            stage.tokens += counters["tokens"]
+            stage.ngrams += counters["ngrams"]
+            stage.samples.extend(counters["samples"])
+
+    @staticmethod
+    def wrap(function):
+        """
+        Eng:
+        ==========================================================================================
+        :param function: Function of joblib task;
+
+        :return: The same function if instrumentation is disabled, otherwise wrapper which enables
+                 instrumentation in the worker and returns it's counters with the result (see
+                 unwrap()).
+        ==========================================================================================
+
+        Ru:
+        ==========================================================================================
+        :param function: Функция задачи joblib;
+
+        :return: Та же функция, если инструментирование отключено, иначе обертка, которая
+                 включает инструментирование в рабочем процессе и возвращает его счетчики вместе с
+                 результатом (см. unwrap()).
+        ==========================================================================================
+        """
+        if not Instrumentation.enabled:
+            return function
+        return _Collector(function, os.getpid())
+
+    @staticmethod
+    def unwrap(results):
+        """
+        Eng:
+        ===============================================================================
+        :param results: Iterable of results of joblib tasks created with wrap();
+
+        :return: Generator of plain results, counters of workers are merged as they
+                 come.
+        ===============================================================================
+
+        Ru:
+        ===============================================================================
+        :param results: Последовательность результатов задач joblib, созданных wrap();
+
+        :return: Генератор обычных результатов, счетчики процессов объединяются по мере
+                 поступления.
+        ===============================================================================
+        """
+        for result in results:
+            if isinstance(result, _Measured):
+                Instrumentation.merge(result.snapshot)
+                result = result.result
+            yield result
+
+    @staticmethod
+    def _percentiles(samples):
+        if not samples:
+            return 0.0, 0.0, 0.0
+        p50, p90, p99 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 90, 99])
+        return float(p50), float(p90), float(p99)
+
+    @staticmethod
+    def report():
+        """
+        Eng:
+        =====================================================
+        :return: Text table with counters of every stage.
+        =====================================================
+
+        Ru:
+        =====================================================
+        :return: Текстовая таблица со счетчиками этапов.
+        =====================================================
+        """
+        lines = ["{:<44} {:>10} {:>10} {:>10} {:>10} {:>10} {:>12} {:>12}".format(
+            "stage", "calls", "total s", "p50 ms", "p90 ms", "p99 ms", "tokens", "ngrams")]
+        for name in sorted(Instrumentation._stages):
+            stage = Instrumentation._stages[name]
+            p50, p90, p99 = Instrumentation._percentiles(stage.samples)
+            lines.append("{:<44} {:>10} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f} {:>12} {:>12}".format(
+                name, stage.calls, stage.seconds, p50 * 1000, p90 * 1000, p99 * 1000, stage.tokens, stage.ngrams))
+        return "\n".join(lines)
+
+    @staticmethod
+    def prometheus(prefix="textclf"):
+        """
+        Eng:
+        ==============================================================================
+        :param prefix: Prefix of metric names;
+
+        :return: Counters in Prometheus text exposition format (time is a summary with
+                 0.5, 0.9 and 0.99 quantiles, the rest are counters).
+        ==============================================================================
+
+        Ru:
+        ==============================================================================
+        :param prefix: Префикс имен метрик;
+
+        :return: Счетчики в текстовом формате Prometheus (время - summary с квантилями
+                 0.5, 0.9 и 0.99, остальные - counter).
+        ==============================================================================
+        """
+        stages = sorted(Instrumentation._stages.items())
+        lines = ["# TYPE {p}_stage_seconds summary".format(p=prefix)]
+        for name, stage in stages:
+            for q, value in zip(("0.5", "0.9", "0.99"), Instrumentation._percentiles(stage.samples)):
+                lines.append('{p}_stage_seconds{{stage="{s}",quantile="{q}"}} {v!r}'.format(
+                    p=prefix, s=name, q=q, v=value))
+            lines.append('{p}_stage_seconds_sum{{stage="{s}"}} {v!r}'.format(p=prefix, s=name, v=stage.seconds))
+            lines.append('{p}_stage_seconds_count{{stage="{s}"}} {v}'.format(p=prefix, s=name, v=stage.calls))
+        for counter in ("tokens", "ngrams"):
+            lines.append("# TYPE {p}_stage_{c}_total counter".format(p=prefix, c=counter))
+            for name, stage in stages:
+                lines.append('{p}_stage_{c}_total{{stage="{s}"}} {v}'.format(
+                    p=prefix, c=counter, s=name, v=getattr(stage, counter)))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,181 @@
+import atexit
+import os
+import threading
+from pymystem3 import Mystem
+
+
+class Lemmatizer:
+    """
+    Eng:
+    ===========================================================================================================
+    Long-lived Mystem lemmatizer: one mystem process per worker process, reused across calls.
+
+    Many documents are lemmatized per round-trip to mystem: they are joined into one line with a sentinel
+    word between them and the result is split back apart by the same sentinel. Calls are serialized with a
+    lock, so one object can be used from several threads.
+
+    Use Lemmatizer.instance() to get the object of the current process.
+    ===========================================================================================================
+
+    Ru:
+    ===========================================================================================================
+    Долгоживущий лемматизатор Mystem: один процесс mystem на каждый рабочий процесс, используемый повторно.
+
+    За одно обращение к mystem лемматизируется много документов: они объединяются в одну строку со
+    словом-разделителем между ними, а результат разделяется обратно по этому же разделителю. Вызовы
+    выполняются под блокировкой, поэтому один объект можно использовать из нескольких потоков.
+
+    Объект текущего процесса можно получить с помощью Lemmatizer.instance().
+    ===========================================================================================================
+    """
+    SENTINEL = " mystemdocumentseparator "
+
+    _instance = None
+    _instance_pid = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, batch_chars=100000):
+        """
+        Eng:
+        ==================================================================
+        :param batch_chars: Max amount of characters sent to mystem at once.
+        ==================================================================
+
+        Ru:
+        ==================================================================
+        :param batch_chars: Максимальное количество символов, отправляемых в
+                            mystem за один раз.
+        ==================================================================
+        """
+        self.batch_chars = batch_chars
+        self._mystem = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def instance():
+        """
+        Eng:
+        ===============================================================
+        :return: Lemmatizer object of the current process.
+
+        The object is created on the first call in every process (also
+        in processes forked from a process which already has one).
+        ===============================================================
+
+        Ru:
+        ===============================================================
+        :return: Объект Lemmatizer текущего процесса.
+
+        Объект создается при первом вызове в каждом процессе (в том
+        числе в процессах, порожденных процессом, у которого он уже есть).
+        ===============================================================
+        """
+        pid = os.getpid()
+        if Lemmatizer._instance_pid != pid:
+            with Lemmatizer._instance_lock:
+                if Lemmatizer._instance_pid != pid:
+                    Lemmatizer._instance = Lemmatizer()
+                    Lemmatizer._instance_pid = pid
+                    atexit.register(Lemmatizer._instance.close)
+        return Lemmatizer._instance
+
+    def _process(self):
+        if self._mystem is None:
+            self._mystem = Mystem()
+            self._mystem.start()
+        return self._mystem
+
+    def close(self):
+        """
+        Eng:
+        ==========================================================
+        Stops mystem process (it is started again on the next call).
+        ==========================================================
+
+        Ru:
+        ==========================================================
+        Останавливает процесс mystem (он будет запущен снова при
+        следующем вызове).
+        ==========================================================
+        """
+        with self._lock:
+            if self._mystem is not None:
+                self._mystem.close()
+                self._mystem = None
+
+    def lemmatize(self, text):
+        """
+        Eng:
+        ========================================================================
+        :param text: Source text;
+
+        :return: Lemmatized text, the same as "".join(Mystem().lemmatize(text)).
+        ========================================================================
+
+        Ru:
+        ========================================================================
+        :param text: Исходный текст;
+
+        :return: Лемматизированный текст, такой же как
+                 "".join(Mystem().lemmatize(text)).
+        ========================================================================
+        """
+        with self._lock:
+            return "".join(self._process().lemmatize(text))
+
+    def lemmatize_batch(self, texts):
+        """
+        Eng:
+        =======================================================================================
+        :param texts: List of source texts;
+
+        :return: List of lemmatized texts (the same as lemmatize() for every text).
+
+        Texts are sent to mystem in batches of about batch_chars characters. Texts with line
+        breaks or with the sentinel are lemmatized one by one, because mystem processes every
+        line separately.
+        =======================================================================================
+
+        Ru:
+        =======================================================================================
+        :param texts: Список исходных текстов;
+
+        :return: Список лемматизированных текстов (таких же, как lemmatize() для каждого текста).
+
+        Тексты отправляются в mystem пакетами примерно по batch_chars символов. Тексты с
+        переводами строк или с разделителем лемматизируются по одному, так как mystem
+        обрабатывает каждую строку отдельно.
+        =======================================================================================
+        """
+        result = [None] * len(texts)
+        batch = []
+        size = 0
+        for i, text in enumerate(texts):
+            if not text:
+                result[i] = ""
+                continue
+            if text.splitlines() != [text] or self.SENTINEL.strip() in text.lower():
+                result[i] = self.lemmatize(text)
+                continue
+            batch.append(i)
+            size += len(text)
+            if size >= self.batch_chars:
+                self._lemmatize_joined(texts, batch, result)
+                batch = []
+                size = 0
+        if batch:
+            self._lemmatize_joined(texts, batch, result)
+        return result
+
+    def _lemmatize_joined(self, texts, batch, result):
+        """Lemmatizes texts with indexes from batch in one round-trip and writes them into result."""
+        parts = self.lemmatize(self.SENTINEL.join(texts[i] for i in batch)).split(self.SENTINEL)
+        if len(parts) != len(batch):
+            # Mystem changed the sentinel (e.g. glued it to a neighbour word), fall back to single texts.
+            for i in batch:
+                result[i] = self.lemmatize(texts[i])
+            return
+        # Every single call ends with the line break of mystem, the joined one has only the last.
+        for i, part in zip(batch[:-1], parts[:-1]):
+            result[i] = part + "\n"
+        result[batch[-1]] = parts[-1]
@@ -0,0 +1,207 @@
+import json
+import sqlite3
+from hashlib import blake2b
+
+
+class PreprocessCache:
+    """
+    Eng:
+    ==========================================================================================================
+    Content-addressed on-disk cache (SQLite file) for preprocessed texts.
+
+    The key is a hash of raw text and preprocessing parameters (language, punctuation symbols, regular
+    expressions and list of methods), so a changed text or changed parameters never hit the old value.
+    When the total size of cached texts is greater than max_bytes the least recently used texts are evicted.
+    ==========================================================================================================
+
+    Ru:
+    ==========================================================================================================
+    Адресуемый по содержимому кэш на диске (файл SQLite) для предобработанных текстов.
+
+    Ключ - хэш исходного текста и параметров предобработки (язык, пунктуационные символы, регулярные
+    выражения и список методов), поэтому измененный текст или измененные параметры никогда не получат старое
+    значение. Если общий размер текстов в кэше превышает max_bytes, вытесняются давно не использованные тексты.
+    ==========================================================================================================
+    """
+    # Max amount of variables in one SQLite query.
+    _CHUNK = 500
+
+    def __init__(self, path, max_bytes=1 << 30, enabled=True):
+        """
+        Eng:
+        ==============================================================================
+        :param path: Path to SQLite file (created if it doesn't exist);
+
+        :param max_bytes: Max total size of cached texts in bytes;
+
+        :param enabled: If False the cache is switched off: nothing is read or saved.
+        ==============================================================================
+
+        Ru:
+        ==============================================================================
+        :param path: Путь к файлу SQLite (создается, если не существует);
+
+        :param max_bytes: Максимальный общий размер текстов в кэше в байтах;
+
+        :param enabled: Если False, кэш отключен: ничего не читается и не сохраняется.
+        ==============================================================================
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if enabled:
+            self._db = sqlite3.connect(path)
+            self._db.execute("CREATE TABLE IF NOT EXISTS texts "
+                             "(key BLOB PRIMARY KEY, value TEXT, size INTEGER, accessed INTEGER)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS texts_accessed ON texts (accessed)")
+            self._db.commit()
+            self._clock = self._db.execute("SELECT COALESCE(MAX(accessed), 0) FROM texts").fetchone()[0]
+
+    def __getstate__(self):
+        raise TypeError("PreprocessCache is used only by the main process and can't be pickled!")
+
+    @staticmethod
+    def key(text, lang, punc, regexps, methods):
+        """
+        Eng:
+        ================================================================
+        :param text: Raw text;
+
+        :param lang: Language of text;
+
+        :param punc: String which contains punctuational symbols;
+
+        :param regexps: List of regular expressions;
+
+        :param methods: List of names of preprocessing methods;
+
+        :return: 16 bytes key of preprocessed text.
+        ================================================================
+
+        Ru:
+        ================================================================
+        :param text: Исходный текст;
+
+        :param lang: Язык текста;
+
+        :param punc: Строка, содержащая пунктуационные символы;
+
+        :param regexps: Список регулярных выражений;
+
+        :param methods: Список с именами методов предобработки;
+
+        :return: Ключ обработанного текста длиной 16 байт.
+        ================================================================
+        """
+        params = json.dumps([text, lang, punc, list(regexps or []), list(methods or [])])
+        return blake2b(params.encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, keys):
+        """
+        Eng:
+        =============================================================
+        :param keys: List of keys;
+
+        :return: Dictionary with found key as key and text as value.
+        =============================================================
+
+        Ru:
+        =============================================================
+        :param keys: Список ключей;
+
+        :return: Словарь, в котором найденный ключ является ключом, а
+                 текст - значением.
+        =============================================================
+        """
+        found = {}
+        if not self.enabled:
+            return found
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), self._CHUNK):
+            chunk = unique[i:i + self._CHUNK]
+            rows = self._db.execute("SELECT key, value FROM texts WHERE key IN ({q})".format(
+                q=",".join("?" * len(chunk))), chunk).fetchall()
+            found.update(rows)
+        if found:
+            self._clock += 1
+            self._db.executemany("UPDATE texts SET accessed = ? WHERE key = ?",
+                                 ((self._clock, key) for key in found))
+            self._db.commit()
+        self.hits += sum(key in found for key in keys)
+        self.misses += sum(key not in found for key in keys)
+        return found
+
+    def put_many(self, items):
+        """
+        Eng:
+        ============================================================================
+        :param items: Iterable of (key, preprocessed text) pairs.
+
+        Saves texts and evicts the least recently used ones if cache is too big.
+        ============================================================================
+
+        Ru:
+        ============================================================================
+        :param items: Последовательность пар (ключ, обработанный текст).
+
+        Сохраняет тексты и вытесняет давно не использованные, если кэш слишком велик.
+        ============================================================================
+        """
+        if not self.enabled:
+            return
+        self._clock += 1
+        self._db.executemany("INSERT OR REPLACE INTO texts VALUES (?, ?, ?, ?)",
+                             ((key, value, len(value.encode("utf-8")), self._clock) for key, value in items))
+        self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM texts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._db.execute("SELECT key, size FROM texts ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM texts WHERE key = ?", evicted)
+
+    def info(self):
+        """
+        Eng:
+        ==============================================================
+        :return: Dictionary with hits, misses, amount and size of texts.
+        ==============================================================
+
+        Ru:
+        ==============================================================
+        :return: Словарь с попаданиями, промахами, количеством и
+                 размером текстов.
+        ==============================================================
+        """
+        count, size = (0, 0)
+        if self.enabled:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM texts").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "texts": count, "bytes": size,
+                "max_bytes": self.max_bytes}
+
+    def close(self):
+        """
+        Eng:
+        ================================
+        Closes SQLite file.
+        ================================
+
+        Ru:
+        ================================
+        Закрывает файл SQLite.
+        ================================
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            self.enabled = False
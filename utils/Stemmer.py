@@ -0,0 +1,90 @@
+import threading
+from nltk.stem.snowball import RussianStemmer
+from nltk import PorterStemmer
+
+
+class Stemmer:
+    """
+    Eng:
+    ==================================================================================================
+    Stemmer of the language which is created once per process (RussianStemmer for "ru", Porter
+    stemmer otherwise).
+
+    NLTK stemmers don't change their state in stem(), so one object is safely shared by all threads.
+    Use Stemmer.instance(lang) to get the object of the current process.
+    ==================================================================================================
+
+    Ru:
+    ==================================================================================================
+    Стеммер для языка, создаваемый один раз на процесс (RussianStemmer для "ru", иначе стеммер
+    Портера).
+
+    Стеммеры NLTK не изменяют свое состояние в stem(), поэтому один объект безопасно разделяется
+    всеми потоками. Объект текущего процесса можно получить с помощью Stemmer.instance(lang).
+    ==================================================================================================
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, lang):
+        """
+        Eng:
+        ====================================
+        :param lang: Language of the words.
+        ====================================
+
+        Ru:
+        ====================================
+        :param lang: Язык слов.
+        ====================================
+        """
+        self.lang = lang
+        self._stemmer = RussianStemmer() if lang == "ru" else PorterStemmer()
+        self.stem = self._stemmer.stem
+
+    @staticmethod
+    def instance(lang):
+        """
+        Eng:
+        ===============================================
+        :param lang: Language of the words;
+
+        :return: Stemmer object for the language.
+        ===============================================
+
+        Ru:
+        ===============================================
+        :param lang: Язык слов;
+
+        :return: Объект Stemmer для языка.
+        ===============================================
+        """
+        stemmer = Stemmer._instances.get(lang)
+        if stemmer is None:
+            with Stemmer._instances_lock:
+                stemmer = Stemmer._instances.setdefault(lang, Stemmer(lang))
+        return stemmer
+
+    def __reduce__(self):
+        # Unpickled object is the stemmer of the receiving process.
+        return Stemmer.instance, (self.lang,)
+
+    def stem_text(self, text):
+        """
+        Eng:
+        ===================================================
+        :param text: Source text;
+
+        :return: Text with all words stemmed.
+        ===================================================
+
+        Ru:
+        ===================================================
+        :param text: Исходный текст;
+
+        :return: Текст, в котором каждое слово подвергнулось
+                 стеммингу.
+        ===================================================
+        """
+        stem = self.stem
+        return " ".join([stem(word) for word in text.split()])
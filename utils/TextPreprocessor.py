@@ -1,15 +1,283 @@
-from functools import reduce
+from functools import lru_cache
+import json
 import re
-from pymystem3 import Mystem
+import time
 from nltk.corpus import stopwords
-from nltk.stem.snowball import RussianStemmer
-from nltk import PorterStemmer, WordNetLemmatizer
+from nltk import WordNetLemmatizer
+from utils.Instrumentation import Instrumentation
+from utils.Lemmatizer import Lemmatizer
+from utils.Stemmer import Stemmer
+from utils.WordCache import WordCache
 
 
 class IncorrectLanguageError(ValueError):
     """If source language is not english or russian."""
 
 
+class CacheDisabledError(ValueError):
+    """If word caches are saved or loaded but TextPreprocessor was created without cache_size."""
+
+
+_DIGITS = re.compile(r"[0-9]+")
+# Words (with hyphens) for word by word lemmatization, separators are kept by re.split().
+_WORDS = re.compile(r"(\w+(?:-\w+)*)")
+
+
+@lru_cache(maxsize=None)
+def _stop_words(lang):
+    """NLTK stop-words of the language, loaded once per process."""
+    return frozenset(stopwords.words("russian" if lang == "ru" else "english"))
+
+
+@lru_cache(maxsize=None)
+def _punctuation_table(punc):
+    """str.translate() table which deletes all symbols of punc."""
+    return str.maketrans("", "", punc)
+
+
+@lru_cache(maxsize=None)
+def _compiled_regexps(regexps):
+    """Compiled regular expressions of the tuple, applied in order like TextPreprocessor.prep_re_sub()."""
+    return tuple(re.compile(regexp) for regexp in regexps)
+
+
+class PreprocessPlan:
+    """
+    Eng:
+    ===========================================================================================================
+    Frozen preprocessing plan built by TextPreprocessor.compile().
+
+    All resources are prepared once: stop-words as frozenset, compiled regular expressions, punctuation as
+    str.translate() table, stemmer and lemmatizer objects and fixed list of steps. Calling the plan on a text
+    only runs these steps.
+    ===========================================================================================================
+
+    Ru:
+    ===========================================================================================================
+    Неизменяемый план предобработки, построенный TextPreprocessor.compile().
+
+    Все ресурсы подготавливаются один раз: стоп-слова в виде frozenset, скомпилированные регулярные выражения,
+    таблица str.translate() для пунктуации, объекты стеммера и лемматизатора и фиксированный список шагов.
+    Вызов плана для текста выполняет только эти шаги.
+    ===========================================================================================================
+    """
+    _STEPS = {
+        "prep_delete_punctuation_symbols": "_delete_punctuation_symbols",
+        "prep_delete_stop_words": "_delete_stop_words",
+        "prep_lemmatize": "_lemmatize",
+        "prep_re_sub": "_re_sub",
+        "prep_replace_digits": "_replace_digits",
+        "prep_stem": "_stem"
+    }
+
+    def __init__(self, lang, steps, punc=None, regexp_lst=None, custom_steps=None, stem_cache=None,
+                 lemma_cache=None):
+        """
+        Eng:
+        ===================================================================================================
+        :param lang: Source language of source texts;
+
+        :param steps: Names of preprocessing methods of TextPreprocessor in order of their application;
+
+        :param punc: String contained bad symbols which should be removed;
+
+        :param regexp_lst: List of regular expressions which matches should be removed;
+
+        :param custom_steps: Dictionary with name as key and callable as value for other "prep_" methods;
+
+        :param stem_cache: WordCache for stems (None - no cache);
+
+        :param lemma_cache: WordCache for lemmas (None - no cache).
+        ===================================================================================================
+
+        Ru:
+        ===================================================================================================
+        :param lang: Язык исходных текстов;
+
+        :param steps: Имена методов предобработки TextPreprocessor в порядке их применения;
+
+        :param punc: Строка, содержащая символы, которые нужно удалить;
+
+        :param regexp_lst: Список регулярных выражений, совпадения с которыми нужно удалить;
+
+        :param custom_steps: Словарь, в котором имя является ключом, а функция значением, для других
+                             методов с префиксом "prep_";
+
+        :param stem_cache: WordCache для основ слов (None - без кэша);
+
+        :param lemma_cache: WordCache для лемм (None - без кэша).
+        ===================================================================================================
+        """
+        self.lang = lang
+        self.steps = tuple(steps)
+        self.custom_steps = dict(custom_steps or {})
+        self._table = _punctuation_table(punc) if punc is not None else None
+        self._regexps = _compiled_regexps(tuple(regexp_lst)) if regexp_lst else ()
+        self._stop_words = _stop_words(lang) if "prep_delete_stop_words" in self.steps else None
+        self._stemmer = Stemmer.instance(lang) if "prep_stem" in self.steps else None
+        self._lemmatizer = None
+        if "prep_lemmatize" in self.steps and lang != "ru":
+            self._lemmatizer = WordNetLemmatizer()
+        self.stem_cache = stem_cache
+        self.lemma_cache = lemma_cache
+        self._build()
+
+    def _build(self):
+        self._calls = tuple(self.__getattribute__(self._STEPS[step]) if step in self._STEPS
+                            else self.custom_steps[step] for step in self.steps)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_calls"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build()
+
+    def __call__(self, text):
+        """
+        Eng:
+        ====================================================
+        :param text: Text for preprocessing;
+
+        :return: Text preprocessed with all steps of plan.
+        ====================================================
+
+        Ru:
+        ====================================================
+        :param text: Текст для предобработки;
+
+        :return: Текст, обработанный всеми шагами плана.
+        ====================================================
+        """
+        if not isinstance(text, str):
+            raise TypeError("Argument must be str!")
+        if Instrumentation.enabled:
+            return self._timed_call(text)
+        for call in self._calls:
+            text = call(text)
+        return text
+
+    def _timed_call(self, text):
+        """__call__() which records time of every step (see Instrumentation)."""
+        start = time.perf_counter()
+        for step, call in zip(self.steps, self._calls):
+            step_start = time.perf_counter()
+            text = call(text)
+            Instrumentation.record("preprocess." + step, time.perf_counter() - step_start)
+        Instrumentation.record("preprocess", time.perf_counter() - start, tokens=len(text.split()))
+        return text
+
+    def batch(self, texts):
+        """
+        Eng:
+        =======================================================================================
+        :param texts: List of texts for preprocessing;
+
+        :return: List of texts preprocessed with all steps of plan.
+
+        The same as [plan(text) for text in texts], but russian lemmatization sends many texts
+        to mystem per round-trip (see Lemmatizer.lemmatize_batch()). With word caches stemming
+        and lemmatization work in bulk: unique words of all texts are normalized once and the
+        texts are rewritten from the lookup table.
+        =======================================================================================
+
+        Ru:
+        =======================================================================================
+        :param texts: Список текстов для предобработки;
+
+        :return: Список текстов, обработанных всеми шагами плана.
+
+        То же, что и [plan(text) for text in texts], но при лемматизации русских текстов за одно
+        обращение к mystem отправляется много текстов (см. Lemmatizer.lemmatize_batch()). С кэшами
+        слов стемминг и лемматизация выполняются целиком: уникальные слова всех текстов
+        нормализуются один раз, а тексты переписываются по таблице.
+        =======================================================================================
+        """
+        texts = list(texts)
+        if not all(isinstance(text, str) for text in texts):
+            raise TypeError("Argument must be list of str!")
+        timed = Instrumentation.enabled
+        start = time.perf_counter()
+        for step, call in zip(self.steps, self._calls):
+            step_start = time.perf_counter()
+            if step == "prep_stem" and self.stem_cache is not None:
+                texts = self._bulk_stem(texts)
+            elif step == "prep_lemmatize" and self.lemma_cache is not None:
+                texts = self._bulk_lemmatize(texts)
+            elif step == "prep_lemmatize" and self.lang == "ru":
+                texts = Lemmatizer.instance().lemmatize_batch(texts)
+            else:
+                texts = [call(text) for text in texts]
+            if timed:
+                Instrumentation.record("preprocess." + step, time.perf_counter() - step_start, calls=len(texts))
+        if timed:
+            Instrumentation.record("preprocess", time.perf_counter() - start, calls=len(texts),
+                                   tokens=sum(len(text.split()) for text in texts))
+        return texts
+
+    def _delete_punctuation_symbols(self, text):
+        if self._table is None:
+            return text
+        return text.translate(self._table)
+
+    def _delete_stop_words(self, text):
+        stop_words = self._stop_words
+        return " ".join([word for word in text.split() if word not in stop_words])
+
+    def _lemmatize(self, text):
+        if self.lemma_cache is not None:
+            return self._bulk_lemmatize([text])[0]
+        if self.lang == "ru":
+            return Lemmatizer.instance().lemmatize(text)
+        lemmatize = self._lemmatizer.lemmatize
+        return " ".join([lemmatize(word) for word in text.split()])
+
+    def _lemmatize_words(self, words):
+        if self.lang == "ru":
+            return [form.strip() for form in Lemmatizer.instance().lemmatize_batch(words)]
+        lemmatize = self._lemmatizer.lemmatize
+        return [lemmatize(word) for word in words]
+
+    def _bulk_lemmatize(self, texts):
+        if self.lang != "ru":
+            docs = [text.split() for text in texts]
+            table = self.lemma_cache.normalize_all((word for doc in docs for word in doc), self._lemmatize_words)
+            return [" ".join([table[word] for word in doc]) for doc in docs]
+        # Mystem keeps separators and ends the result with line break, words are lemmatized without context.
+        docs = [_WORDS.split(text) for text in texts]
+        table = self.lemma_cache.normalize_all((word for doc in docs for word in doc[1::2]), self._lemmatize_words)
+        for doc in docs:
+            doc[1::2] = [table[word] for word in doc[1::2]]
+        return ["".join(doc) + "\n" if text else "" for doc, text in zip(docs, texts)]
+
+    def _re_sub(self, text):
+        # Not merged into one alternation: inline flags, group numbers and matches exposed by an earlier
+        # removal would change.
+        for regexp in self._regexps:
+            text = regexp.sub("", text)
+        return text
+
+    @staticmethod
+    def _replace_digits(text):
+        return _DIGITS.sub("1", text)
+
+    def _stem(self, text):
+        if self.stem_cache is not None:
+            return self._bulk_stem([text])[0]
+        return self._stemmer.stem_text(text)
+
+    def _stem_words(self, words):
+        stem = self._stemmer.stem
+        return [stem(word) for word in words]
+
+    def _bulk_stem(self, texts):
+        docs = [text.split() for text in texts]
+        table = self.stem_cache.normalize_all((word for doc in docs for word in doc), self._stem_words)
+        return [" ".join([table[word] for word in doc]) for doc in docs]
+
+
 class TextPreprocessor:
     """
     Eng:
@@ -54,7 +322,7 @@ class TextPreprocessor:
         то метод full_preprocess автоматически подхватит его для применения.
     ===========================================================================================================
     """
-    def __init__(self, lang, punc=None, regexp_lst=None, part_methods=None):
+    def __init__(self, lang, punc=None, regexp_lst=None, part_methods=None, cache_size=None):
         """
         Eng:
         =======================================================================================================
@@ -66,7 +334,10 @@ class TextPreprocessor:
         :param regexp_lst: List of regular expressions for prep_re_sub() method;
 
         :param part_methods: List with the names of the methods which should be used for
-                             partial preprocessing.
+                             partial preprocessing;
+
+        :param cache_size: Max amount of words in stem and lemma caches (None - words aren't cached,
+                           see WordCache).
         =======================================================================================================
 
         Ru:
@@ -78,7 +349,10 @@ class TextPreprocessor:
         :param regexp_lst: Список, содержащий регулярные выражения для метода prep_re_sub();
 
         :param part_methods: Список с именами методов, которые нужно применить для метода множественной
-                             частичной предобработки.
+                             частичной предобработки;
+
+        :param cache_size: Максимальное количество слов в кэшах основ и лемм (None - слова не кэшируются,
+                           см. WordCache).
         =======================================================================================================
         """
         if lang != "ru" and lang != "eng":
@@ -88,6 +362,149 @@ class TextPreprocessor:
         self.punct_string = punc
         self.methods = part_methods
         self.rel = regexp_lst
+        self.stem_cache = WordCache(cache_size) if cache_size else None
+        self.lemma_cache = WordCache(cache_size) if cache_size else None
+        self._plans = {}
+
+    def compile(self, methods=None):
+        """
+        Eng:
+        =======================================================================================================
+        :param methods: List with the names of the methods for the plan (None - all "prep_" methods, the same
+                        as in full_preprocess);
+
+        :return: PreprocessPlan object.
+
+        Builds the frozen preprocessing plan once, next calls with the same methods return the same plan.
+        The plan doesn't see changes of attributes made after compiling.
+        =======================================================================================================
+
+        Ru:
+        =======================================================================================================
+        :param methods: Список с именами методов для плана (None - все методы с префиксом "prep_", как в
+                        full_preprocess);
+
+        :return: Объект PreprocessPlan.
+
+        Строит неизменяемый план предобработки один раз, следующие вызовы с теми же методами возвращают тот же
+        план. План не учитывает изменения атрибутов, сделанные после компиляции.
+        =======================================================================================================
+        """
+        key = tuple(methods) if methods is not None else None
+        if key not in self._plans:
+            names = [method for method in dir(self) if method.startswith("prep_")]
+            if methods is None:
+                steps = names
+            elif all(method in names for method in methods):
+                steps = methods
+            else:
+                raise NameError("Incorrect method names")
+            custom_steps = {step: self.__getattribute__(step) for step in steps if step not in PreprocessPlan._STEPS}
+            self._plans[key] = PreprocessPlan(self.lang, steps, self.punct_string, self.rel, custom_steps,
+                                              self.stem_cache, self.lemma_cache)
+        return self._plans[key]
+
+    def bulk_preprocess(self, texts, methods=None):
+        """
+        Eng:
+        =====================================================================================================
+        :param texts: List of texts for preprocessing;
+
+        :param methods: List with the names of the methods (None - all methods, as in full_preprocess);
+
+        :return: List of preprocessed texts.
+
+        Preprocesses the whole corpus at once (see PreprocessPlan.batch()). With caches (cache_size) every
+        unique word of the corpus is stemmed or lemmatized only once.
+        =====================================================================================================
+
+        Ru:
+        =====================================================================================================
+        :param texts: Список текстов для предобработки;
+
+        :param methods: Список с именами методов (None - все методы, как в full_preprocess);
+
+        :return: Список обработанных текстов.
+
+        Обрабатывает весь корпус целиком (см. PreprocessPlan.batch()). С кэшами (cache_size) каждое
+        уникальное слово корпуса подвергается стеммингу или лемматизации только один раз.
+        =====================================================================================================
+        """
+        return self.compile(methods).batch(texts)
+
+    def cache_info(self):
+        """
+        Eng:
+        ==========================================================================
+        :return: Dictionary with WordCache.info() of stem and lemma caches (None
+                 if words aren't cached).
+        ==========================================================================
+
+        Ru:
+        ==========================================================================
+        :return: Словарь с WordCache.info() кэшей основ и лемм (None, если слова
+                 не кэшируются).
+        ==========================================================================
+        """
+        if self.stem_cache is None:
+            return None
+        return {"stem": self.stem_cache.info(), "lemmatize": self.lemma_cache.info()}
+
+    def _check_cache(self):
+        if self.stem_cache is None:
+            raise CacheDisabledError("Word caching is disabled, create TextPreprocessor with cache_size!")
+
+    def save_cache(self, path):
+        """
+        Eng:
+        ===========================================================
+        :param path: Path to locate stem and lemma caches (json).
+
+        Raises CacheDisabledError if words aren't cached (cache_size
+        is None).
+        ===========================================================
+
+        Ru:
+        ===========================================================
+        :param path: Путь для сохранения кэшей основ и лемм (json).
+
+        Вызывает CacheDisabledError, если слова не кэшируются
+        (cache_size равен None).
+        ===========================================================
+        """
+        self._check_cache()
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"lang": self.lang, "stem": self.stem_cache.to_dict(),
+                       "lemmatize": self.lemma_cache.to_dict()}, file)
+
+    def load_cache(self, path):
+        """
+        Eng:
+        =====================================================================
+        :param path: Path to caches saved by save_cache().
+
+        Warm start: cached words from the file are added to the caches, so
+        they are never stemmed or lemmatized again. Raises CacheDisabledError
+        if words aren't cached (cache_size is None).
+        =====================================================================
+
+        Ru:
+        =====================================================================
+        :param path: Путь к кэшам, сохраненным save_cache().
+
+        "Теплый" старт: слова из файла добавляются в кэши, поэтому они больше
+        не подвергаются стеммингу или лемматизации. Вызывает
+        CacheDisabledError, если слова не кэшируются (cache_size равен None).
+        =====================================================================
+        """
+        self._check_cache()
+        with open(path, encoding="utf-8") as file:
+            caches = json.load(file)
+        if caches["lang"] != self.lang:
+            raise IncorrectLanguageError("Cache is for \"{c}\" texts, not \"{lang}\"".format(
+                c=caches["lang"], lang=self.lang))
+        self.stem_cache.update_from_dict(caches["stem"])
+        self.lemma_cache.update_from_dict(caches["lemmatize"])
 
     def prep_re_sub(self, text):
         """
@@ -137,9 +554,8 @@ class TextPreprocessor:
         ==================================================================
         """
         if isinstance(text, str):
-            if self.lang == "ru":
-                return " ".join([word for word in text.split() if word not in stopwords.words("russian")])
-            return " ".join([word for word in text.split() if word not in stopwords.words("english")])
+            stop_words = _stop_words(self.lang)
+            return " ".join([word for word in text.split() if word not in stop_words])
         else:
             print(type(text))
             raise TypeError("Argument must be str!")
@@ -166,7 +582,8 @@ class TextPreprocessor:
         """
         if isinstance(text, str):
             if self.punct_string is not None:
-                return "".join([symbol for symbol in text if symbol not in self.punct_string])
+                return text.translate(_punctuation_table(self.punct_string))
+            return text
         else:
             print(type(text))
             raise TypeError("Argument must be str!")
@@ -193,7 +610,7 @@ class TextPreprocessor:
         ============================================================
         """
         if isinstance(text, str):
-            return re.sub(r"[0-9]+", "1", text)
+            return _DIGITS.sub("1", text)
         else:
             raise TypeError("Argument must be str!")
 
@@ -218,9 +635,9 @@ class TextPreprocessor:
         ============================================================================
         """
         if isinstance(text, str):
-            if self.lang == "ru":
-                return " ".join([RussianStemmer().stem(word) for word in text.split()])
-            return " ".join([PorterStemmer().stem(word) for word in text.split()])
+            if self.stem_cache is not None:
+                return self.compile(["prep_stem"])(text)
+            return Stemmer.instance(self.lang).stem_text(text)
         else:
             raise TypeError("Argument must be str!")
 
@@ -245,8 +662,10 @@ class TextPreprocessor:
         ===============================================================================
         """
         if isinstance(text, str):
+            if self.lemma_cache is not None:
+                return self.compile(["prep_lemmatize"])(text)
             if self.lang == "ru":
-                return "".join(Mystem().lemmatize(text))
+                return Lemmatizer.instance().lemmatize(text)
             return " ".join([WordNetLemmatizer().lemmatize(word) for word in text.split()])
         else:
             raise TypeError("Argument must be str!")
@@ -272,11 +691,7 @@ class TextPreprocessor:
         =======================================================================================
         """
         if isinstance(text, str):
-            if all((method in list(dir(self))) and (method.startswith("prep_")) for method in self.methods):
-                mtds = [self.__getattribute__(method) for method in self.methods]
-                return (lambda y: reduce(lambda f, g: g(f), mtds, y))(text)
-            else:
-                raise NameError("Incorrect method names")
+            return self.compile(self.methods)(text)
         else:
             raise TypeError("Argument \"text\" must be str!")
 
@@ -301,8 +716,6 @@ class TextPreprocessor:
         =================================================================
         """
         if isinstance(text, str):
-            methods = [self.__getattribute__(method)
-                       for method in [smethod for smethod in list(dir(self)) if smethod.startswith("prep_")]]
-            return (lambda y: reduce(lambda f, g: g(f), methods, y))(text)
+            return self.compile()(text)
         else:
             raise TypeError("Argument must be str!")
@@ -0,0 +1,222 @@
+import json
+from collections import OrderedDict
+
+
+class WordCache:
+    """
+    Eng:
+    ==========================================================================================================
+    Bounded word -> normalized form (stem or lemma) cache with LRU eviction.
+
+    Word frequencies are Zipfian, so most occurrences of words are served from the cache and the stemmer or
+    lemmatizer runs only for new words. Hits and misses are counted, the cache can be saved to and loaded
+    from json file for warm start.
+    ==========================================================================================================
+
+    Ru:
+    ==========================================================================================================
+    Ограниченный кэш слово -> нормальная форма (основа или лемма) с вытеснением давно не использованных слов.
+
+    Частоты слов подчиняются закону Ципфа, поэтому большинство вхождений слов обслуживается из кэша, а
+    стеммер или лемматизатор запускается только для новых слов. Считаются попадания и промахи, кэш можно
+    сохранить в json файл и загрузить из него для "теплого" старта.
+    ==========================================================================================================
+    """
+    def __init__(self, max_size=100000):
+        """
+        Eng:
+        =============================================
+        :param max_size: Max amount of cached words.
+        =============================================
+
+        Ru:
+        =============================================
+        :param max_size: Максимальное количество слов
+                         в кэше.
+        =============================================
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._forms = OrderedDict()
+
+    def __len__(self):
+        return len(self._forms)
+
+    def get(self, word):
+        """
+        Eng:
+        ===============================================
+        :param word: Source word;
+
+        :return: Cached form of the word or None.
+        ===============================================
+
+        Ru:
+        ===============================================
+        :param word: Исходное слово;
+
+        :return: Форма слова из кэша или None.
+        ===============================================
+        """
+        form = self._forms.get(word)
+        if form is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._forms.move_to_end(word)
+        return form
+
+    def put(self, word, form):
+        """
+        Eng:
+        =================================================================
+        :param word: Source word;
+
+        :param form: Normalized form of the word.
+
+        The least recently used word is evicted if the cache is full.
+        =================================================================
+
+        Ru:
+        =================================================================
+        :param word: Исходное слово;
+
+        :param form: Нормальная форма слова.
+
+        Если кэш заполнен, вытесняется слово, использованное раньше всех.
+        =================================================================
+        """
+        self._forms[word] = form
+        self._forms.move_to_end(word)
+        if len(self._forms) > self.max_size:
+            self._forms.popitem(last=False)
+
+    def normalize_all(self, words, normalize_many):
+        """
+        Eng:
+        ==================================================================================================
+        :param words: Iterable of words (usually all words of a corpus);
+
+        :param normalize_many: Function which takes list of words and returns list of their forms;
+
+        :return: Dictionary with every unique word as key and it's form as value.
+
+        Every unique word is looked up once, normalize_many is called once for all words missing in cache.
+        ==================================================================================================
+
+        Ru:
+        ==================================================================================================
+        :param words: Последовательность слов (как правило, все слова корпуса);
+
+        :param normalize_many: Функция, принимающая список слов и возвращающая список их форм;
+
+        :return: Словарь, в котором каждое уникальное слово является ключом, а его форма - значением.
+
+        Каждое уникальное слово ищется один раз, normalize_many вызывается один раз для всех слов,
+        отсутствующих в кэше.
+        ==================================================================================================
+        """
+        table = {}
+        missing = []
+        for word in dict.fromkeys(words):
+            form = self.get(word)
+            if form is None:
+                missing.append(word)
+            else:
+                table[word] = form
+        if missing:
+            for word, form in zip(missing, normalize_many(missing)):
+                table[word] = form
+                self.put(word, form)
+        return table
+
+    def info(self):
+        """
+        Eng:
+        ===========================================================
+        :return: Dictionary with hits, misses, hit rate and size.
+        ===========================================================
+
+        Ru:
+        ===========================================================
+        :return: Словарь с попаданиями, промахами, долей попаданий
+                 и размером кэша.
+        ===========================================================
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._forms),
+            "max_size": self.max_size
+        }
+
+    def to_dict(self):
+        """
+        Eng:
+        =====================================================================
+        :return: Dictionary with max size and cached words (in LRU order).
+        =====================================================================
+
+        Ru:
+        =====================================================================
+        :return: Словарь с максимальным размером и словами кэша (в порядке
+                 использования).
+        =====================================================================
+        """
+        return {"max_size": self.max_size, "forms": list(self._forms.items())}
+
+    def update_from_dict(self, d):
+        """
+        Eng:
+        ===========================================================
+        :param d: Dictionary from to_dict().
+
+        Adds cached words of d to the cache (max size is kept).
+        ===========================================================
+
+        Ru:
+        ===========================================================
+        :param d: Словарь из to_dict().
+
+        Добавляет слова из d в кэш (максимальный размер сохраняется).
+        ===========================================================
+        """
+        for word, form in d["forms"]:
+            self.put(word, form)
+
+    def save(self, path):
+        """
+        Eng:
+        ============================================
+        :param path: Path to locate cache (as json).
+        ============================================
+
+        Ru:
+        ============================================
+        :param path: Путь для сохранения кэша (json).
+        ============================================
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file)
+
+    def load(self, path):
+        """
+        Eng:
+        ==================================================
+        :param path: Path to cache saved by save().
+
+        Adds cached words from the file to the cache.
+        ==================================================
+
+        Ru:
+        ==================================================
+        :param path: Путь к кэшу, сохраненному save().
+
+        Добавляет слова из файла в кэш.
+        ==================================================
+        """
+        with open(path, encoding="utf-8") as file:
+            self.update_from_dict(json.load(file))
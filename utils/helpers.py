@@ -31,13 +31,9 @@ def get_ngram(text, n):
         Результат: А роза упала|роза упала на|упала на лапу|на лапу Азора.
     =======================================================================
     """
-    ngrams = ""
     if isinstance(text, float):
         return ""
-    t = text.split(" ")
-    for i in range(len(t) - 2):
-        ngrams = "|".join([ngrams, " ".join(t[i:i+n])])
-    return ngrams
+    return "|".join(iter_ngrams(text, n))
 
 
 def get_count(d, key):
@@ -92,3 +88,87 @@ def get_key(d, value):
         if d[key] == value:
             return key
     return None
+
+
+def iter_ngrams(text, n):
+    """
+    Eng:
+    ============================================================================
+    :param text: Source text;
+
+    :param n: n parameter for n-gramms;
+
+    :return: Generator of n-gramms of the source text.
+
+    Yields the same n-gramms as get_ngram(text, n).split("|") without building
+    the joined string. The first n-gramm is always the empty string (get_ngram
+    starts its result with "|"), so counts stay compatible with saved models.
+    A text of k words has k - n + 1 n-gramms.
+    ============================================================================
+
+    Ru:
+    ============================================================================
+    :param text: Исходный текст;
+
+    :param n: n параметр для n-грамм;
+
+    :return: Генератор n-грамм исходного текста.
+
+    Возвращает те же n-граммы, что и get_ngram(text, n).split("|"), не строя
+    общую строку. Первая n-грамма всегда пустая строка (результат get_ngram
+    начинается с "|"), поэтому счетчики совместимы с сохраненными моделями.
+    В тексте из k слов k - n + 1 n-грамм.
+    ============================================================================
+    """
+    return iter_token_ngrams(tokenize(text), n)
+
+
+def tokenize(text):
+    """
+    Eng:
+    =================================================================
+    :param text: Source text (NaN or None from DF is treated as empty text);
+
+    :return: List of tokens (words split by " ").
+    =================================================================
+
+    Ru:
+    =================================================================
+    :param text: Исходный текст (NaN или None из DF считается пустым текстом);
+
+    :return: Список токенов (слов, разделенных " ").
+    =================================================================
+    """
+    if not isinstance(text, str):
+        return []
+    return text.split(" ")
+
+
+def iter_token_ngrams(tokens, n):
+    """
+    Eng:
+    ========================================================================
+    :param tokens: List of tokens (see tokenize());
+
+    :param n: n parameter for n-gramms;
+
+    :return: Generator of n-gramms of the tokens, the same as iter_ngrams()
+             of the text.
+    ========================================================================
+
+    Ru:
+    ========================================================================
+    :param tokens: Список токенов (см. tokenize());
+
+    :param n: n параметр для n-грамм;
+
+    :return: Генератор n-грамм из токенов, тот же, что и iter_ngrams() для
+             текста.
+    ========================================================================
+    """
+    yield ""
+    if n == 1:
+        yield from tokens
+        return
+    for i in range(len(tokens) - n + 1):
+        yield " ".join(tokens[i:i+n])